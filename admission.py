@@ -0,0 +1,131 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class AdmissionController:
+    """인스턴스(프로세스) 안에서 동시에 진행하는 생성 요청을 max_concurrent 개로 제한
+
+    자리가 없으면 들어온 순서대로 기다리며, 기다리는 요청은 on_wait(순번, 예상 대기 초)로 자기 위치를 받는다.
+    예상 대기 시간은 생성 종류별 최근 소요 시간의 이동 평균으로 진행 중·앞선 요청이 끝나는 시각을 계산한 값이다.
+    여러 생성을 한꺼번에 돌리는 요청(학년별 계획 등)은 weight 만큼 자리를 차지한다 (최대 max_concurrent).
+    """
+
+    def __init__(self, max_concurrent=4, estimates=None, default_seconds=30.0, alpha=0.3):
+        self.max_concurrent = max_concurrent
+        self.default_seconds = default_seconds
+        self.alpha = alpha
+        self._cond = threading.Condition()
+        self._tickets = itertools.count(1)
+        self._waiting = deque()  # (번호, 종류, 자리 수) 들어온 순서
+        self._running = {}  # 번호 -> (종류, 시작 시각, 자리 수)
+        self._used = 0  # 진행 중인 요청이 차지한 자리 수
+        self._durations = dict(estimates or {})  # 종류 -> 평균 소요 시간(초)
+        self._version = 0  # 대기열이 바뀔 때마다 증가 (순번 다시 계산)
+        self._admitted = 0
+        self._waited = 0
+        self._wait_seconds = 0.0
+
+    def expected_seconds(self, kind):
+        return self._durations.get(kind, self.default_seconds)
+
+    def weight_for(self, count):
+        """한 요청이 차지할 수 있는 자리 수 (1 ~ max_concurrent)"""
+        return max(1, min(count, self.max_concurrent))
+
+    def _can_start(self, ticket):
+        waiting_ticket, _, weight = self._waiting[0]
+        return waiting_ticket == ticket and self._used + weight <= self.max_concurrent
+
+    def _estimate(self, ticket):
+        """(순번, 예상 대기 초): 자리마다 비는 시각을 두고 앞선 요청을 순서대로 배정해 본다"""
+        now = time.monotonic()
+        free_at = [max(0.0, self.expected_seconds(kind) - (now - start))
+                   for kind, start, weight in self._running.values() for _ in range(weight)]
+        free_at += [0.0] * (self.max_concurrent - len(free_at))
+        heapq.heapify(free_at)
+        position = 0
+        for waiting_ticket, kind, weight in self._waiting:
+            position += 1
+            # weight 개 자리가 모두 비어야 시작한다
+            start_at = max(heapq.heappop(free_at) for _ in range(weight))
+            if waiting_ticket == ticket:
+                return position, start_at
+            for _ in range(weight):
+                heapq.heappush(free_at, start_at + self.expected_seconds(kind))
+        return position, free_at[0]
+
+    def acquire(self, kind, on_wait=None, poll=1.0, weight=1):
+        """자리가 날 때까지 기다렸다가 번호를 반환 (release 로 돌려준다)"""
+        start = time.monotonic()
+        weight = self.weight_for(weight)
+        with self._cond:
+            ticket = next(self._tickets)
+            self._waiting.append((ticket, kind, weight))
+            self._version += 1
+        try:
+            while True:
+                with self._cond:
+                    if self._can_start(ticket):
+                        self._waiting.popleft()
+                        self._running[ticket] = (kind, time.monotonic(), weight)
+                        self._used += weight
+                        self._version += 1
+                        self._admitted += 1
+                        waited = time.monotonic() - start
+                        if waited >= poll:
+                            self._waited += 1
+                            self._wait_seconds += waited
+                        # 바로 뒤 요청도 남은 자리에 들어갈 수 있다
+                        self._cond.notify_all()
+                        return ticket
+                    position, eta = self._estimate(ticket)
+                    version = self._version
+                # 화면 갱신은 잠금 밖에서 (세션이 중단되면 여기서 예외가 날 수 있음)
+                if on_wait:
+                    on_wait(position, eta)
+                with self._cond:
+                    if self._version == version:
+                        self._cond.wait(poll)
+        except BaseException:
+            with self._cond:
+                if (ticket, kind, weight) in self._waiting:
+                    self._waiting.remove((ticket, kind, weight))
+                    self._version += 1
+                    self._cond.notify_all()
+            raise
+
+    def release(self, ticket):
+        with self._cond:
+            kind, start, weight = self._running.pop(ticket)
+            self._used -= weight
+            seconds = time.monotonic() - start
+            previous = self._durations.get(kind)
+            self._durations[kind] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+            self._version += 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, kind, on_wait=None, poll=1.0, weight=1):
+        ticket = self.acquire(kind, on_wait, poll, weight)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        """진행 중·대기 중인 요청 수, 기다렸던 요청 수와 평균 대기 시간, 종류별 예상 소요 시간"""
+        with self._cond:
+            return {
+                "running": len(self._running),
+                "slots_used": self._used,
+                "waiting": len(self._waiting),
+                "max_concurrent": self.max_concurrent,
+                "admitted": self._admitted,
+                "waited": self._waited,
+                "avg_wait_seconds": self._wait_seconds / self._waited if self._waited else 0.0,
+                "estimates": {kind: round(seconds, 1) for kind, seconds in self._durations.items()},
+            }
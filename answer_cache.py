@@ -0,0 +1,151 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+
+from bm25 import tokenize
+
+
+def normalize_question(question):
+    """비교용 질문 정규화: 유니코드 NFC, 소문자, 문장부호/공백 제거"""
+    text = unicodedata.normalize("NFC", question).lower()
+    return re.sub(r"[\W_]+", "", text)
+
+
+def question_signature(question):
+    """유사도 비교용 (색인어 집합, 숫자 집합)"""
+    return set(tokenize(question)), frozenset(re.findall(r"\d+", question))
+
+
+def similarity(sig_a, sig_b):
+    """두 질문 서명의 다이스 계수 (0~1). 숫자(학년, 개수 등)가 다르면 0"""
+    terms_a, numbers_a = sig_a
+    terms_b, numbers_b = sig_b
+    if numbers_a != numbers_b or not terms_a or not terms_b:
+        return 0.0
+    return 2 * len(terms_a & terms_b) / (len(terms_a) + len(terms_b))
+
+
+class AnswerCache:
+    """질문-답변 캐시 (SQLite 파일에 저장하여 세션·프로세스 간 공유)
+
+    정확히 같은 정규화 질문은 바로 찾고, 그 외에는 조사를 뗀 색인어의 유사도가
+    threshold 이상인 가장 가까운 질문의 답변을 돌려준다.
+    namespace 는 프롬프트/모델이 바뀌었을 때 예전 답변을 쓰지 않도록 구분하는 값이다.
+    전체 max_entries 개를 넘으면 가장 오래 쓰이지 않은 답변부터, max_age 초 동안 쓰이지 않은 답변은 바로 지운다.
+    """
+
+    def __init__(self, path, namespace="", threshold=0.85, max_entries=2000, max_age=30 * 24 * 3600):
+        self.path = path
+        self.namespace = namespace
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = {}  # 정규화 질문 -> (질문 서명, 답변)
+        self._last_rowid = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    namespace TEXT NOT NULL,
+                    normalized TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    used_at REAL,
+                    UNIQUE (namespace, normalized)
+                )
+            """)
+            # 예전 파일에는 used_at 이 없다
+            if "used_at" not in [row[1] for row in conn.execute("PRAGMA table_info(answers)")]:
+                conn.execute("ALTER TABLE answers ADD COLUMN used_at REAL")
+            conn.execute("UPDATE answers SET used_at = created_at WHERE used_at IS NULL")
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_used_at ON answers (used_at)")
+        self._evict()
+        self._refresh()
+
+    @contextmanager
+    def _connect(self):
+        """with 블록이 끝나면 commit 하고 닫히는 연결 (sqlite3.Connection 의 with 는 닫지 않는다)"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _evict(self):
+        """오래 쓰이지 않은 답변을 지우고, 지운 것이 있으면 메모리 목록을 처음부터 다시 읽게 한다"""
+        with self._connect() as conn:
+            deleted = conn.execute("DELETE FROM answers WHERE used_at < ?", (time.time() - self.max_age,)).rowcount
+            deleted += conn.execute(
+                "DELETE FROM answers WHERE id NOT IN (SELECT id FROM answers ORDER BY used_at DESC LIMIT ?)",
+                (self.max_entries,),
+            ).rowcount
+        if deleted:
+            self._entries = {}
+            self._last_rowid = 0
+
+    def _touch(self, key):
+        with self._connect() as conn:
+            conn.execute("UPDATE answers SET used_at = ? WHERE namespace = ? AND normalized = ?",
+                         (time.time(), self.namespace, key))
+
+    def _refresh(self):
+        """다른 프로세스가 추가한 답변을 메모리 목록에 반영"""
+        if len(self._entries) > self.max_entries:
+            # 다른 프로세스가 지운 답변이 쌓이지 않도록 처음부터 다시 읽는다
+            self._entries = {}
+            self._last_rowid = 0
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, normalized, question, answer FROM answers WHERE namespace = ? AND id > ? ORDER BY id",
+                (self.namespace, self._last_rowid),
+            ).fetchall()
+        for rowid, normalized, question, answer in rows:
+            self._entries[normalized] = (question_signature(question), answer)
+            self._last_rowid = rowid
+
+    def get(self, question):
+        """캐시된 답변 또는 None"""
+        key = normalize_question(question)
+        if not key:
+            return None
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get(key)
+            if entry:
+                self._touch(key)
+                return entry[1]
+            signature = question_signature(question)
+            best_score, best_key = 0.0, None
+            for other_key, (other, _) in self._entries.items():
+                score = similarity(signature, other)
+                if score > best_score:
+                    best_score, best_key = score, other_key
+            if best_score >= self.threshold:
+                self._touch(best_key)
+                return self._entries[best_key][1]
+        return None
+
+    def put(self, question, answer):
+        key = normalize_question(question)
+        if not key or not answer:
+            return
+        with self._lock:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO answers (namespace, normalized, question, answer, created_at, used_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.namespace, key, question, answer, time.time(), time.time()),
+                )
+            self._evict()
+            self._entries[key] = (question_signature(question), answer)
+
+    def __contains__(self, question):
+        return self.get(question) is not None
@@ -1,34 +1,23 @@
 import os
 import streamlit as st
-import pandas as pd
 from io import BytesIO
+import hashlib
 import json
+import re
+import threading
 import time
+from contextlib import contextmanager
 
-from langchain_openai import ChatOpenAI
-from langchain.schema import AIMessage, HumanMessage, SystemMessage
-
-
-# OpenAI API 키 설정
-OPENAI_API_KEY = st.secrets["openai"]["api_key"]
-if not OPENAI_API_KEY:
-    st.error("OpenAI API 키가 설정되지 않았습니다. 환경 변수를 확인하세요.")
-    st.stop()
-
-SYSTEM_PROMPT = """한국의 초등학교 2022 개정 교육과정 전문가입니다.
-학교자율시간 계획서를 다음 원칙에 따라 작성합니다:
-
-1. 지도계획에 모든 차시에 학습내용과 학습 주제가 빈틈없이 내용이 꼭 들어가야 합니다.
-2. 학습자 중심의 교육과정 초등학교 3,4학년 수준에 맞는 쉽게 내용을 만들어 주세요.
-3. 실생활 연계 및 체험 중심 활동
-4. 교과 간 연계 및 통합적 접근
-5. 초등학교 3학년, 4학년 수준에 맞아야 한다. 
-7. 요구사항을 반영한 맞춤형 교육과정 구성
-8. 교수학습 방법의 다양화
-9. 객관적이고 공정한 평가계획 수립
-10.초등학교 수준에 맞는 내용 구성성
-"""
+# pandas, langchain, 검색 색인은 처음 필요할 때 함수 안에서 불러온다 (첫 화면 표시 시간 단축)
+from generation import LESSON_COLUMNS, SYSTEM_PROMPT, VARIANT_FIELDS, lesson_plan_key, make_code_prefix
+from llm import ModelRouter, get_api_key, load_model_config, traffic_mode
+from plan_model import Plan
+from profiler import profile_rerun, profile_section, profiled
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GUIDANCE_DIR = os.path.join(BASE_DIR, "faiss_index")
+# 답변 캐시 등 실행 중에 생기는 파일을 저장하는 폴더
+DATA_DIR = os.environ.get("APP_DATA_DIR", os.path.join(BASE_DIR, ".app_data"))
 
 def sidebar_typewriter_effect(text, delay=0.001):
     placeholder = st.sidebar.empty()
@@ -40,13 +29,15 @@ def sidebar_typewriter_effect(text, delay=0.001):
     return output
 
 
-def set_page_config():
-    try:
-        st.set_page_config(page_title="학교자율시간 올인원", page_icon="📚", layout="wide")
-    except Exception as e:
-        st.error(f"페이지 설정 오류: {e}")
+def minify_css(css):
+    """주석과 불필요한 공백을 없애 rerun 마다 보내는 스타일 블록을 줄인다"""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};:,>])\s*", r"\1", css).strip()
+
 
-    st.markdown("""
+# 페이지 스타일 (모듈을 불러올 때 한 번만 만들어 두고 매 rerun 같은 문자열을 보낸다)
+PAGE_CSS = minify_css("""
     <style>
     .main .block-container {
         padding: 2rem;
@@ -198,7 +189,16 @@ def set_page_config():
         background: #e2e8f0 !important;
     }
     </style>
-    """, unsafe_allow_html=True)
+""")
+
+
+def set_page_config():
+    try:
+        st.set_page_config(page_title="학교자율시간 올인원", page_icon="📚", layout="wide")
+    except Exception as e:
+        st.error(f"페이지 설정 오류: {e}")
+
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
 
 
 def show_progress():
@@ -234,247 +234,203 @@ def show_progress():
     st.markdown(html, unsafe_allow_html=True)
 
 
-def make_code_prefix(grades, subjects, activity_name):
-    """학년/교과/활동명을 바탕으로 성취기준 코드의 접두사(prefix)를 생성"""
-    grade_part = ""
-    if grades and len(grades) > 0:
-        grade_part = grades[0].replace("학년", "").replace("학년군","").strip()
-    
-    subject_part = ""
-    if subjects and len(subjects) > 0:
-        s = subjects[0]
-        if s:
-            subject_part = s[0]
-    
-    act_part = ""
-    if activity_name and len(activity_name) > 0:
-        act_part = activity_name[:2]
-    
-    code_prefix = f"{grade_part}{subject_part}{act_part}"
-    return code_prefix
+@st.cache_resource(show_spinner=False)
+def get_model_router():
+    """호출 경로별 모델 선택 (secrets 의 [models] 로 변경 가능), 사용량은 DATA_DIR 에 기록"""
+    tiers, routes = load_model_config()
+    return ModelRouter(tiers, routes, usage_path=os.path.join(DATA_DIR, "llm_usage.jsonl"))
+
+
+# 작업자 프로세스 사용 시: 작업을 가져갈 작업자를 기다리는 시간과 작업 전체 제한 시간 (초)
+JOB_CLAIM_TIMEOUT = 30
+JOB_TIMEOUT = 600
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_queue():
+    """APP_WORKERS 가 설정되면 생성/내보내기 작업을 작업자 프로세스에 맡긴다 (없으면 None)
+
+    APP_WORKERS=4 처럼 숫자면 이 서버가 작업자 프로세스를 직접 띄우고,
+    external 이면 따로 실행한 작업자(python job_queue.py worker)만 사용한다.
+    """
+    workers = os.environ.get("APP_WORKERS", "").strip().lower()
+    if workers in ("", "0"):
+        return None
+    import subprocess
+    import sys
+    from job_queue import JobQueue
+
+    queue = JobQueue(os.path.join(DATA_DIR, "jobs.sqlite3"))
+    if workers.isdigit():
+        subprocess.Popen([sys.executable, os.path.join(BASE_DIR, "job_queue.py"), "worker",
+                          "-n", workers, "--queue", queue.path, "--exit-with-parent"])
+    return queue
+
+
+def current_session_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else None
+
+
+def run_generation_job(kind, payload):
+    """생성/내보내기 작업 실행: 작업자가 있으면 큐에 넣고 이 세션이 결과를 기다린다
+
+    작업자 쪽에서 난 ValueError(형식 검증 실패)는 ValueError 로 다시 내서 호출한 쪽 처리를 그대로 쓴다.
+    """
+    from job_queue import JobError, JobTimeoutError, NoWorkerError, run_job
+
+    queue = get_job_queue()
+    if queue is not None:
+        job_id = queue.submit(kind, payload, session_id=current_session_id())
+        try:
+            return queue.wait(job_id, timeout=JOB_TIMEOUT, claim_timeout=JOB_CLAIM_TIMEOUT)
+        except NoWorkerError:
+            st.warning("작업자 프로세스가 응답하지 않아 이 화면에서 직접 처리합니다.")
+        except JobTimeoutError:
+            raise RuntimeError(f"생성이 {JOB_TIMEOUT // 60}분 안에 끝나지 않아 취소했습니다. 잠시 후 다시 시도해 주세요.")
+        except JobError as e:
+            if e.error_type == "ValueError":
+                raise ValueError(str(e))
+            raise RuntimeError(f"{e.error_type}: {e}")
+    return run_job(kind, payload, get_model_router())
+
+
+def run_generation_jobs(kind, payloads, max_parallel=None):
+    """같은 종류의 작업 여러 개를 동시에 실행하고 [(결과, 오류), ...] 를 payloads 순서대로 반환
+
+    작업자가 있으면 큐에 넣어 여러 작업자가 나눠 처리하고, 없으면 이 프로세스의 스레드에서 실행한다.
+    한 번에 진행하는 작업은 max_parallel 개까지 (None 이면 전부).
+    스레드에서는 st 를 쓸 수 없으므로 오류는 모아서 돌려준다.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from job_queue import JobError, JobTimeoutError, NoWorkerError, run_job
+
+    queue = get_job_queue()
+    router = get_model_router()
+    session_id = current_session_id()
+
+    def run(payload):
+        if queue is not None:
+            job_id = queue.submit(kind, payload, session_id=session_id)
+            try:
+                return queue.wait(job_id, timeout=JOB_TIMEOUT, claim_timeout=JOB_CLAIM_TIMEOUT)
+            except NoWorkerError:
+                pass
+            except JobTimeoutError:
+                raise RuntimeError(f"생성이 {JOB_TIMEOUT // 60}분 안에 끝나지 않아 취소했습니다. 잠시 후 다시 시도해 주세요.")
+            except JobError as e:
+                raise (ValueError if e.error_type == "ValueError" else RuntimeError)(f"{e.error_type}: {e}")
+        return run_job(kind, payload, router)
+
+    with ThreadPoolExecutor(max_workers=max(min(len(payloads), max_parallel or len(payloads)), 1)) as pool:
+        futures = [pool.submit(run, payload) for payload in payloads]
+    return [(None, f.exception()) if f.exception() else (f.result(), None) for f in futures]
+
+
+# 인스턴스당 동시에 진행하는 생성 요청 수 (APP_MAX_GENERATIONS, 0 이면 제한 없음). 나머지는 순서대로 대기
+DEFAULT_MAX_GENERATIONS = 4
+# 생성 종류별 처음 예상 소요 시간 (초). 이후에는 실제 소요 시간의 평균으로 바뀐다
+GENERATION_ESTIMATES = {"step1": 10, "step3": 25, "step4": 25, "step5": 30, "lesson_plans": 90, "grade_variants": 150}
+
+
+@st.cache_resource(show_spinner=False)
+def get_admission_controller():
+    limit = os.environ.get("APP_MAX_GENERATIONS", str(DEFAULT_MAX_GENERATIONS)).strip()
+    limit = int(limit) if limit.isdigit() else DEFAULT_MAX_GENERATIONS
+    if limit == 0:
+        return None
+    from admission import AdmissionController
+
+    return AdmissionController(limit, estimates=GENERATION_ESTIMATES)
+
+
+def format_wait(seconds):
+    seconds = max(1, int(round(seconds)))
+    return f"{seconds}초" if seconds < 60 else f"{seconds // 60}분 {seconds % 60}초"
+
+
+def generation_parallelism(count):
+    """여러 생성을 한꺼번에 돌리는 요청이 동시에 진행할 수 있는 수 (동시 실행 한도 이내)"""
+    controller = get_admission_controller()
+    return controller.weight_for(count) if controller is not None else max(1, min(count, DEFAULT_MAX_GENERATIONS))
+
+
+@contextmanager
+def generation_slot(kind, label="생성 중...", weight=1):
+    """생성 요청을 동시 실행 한도 안에서 실행. 자리가 날 때까지 대기 순번과 예상 대기 시간을 보여 준다
+
+    weight 는 이 요청이 동시에 돌리는 생성 수로, 그만큼 자리를 차지한다.
+    """
+    controller = get_admission_controller()
+    if controller is not None:
+        notice = st.empty()
+
+        def show_position(position, eta):
+            notice.info(f"⏳ 다른 선생님들의 생성 요청이 진행 중입니다. 대기 순번 {position}번 · 예상 대기 약 {format_wait(eta)}")
+
+        with controller.slot(kind, on_wait=show_position, weight=weight):
+            notice.empty()
+            with st.spinner(label):
+                yield
+        return
+    with st.spinner(label):
+        yield
+
+
+@st.cache_resource(show_spinner=False)
+def get_guidance_retriever():
+    """도움자료 검색기 (프로세스당 한 번만 로딩하여 모든 세션이 공유)"""
+    from guidance import GuidanceRetriever
+
+    return GuidanceRetriever(
+        docstore_path=os.path.join(GUIDANCE_DIR, "docstore.bin"),
+        pickle_path=os.path.join(GUIDANCE_DIR, "index.pkl"),
+        bm25_path=os.path.join(GUIDANCE_DIR, "bm25.npz"),
+        vector_dir=os.path.join(GUIDANCE_DIR, "vectors"),
+        api_key=get_api_key()
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def retrieve_guidance(activity_name, grades, subjects):
+    """(활동명, 학년, 교과) 별 도움자료 검색 결과 캐시 - 3~5단계가 한 번의 검색 결과를 같이 사용"""
+    return get_guidance_retriever().retrieve(activity_name, list(grades), list(subjects))
+
+
+def build_guidance_block(data):
+    """3~5단계 프롬프트에 덧붙일 도움자료 발췌 (검색 실패 시 빈 문자열)"""
+    try:
+        passages = retrieve_guidance(
+            data.get('activity_name', ''),
+            tuple(data.get('grades', [])),
+            tuple(data.get('subjects', []))
+        )
+    except Exception as e:
+        st.warning(f"도움자료 검색 오류: {e} → 참고 자료 없이 생성합니다.")
+        return ""
+    from guidance import format_guidance
+    return format_guidance(passages)
 
 
 def generate_content(step, data):
     """step별로 AI 프롬프트를 구성하고 JSON 형식의 응답을 받아 parsing하는 함수"""
-    
     try:
-        necessity = data.get('necessity', '')
-        overview = data.get('overview', '')
-        standards = data.get('standards', [])
-        content_sets = data.get("content_sets", [])
-        num_sets = len(content_sets)
-
-        step_prompts = {
-            1: f"""학교자율시간 활동의 기본 정보를 작성해주세요.
-
-활동명: {data.get('activity_name')}
-요구사항: {data.get('requirements')}
-학교급: {data.get('school_type')}
-대상 학년: {', '.join(data.get('grades', []))}
-연계 교과: {', '.join(data.get('subjects', []))}
-총 차시: {data.get('total_hours')}차시
-운영 학기: {', '.join(data.get('semester', []))}
-
-아래 예시와 같이, 주어진 **활동명**에 종속되어 결과물이 도출되도록 
-'필요성(necessity)', '개요(overview)'만 작성해 주세요.
-
-지침
-1. 필요성은 예시의 2~3배 분량으로 작성해주세요.
-2. 개요는 괄호( )로 목적·목표·주요 내용을 구분해 주세요
-
-[예시]
-필요성:
- - 불확실한 미래사회를 살아갈 학생들에게 필수적 요소인 디지털 기기의 바른 이해와 사용법에 대한 학습이 필요
- - 디지털 기기 활용뿐 아니라 디지털 윤리에 관한 학습을 통해 디지털 리터러시와 책임감 있는 디지털 시민으로서의 역량 함양 필요
-
-개요:
- <목적>
- - 디지털 기기 사용 경험을 바탕으로, 디지털 기술의 원리와 활용, 윤리적 문제점을 탐구하며 안전하고 책임감 있는 디지털 시민으로 성장
- <목표>
- - 디지털 기기의 작동 원리와 활용 방법을 이해한다.
- - 디지털 기기를 안전하고 책임감 있게 사용하는 방법을 익힌다.
- <주요 내용>
- - 디지털 기기 작동 원리 및 간단한 프로그래밍
- - 디지털 기기를 활용한 다양한 창작 활동
- - 디지털 윤리에 대한 이해와 실천
-
-다음 JSON 형식으로 작성 (성격은 제외):
-{{
-  "necessity": "작성된 필요성 내용",
-  "overview": "작성된 개요 내용"
-}}
-""",
-
-            3: f"""
-활동명: {data.get('activity_name')} 부합되도록 작성해주세요.
-요구사항: {data.get('requirements')}을 가장 많이 반영해서 작성하면 좋겠어.
-학교급: {data.get('school_type')}도 반영해야 한다. 
-대상 학년: {', '.join(data.get('grades', []))}을 고려해서 작성해야 한다.
-연계 교과: {', '.join(data.get('subjects', []))}
-이전 단계 결과를 참고하여 작성하기
-핵심 아이디어는 IB교육육에서 이야기 하는 빅아이디어와 같은 거야. 학생들이 도달 할 수 있는 일반화된 이론이야 예시처럼 문장으로 진술해주세요.
-'영역명(domain)', '핵심 아이디어(key_ideas)', '내용 요소(content_elements)'(지식·이해 / 과정·기능 / 가치·태도) 4개 세트를 생성... 를 JSON 구조로 작성해주세요. 
-'content_elements'에는 **'knowledge_and_understanding'(지식·이해), 'process_and_skills'(과정·기능), 'values_and_attitudes'(가치·태도)**가 반드시 포함되어야 합니다.
-예시를 참고하여 작성해주세요.
-영역명도 창의적으로 다르게 구성하여 주세요 
-
-<예시>
-영역명
- 기후위기와 기후행동
-
-핵심 아이디어
- - 인간은 여러 활동을 통해 기후변화를 초래하였고, 기후변화는 우리의 삶에 다방면으로 영향을 미친다.
- - 우리는 직면한 기후변화 문제를 완화하거나 적응함으로써 대처하며 생활 속에서 자신이 실천할 수 있는 방법을 탐색하고 행동해야 한다.
-
-내용 요소
- -지식·이해
-  • 기후변화와 우리 삶의 관계
-  • 기후변화와 식생활
- -과정·기능
-  • 의사소통 및 갈등해결
-  • 창의적 문제해결
- -가치·태도
-  • 환경 공동체의식
-  • 환경 실천
-
-JSON 형식으로만 작성하고, 불필요한 문장은 쓰지 마세요. 추가 문장 없이 JSON만 반환
-총 4개의 객체가 있는 JSON 배열
-
-JSON 예시:
-[
-  {{
-    "domain": "...",
-    "key_ideas": [...],
-    "content_elements": {{
-      "knowledge_and_understanding": [...],
-      "process_and_skills": [...],
-      "values_and_attitudes": [...]
-    }}
-  }},
-  ...
-]
-""",
-
-            4: f"""
-이전 단계
-활동명: {data.get('activity_name')}
-요구사항: {data.get('requirements')}
-학교급: {data.get('school_type')}
-대상 학년: {', '.join(data.get('grades', []))}
-연계 교과: {', '.join(data.get('subjects', []))} 
-내용 체계: {content_sets}
-
-총 {num_sets}개 내용체계 세트가 생성되었으므로, 성취기준도 {num_sets}개 생성.
-
-아래는 학년/교과/활동명에서 추출한 코드 접두사입니다:
-code_prefix: "{make_code_prefix(data.get('grades', []), data.get('subjects', []), data.get('activity_name',''))}"
-
-지침:
-1. 성취기준코드는 반드시 code_prefix에 -01, -02, ... 식으로 순서 붙여 생성.
-2. 성취기준은 내용체계표와 내용이 비슷하고 문장의 형식은 아래 예시를 참고:
-   [4사세계시민-01] 글을 읽고 지구촌의 여러 문제를 이해하고 생각한다.
-3. 성취기준 levels는 A/B/C (상/중/하) 세 단계 작성.
-
-JSON 예시:
-[
-  {{
-    "code": "code_prefix-01",
-    "description": "성취기준 설명",
-    "levels": [
-      {{ "level": "A", "description": "상 수준 설명" }},
-      {{ "level": "B", "description": "중 수준 설명" }},
-      {{ "level": "C", "description": "하 수준 설명" }}
-    ]
-  }},
-  ...
-]
-""",
-
-            5: f"""
-이전 단계(성취기준): {standards}
-1.평가요소, 수업평가방법, 평가기준은 예시문을 참고해서 작성해주세요
-2.평가기준은 상,중,하로 나누어서 작성하여 주세요.
-3.평가요소는 ~하기 형식으로 만들어 주세요.
-4.다시 강조하지만 예시문 아래 예시문 형식으로 작성하여 주세요
-
-<예시>
-평가요소
- - 국가유산의 의미와 유형 알아보고 가치 탐색하기
-수업평가방법
- [개념학습/프로젝트]
- - 국가유산의 의미를 이해하게 한 후 기준을 세워 국가유산을 유형별로 알아보고 문화유산의 가치를 파악하는지 평가하기
-평가기준
- - 상:국가유산의 의미와 유형을 정확하게 이해하고 지역의 국가유산 조사를 통해 국가유산의 가치를 설명할 수 있다.
- - 중:국가유산의 의미와 유형을 이해하고 지역의 국가유산 조사를 통해 국가유산의 가치를 설명할 수 있다.
- - 하:주변의 도움을 받아 국가유산의 의미와 유형을 설명할 수 있다.
-
-"teaching_methods_text"교수학습도 예시문을 참고해서 작성하여 주세요
-<예시>
-- 인간 활동으로 발생한 환경 영향의 긍정적인 사례와 부정적인 사례를 균형적으로 탐구하여 인간과 환경에 대한 다양한 측면을 이해하도록 한다.
-- 다양한 사례를 통하여 환경오염의 현상을 이해하도록 지도하고 지속가능한 발전으로 이어질 수 있도록 내면화에 노력한다. 
-- 학교나 지역의 다양한 체험활동 장소와 주제에 따른 계절을 고려하여 학습계획을 세워 학습을 진행한다. 
-- 탐구 및 활동 시에는 사전 준비와 안전교육 등을 통하여 탐구과정에서 발생할 수 있는 안전사고를 예방하도록 한다. 
-
-"teaching_methods_text": 문자열 (여러 줄 가능),
-"assessment_plan": 리스트
-아래 예시 형식으로 JSON을 작성해주세요.
-- 평가기준은 '상', '중', '하' 각각을 별도 필드로 기재 (criteria_high, criteria_mid, criteria_low)
-
-JSON 예시:
-{{
-  "teaching_methods_text": "교수학습방법 여러 줄...",
-  "assessment_plan": [
-    {{
-      "code": "성취기준코드(예: code_prefix-01)",
-      "description": "성취기준문장",
-      "element": "평가요소",
-      "method": "수업평가방법",
-      "criteria_high": "상 수준 평가기준",
-      "criteria_mid": "중 수준 평가기준",
-      "criteria_low": "하 수준 평가기준"
-    }},
-    ...
-  ]
-}}
-"""
-        }
-
         # step 2, 6, 7은 별도의 프롬프트 없이 빈 dict 반환
         if step in [2, 6, 7]:
             return {}
 
-        prompt = step_prompts.get(step, "")
-        if not prompt:
-            return {}
-
-        messages = [
-            SystemMessage(content=SYSTEM_PROMPT),
-            HumanMessage(content=prompt + "\n\n(위 형식으로 JSON만 반환)")
-        ]
-        chat = ChatOpenAI(
-            openai_api_key=OPENAI_API_KEY,
-            model="gpt-4o",
-            temperature=0.7,
-            max_tokens=1800
-        )
-        response = chat(messages)
-        raw_text = response.content.strip().replace('```json','').replace('```','').strip()
+        guidance = ""
+        if step in [3, 4, 5] and data.get("use_guidance", True):
+            guidance = build_guidance_block(data)
 
         try:
-            parsed = json.loads(raw_text)
-            # 5단계 검증
-            if step == 5:
-                if not isinstance(parsed, dict):
-                    raise ValueError("5단계 응답은 dict여야 합니다.")
-                if "teaching_methods_text" not in parsed or "assessment_plan" not in parsed:
-                    raise ValueError("teaching_methods_text, assessment_plan 키가 모두 필요.")
-                for ap in parsed["assessment_plan"]:
-                    for field in ["code","description","element","method","criteria_high","criteria_mid","criteria_low"]:
-                        if field not in ap:
-                            raise ValueError(f"assessment_plan 항목에 '{field}' 누락")
-            return parsed
-
-        except (json.JSONDecodeError, ValueError) as e:
+            # 경로별 모델로 요청하고, 형식 검증에 실패하면 상위 모델로 다시 요청 (작업자 프로세스에서 실행될 수 있음)
+            return run_generation_job("step", {"step": step, "data": dict(data), "guidance": guidance})
+
+        except ValueError as e:
             st.warning(f"JSON 파싱 오류(단계 {step}): {e} → 기본값 반환")
             # 단계별 기본값 반환
             if step == 3:
@@ -497,6 +453,131 @@ JSON 예시:
         return {}
 
 
+@st.cache_resource(show_spinner=False)
+def get_plan_index():
+    """완성된 계획서 색인 (프로세스당 하나, 디스크에 저장되어 세션·프로세스 간 공유)"""
+    from plan_index import PlanIndex
+
+    return PlanIndex(os.path.join(DATA_DIR, "plans.sqlite3"))
+
+
+def find_similar_plans(data):
+    """입력한 기본 정보와 비슷한 기존 계획 [(유사도, 요약), ...] (검색 실패 시 빈 목록)"""
+    try:
+        return get_plan_index().search(data, k=3)
+    except Exception as e:
+        st.warning(f"기존 계획 검색 오류: {e}")
+        return []
+
+
+def remember_completed_plan(data):
+    """최종 검토까지 온 계획을 색인에 추가 (같은 내용은 세션에서 한 번만)"""
+    if not data.get("standards") or not data.get("lesson_plans"):
+        return
+    try:
+        from plan_index import plan_content_hash
+
+        plan_hash = plan_content_hash(data)
+        if st.session_state.get("indexed_plan_hash") != plan_hash:
+            get_plan_index().add(data.to_dict())
+            st.session_state.indexed_plan_hash = plan_hash
+    except Exception as e:
+        st.warning(f"계획 저장 오류: {e}")
+
+
+def start_from_plan(plan_id):
+    """기존 계획의 생성 결과를 가져와 1~6단계를 수정 화면으로 연다 (LLM 호출 없음)"""
+    from plan_index import PLAN_CONTENT_FIELDS
+
+    plan = get_plan_index().get(plan_id)
+    if not plan:
+        st.session_state.pop("plan_matches", None)
+        return
+    data = st.session_state.data
+    for field in PLAN_CONTENT_FIELDS:
+        if field in plan:
+            data[field] = plan[field]
+
+    # 성취기준 코드는 새로 입력한 학년/교과/활동명 기준의 접두사로 바꾼다
+    old_prefix = make_code_prefix(plan.get('grades', []), plan.get('subjects', []), plan.get('activity_name', ''))
+    new_prefix = make_code_prefix(data.get('grades', []), data.get('subjects', []), data.get('activity_name', ''))
+    if old_prefix and old_prefix != new_prefix:
+        for field in ["standards", "assessment_plan"]:
+            data[field] = [dict(item, code=str(item.get("code", "")).replace(old_prefix, new_prefix, 1))
+                           for item in data.get(field, [])]
+
+    for step in [1, 3, 4, 5]:
+        st.session_state[f"generated_step_{step}"] = True
+    # 차시 수가 다르면 차시별 계획은 새로 생성
+    if len(data.get("lesson_plans", [])) == data.get("total_hours"):
+        st.session_state.generated_step_6 = True
+    else:
+        data.pop("lesson_plans", None)
+    st.session_state.pop("plan_matches", None)
+
+
+# 내려받은 계획서의 검토 화면 항목 -> 그 항목을 만드는 단계
+SECTION_STEPS = {"기본정보": 1, "내용체계": 3, "성취기준": 4, "교수학습 및 평가": 5, "차시별계획": 6}
+
+
+def import_workbook(content):
+    """내려받은 계획서 Excel 을 불러와 최종 검토 화면으로 간다 (LLM 호출 없음)"""
+    from workbook_import import WorkbookImportError, parse_workbook
+
+    try:
+        imported, sections = parse_workbook(content)
+    except WorkbookImportError as e:
+        st.error(str(e))
+        return
+    if not imported.get("total_hours") and imported.get("lesson_plans"):
+        imported["total_hours"] = len(imported["lesson_plans"])
+    st.session_state.data = Plan.from_dict(imported)
+    for section in sections:
+        st.session_state[f"generated_step_{SECTION_STEPS[section]}"] = True
+    st.session_state.pop("plan_matches", None)
+    st.session_state.imported_sections = sections
+    st.session_state.step = 7
+    st.rerun()
+
+
+def show_workbook_import():
+    """1단계 위: 예전에 내려받은 계획서(Excel)로 바로 검토·수정 시작"""
+    with st.expander("내려받은 계획서(Excel) 불러오기"):
+        st.caption("이 앱에서 내려받은 계획서 파일을 올리면 생성 없이 최종 검토 화면에서 바로 수정할 수 있습니다.")
+        uploaded = st.file_uploader("계획서 파일", type=["xlsx"], key="workbook_upload", label_visibility="collapsed")
+        if st.button("불러와서 검토하기", key="import_workbook", disabled=uploaded is None, use_container_width=True):
+            import_workbook(uploaded.getvalue())
+
+
+def generate_basic_info():
+    with generation_slot("step1", "정보 생성 중..."):
+        basic_info = generate_content(1, st.session_state.data)
+        if basic_info:
+            st.session_state.data.update(basic_info)
+            st.success("기본 정보 생성 완료.")
+            st.session_state.generated_step_1 = True
+
+
+def show_similar_plans():
+    """비슷한 기존 계획 목록: 골라서 시작하거나 새로 생성"""
+    st.info("입력한 내용과 비슷한 기존 계획이 있습니다. 기존 계획에서 시작하면 생성 시간 없이 바로 수정할 수 있습니다.")
+    for score, plan in st.session_state.plan_matches:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.markdown(
+                f"**{plan['activity_name']}** · {', '.join(plan['grades'])} · {', '.join(plan['subjects'])} · "
+                f"{plan.get('total_hours') or '-'}차시 (유사도 {score:.0%})"
+            )
+            if plan.get("requirements"):
+                st.caption(plan["requirements"][:120])
+        with col2:
+            st.button("이 계획에서 시작", key=f"use_plan_{plan['id']}",
+                      on_click=start_from_plan, args=(plan['id'],), use_container_width=True)
+    if st.button("새로 생성", key="skip_similar_plans", use_container_width=True):
+        st.session_state.pop("plan_matches", None)
+        generate_basic_info()
+
+
 def show_step_1():
     st.markdown("<div class='step-header'><h3>1단계: 기본 정보</h3></div>", unsafe_allow_html=True)
 
@@ -509,6 +590,8 @@ def show_step_1():
         st.session_state.data["subjects"] = []
 
     if 'generated_step_1' not in st.session_state:
+        show_workbook_import()
+
         # 학교급 선택을 form 밖으로 이동
         school_type = st.radio(
             "학교급",
@@ -582,28 +665,48 @@ def show_step_1():
                 help="필요한 요구사항이나 핵심 요구 내용을 적어주세요.",
                 height=100
             )
+            use_guidance = st.checkbox(
+                "학교자율시간 도움자료를 참고하여 생성 (3~5단계)",
+                value=st.session_state.data.get('use_guidance', True),
+                help="내용체계·성취기준·평가계획을 만들 때 교육청 도움자료에서 관련 내용을 찾아 함께 제시합니다."
+            )
+            grade_variants = st.checkbox(
+                "학년별 계획 따로 만들기 (학년을 2개 이상 고른 경우)",
+                value=st.session_state.data.get('grade_variants', False),
+                help="기본정보와 내용체계는 함께 쓰고, 성취기준·평가계획·차시별 계획은 학년마다 동시에 따로 생성하여 한 Excel 파일로 내려받습니다."
+            )
 
             submit_button = st.form_submit_button("정보 생성 및 다음 단계로", use_container_width=True)
 
         if submit_button:
             if activity_name and requirements and grades and subjects and semester:
-                with st.spinner("정보 생성 중..."):
-                    st.session_state.data["school_type"] = school_type
-                    st.session_state.data["grades"] = grades
-                    st.session_state.data["subjects"] = subjects
-                    st.session_state.data["activity_name"] = activity_name
-                    st.session_state.data["requirements"] = requirements
-                    st.session_state.data["total_hours"] = total_hours
-                    st.session_state.data["semester"] = semester
-
-                    basic_info = generate_content(1, st.session_state.data)
-                    if basic_info:
-                        st.session_state.data.update(basic_info)
-                        st.success("기본 정보 생성 완료.")
-                        st.session_state.generated_step_1 = True
+                # 학년 구성이 바뀌거나 학년별 계획을 끄면 학년별 결과는 버린다
+                if not grade_variants or list(grades) != st.session_state.data.get("grades", []):
+                    st.session_state.data.pop("variants", None)
+                    st.session_state.data.pop("variant_grade", None)
+                st.session_state.data["school_type"] = school_type
+                st.session_state.data["grades"] = grades
+                st.session_state.data["subjects"] = subjects
+                st.session_state.data["activity_name"] = activity_name
+                st.session_state.data["requirements"] = requirements
+                st.session_state.data["total_hours"] = total_hours
+                st.session_state.data["semester"] = semester
+                st.session_state.data["use_guidance"] = use_guidance
+                st.session_state.data["grade_variants"] = grade_variants and len(grades) > 1
+
+                # 비슷한 기존 계획이 있으면 먼저 보여주고, 없으면 바로 생성
+                matches = find_similar_plans(st.session_state.data)
+                if matches:
+                    st.session_state.plan_matches = matches
+                else:
+                    st.session_state.pop("plan_matches", None)
+                    generate_basic_info()
             else:
                 st.error("모든 필수 항목을 입력해주세요.")
 
+        if st.session_state.get("plan_matches"):
+            show_similar_plans()
+
     if 'generated_step_1' in st.session_state:
         with st.form("edit_basic_info_form"):
             st.markdown("#### 생성된 내용 수정")
@@ -660,7 +763,10 @@ def show_step_2_approval():
         st.rerun()
 
 
+@profiled()
 def create_approval_excel_document(selected_fields):
+    import pandas as pd
+
     output = BytesIO()
     all_fields = {
         "학교급": st.session_state.data.get('school_type', ''),
@@ -694,7 +800,7 @@ def show_step_3():
             st.info("영역명, 핵심 아이디어, 내용 요소를 **4세트** 생성합니다.")
             submit_btn = st.form_submit_button("4세트 생성 및 다음 단계로", use_container_width=True)
         if submit_btn:
-            with st.spinner("생성 중..."):
+            with generation_slot("step3"):
                 content = generate_content(3, st.session_state.data)
                 if isinstance(content, list) and len(content) == 4:
                     st.session_state.data["content_sets"] = content
@@ -764,18 +870,8 @@ def show_step_3():
 
         if submit_edit:
             with st.spinner("저장 중..."):
+                # domain, key_ideas, content_elements 는 content_sets 에서 계산된다 (plan_model.Plan)
                 st.session_state.data["content_sets"] = new_sets
-                combined_key_ideas = []
-                for cset in new_sets:
-                    combined_key_ideas.extend(cset.get("key_ideas", []))
-                st.session_state.data["key_ideas"] = combined_key_ideas
-
-                if new_sets:
-                    st.session_state.data["domain"] = new_sets[0]["domain"]
-                    st.session_state.data["content_elements"] = new_sets[0]["content_elements"]
-                else:
-                    st.session_state.data["domain"] = ""
-                    st.session_state.data["content_elements"] = {}
 
                 del st.session_state.generated_step_3
                 st.success("4세트 내용 저장 완료.")
@@ -784,8 +880,177 @@ def show_step_3():
     return False
 
 
+STANDARD_COLUMNS = ["code", "description", "level_A", "level_B", "level_C"]
+STANDARD_LABELS = {
+    "code": "성취기준 코드",
+    "description": "성취기준 설명",
+    "level_A": "상(A) 수준",
+    "level_B": "중(B) 수준",
+    "level_C": "하(C) 수준"
+}
+
+ASSESSMENT_COLUMNS = ["code", "description", "element", "method", "criteria_high", "criteria_mid", "criteria_low"]
+ASSESSMENT_LABELS = {
+    "code": "코드",
+    "description": "성취기준",
+    "element": "평가요소",
+    "method": "수업평가방법",
+    "criteria_high": "상 수준 기준",
+    "criteria_mid": "중 수준 기준",
+    "criteria_low": "하 수준 기준"
+}
+
+
+def standards_to_rows(standards):
+    """성취기준 목록을 표 편집용 행(수준별 설명을 열로 펼침)으로 변환"""
+    rows = []
+    for std in standards:
+        levels = {lv.get('level'): lv.get('description', '') for lv in std.get('levels', [])}
+        rows.append({
+            "code": std.get('code', ''),
+            "description": std.get('description', ''),
+            "level_A": levels.get('A', ''),
+            "level_B": levels.get('B', ''),
+            "level_C": levels.get('C', '')
+        })
+    return rows
+
+
+def rows_to_standards(rows):
+    """표 편집용 행을 성취기준 목록 형식으로 되돌림"""
+    return [{
+        "code": row["code"].strip(),
+        "description": row["description"],
+        "levels": [
+            {"level": "A", "description": row["level_A"]},
+            {"level": "B", "description": row["level_B"]},
+            {"level": "C", "description": row["level_C"]}
+        ]
+    } for row in rows]
+
+
+def apply_row_edits(rows, edited_rows, columns):
+    """st.data_editor 의 edited_rows({행 번호: {열: 값}})에 있는 칸만 원본 목록에 반영한 새 목록"""
+    updated = []
+    for i, row in enumerate(rows):
+        row = {col: row.get(col, "") for col in columns}
+        for col, value in edited_rows.get(i, edited_rows.get(str(i), {})).items():
+            if col in row:
+                row[col] = "" if value is None else str(value)
+        updated.append(row)
+    return updated
+
+
+def validate_rows(rows, required, labels, unique=None):
+    """표 전체를 한 번에 검사하여 오류 메시지 목록 반환 (빈 칸, 중복 값)"""
+    errors = []
+    seen = {}
+    for i, row in enumerate(rows, start=1):
+        empty = [labels.get(col, col) for col in required if not str(row.get(col, "")).strip()]
+        if empty:
+            errors.append(f"{i}행: {', '.join(empty)} 비어 있음")
+        if unique:
+            value = str(row.get(unique, "")).strip()
+            if value and value in seen:
+                errors.append(f"{i}행: {labels.get(unique, unique)} '{value}' 이(가) {seen[value]}행과 중복")
+            seen.setdefault(value, i)
+    return errors
+
+
+def variant_grades(data):
+    """학년별 계획 모드이면 따로 만들 학년 목록, 아니면 빈 리스트"""
+    grades = data.get("grades", [])
+    return list(grades) if data.get("grade_variants") and len(grades) > 1 else []
+
+
+def generation_data():
+    """4~6단계 생성에 넘길 계획 데이터: 학년별 계획이면 지금 편집 중인 학년만 대상으로 한다"""
+    data = st.session_state.data
+    grade = data.get("variant_grade")
+    if not grade:
+        return data
+    return dict({key: value for key, value in data.items() if key not in ("variants", "variant_grade")}, grades=[grade])
+
+
+def switch_variant(grade):
+    """편집할 학년 바꾸기: 지금 학년의 4~6단계 결과를 보관하고 고른 학년의 결과를 불러온다"""
+    data = st.session_state.data
+    variants = dict(data.get("variants") or {})
+    current = data.get("variant_grade")
+    if current in variants:
+        variants[current] = {key: data.get(key) for key in VARIANT_FIELDS}
+    data["variants"] = variants
+    for key in VARIANT_FIELDS:
+        data[key] = variants[grade].get(key, "" if key == "teaching_methods_text" else [])
+    data["variant_grade"] = grade
+    # 표 편집기의 수정 기록은 이전 학년의 행 번호 기준이므로 버린다
+    for key in ("standards_editor", "assessment_editor", "lesson_plans_editor"):
+        st.session_state.pop(key, None)
+
+
+def show_variant_selector():
+    """학년별 계획이 있으면 편집·검토할 학년을 고르는 버튼 (4~7단계 위)"""
+    data = st.session_state.data
+    grades = list(data.get("variants") or {})
+    if not grades:
+        return
+    current = data.get("variant_grade")
+    st.radio(
+        "학년별 계획", grades,
+        index=grades.index(current) if current in grades else 0,
+        horizontal=True, key="variant_grade_radio",
+        on_change=lambda: switch_variant(st.session_state.variant_grade_radio),
+        help="성취기준·교수학습 및 평가·차시별 계획은 학년마다 따로 있습니다. 저장하지 않은 수정사항은 학년을 바꾸면 사라집니다."
+    )
+
+
+def generate_grade_variants(grades):
+    """학년별 계획 모드: 내용체계까지의 공통 결과로 학년마다 성취기준·교수학습 및 평가·차시별 계획을 동시에 생성"""
+    data = st.session_state.data
+    shared = {key: value for key, value in data.items() if key not in ("variants", "variant_grade")}
+    payloads = []
+    for grade in grades:
+        grade_data = dict(shared, grades=[grade])
+        guidance = build_guidance_block(grade_data) if data.get("use_guidance", True) else ""
+        payloads.append({"data": grade_data, "guidance": guidance, "checkpoint_path": get_lesson_checkpoints().path,
+                         "checkpoint_owner": checkpoint_owner()})
+
+    # 학년마다 생성 하나씩이므로 동시에 돌리는 학년 수만큼 자리를 차지하고, 그보다 많으면 차례로 돌린다
+    parallel = generation_parallelism(len(payloads))
+    with generation_slot("grade_variants", f"{', '.join(grades)} 계획 동시 생성 중...", weight=parallel):
+        results = run_generation_jobs("grade_variant", payloads, max_parallel=parallel)
+
+    variants = dict(data.get("variants") or {})
+    for grade, (result, error) in zip(grades, results):
+        if error is not None:
+            st.error(f"{grade} 계획 생성 중 오류: {error}")
+        else:
+            variants[grade] = result
+    if not variants:
+        return
+    data["variants"] = variants
+    switch_variant(data.get("variant_grade") if data.get("variant_grade") in variants else next(iter(variants)))
+    for step in [4, 5, 6]:
+        st.session_state[f"generated_step_{step}"] = True
+    st.success(f"{', '.join(g for g in grades if g in variants)} 계획 생성 완료.")
+
+
 def show_step_4():
+    import pandas as pd
+
     st.markdown("<div class='step-header'><h3>4단계: 성취기준 설정</h3></div>", unsafe_allow_html=True)
+    missing_grades = [g for g in variant_grades(st.session_state.data) if g not in (st.session_state.data.get("variants") or {})]
+    if missing_grades:
+        # 학년별 계획: 4~6단계를 학년마다 한 번에 생성한 뒤 학년을 골라 가며 수정
+        with st.form("grade_variants_form"):
+            st.info(f"{', '.join(missing_grades)}의 성취기준·교수학습 및 평가·차시별 계획을 학년마다 동시에 생성합니다. "
+                    "기본정보와 내용체계는 모든 학년이 함께 씁니다.")
+            submit_button = st.form_submit_button("학년별 계획 생성", use_container_width=True)
+        if submit_button:
+            generate_grade_variants(missing_grades)
+        if not st.session_state.data.get("variants"):
+            return False
+    show_variant_selector()
     code_prefix = make_code_prefix(
         st.session_state.data.get('grades', []),
         st.session_state.data.get('subjects', []),
@@ -799,8 +1064,8 @@ def show_step_4():
             st.info(f"내용체계 세트가 {num_sets}개 생성되었습니다. 따라서 성취기준도 {num_sets}개를 생성합니다.")
             submit_button = st.form_submit_button("생성 및 다음 단계로", use_container_width=True)
         if submit_button:
-            with st.spinner("생성 중..."):
-                standards = generate_content(4, st.session_state.data)
+            with generation_slot("step4"):
+                standards = generate_content(4, generation_data())
                 if isinstance(standards, list) and len(standards) == num_sets:
                     st.session_state.data['standards'] = standards
                     st.success(f"성취기준 {num_sets}개 생성 완료.")
@@ -810,59 +1075,55 @@ def show_step_4():
                     st.session_state.data['standards'] = []
                     st.session_state.generated_step_4 = True
     else:
+        standards = st.session_state.data.get('standards', [])
         with st.form("edit_standards_form"):
             st.markdown("#### 생성된 성취기준 수정")
-            edited_standards = []
-            for i, standard in enumerate(st.session_state.data.get('standards', [])):
-                st.markdown(f"##### 성취기준 {i+1}")
-                code = st.text_input("성취기준 코드", value=standard['code'], key=f"std_code_{i}")
-                description = st.text_area("성취기준 설명", value=standard['description'],
-                                           key=f"std_desc_{i}", height=100)
-                st.markdown("##### 수준별 성취기준 (상, 중, 하)")
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    a_desc = st.text_area("상(A) 수준",
-                                          value=next((l['description'] for l in standard['levels'] if l['level'] == 'A'), ''),
-                                          key=f"std_{i}_level_A", height=100)
-                with col2:
-                    b_desc = st.text_area("중(B) 수준",
-                                          value=next((l['description'] for l in standard['levels'] if l['level'] == 'B'), ''),
-                                          key=f"std_{i}_level_B", height=100)
-                with col3:
-                    c_desc = st.text_area("하(C) 수준",
-                                          value=next((l['description'] for l in standard['levels'] if l['level'] == 'C'), ''),
-                                          key=f"std_{i}_level_C", height=100)
-                edited_standards.append({
-                    "code": code,
-                    "description": description,
-                    "levels": [
-                        {"level": "A", "description": a_desc},
-                        {"level": "B", "description": b_desc},
-                        {"level": "C", "description": c_desc}
-                    ]
-                })
-                st.markdown("---")
+            st.caption("표의 칸을 눌러 바로 수정할 수 있습니다. 수준별 성취기준은 상(A)·중(B)·하(C) 열에 있습니다.")
+            standard_rows = standards_to_rows(standards)
+            st.data_editor(
+                pd.DataFrame(standard_rows, columns=STANDARD_COLUMNS),
+                column_config={
+                    "code": st.column_config.TextColumn("성취기준 코드", width="small"),
+                    "description": st.column_config.TextColumn("성취기준 설명", width="large"),
+                    "level_A": st.column_config.TextColumn("상(A) 수준", width="medium"),
+                    "level_B": st.column_config.TextColumn("중(B) 수준", width="medium"),
+                    "level_C": st.column_config.TextColumn("하(C) 수준", width="medium")
+                },
+                hide_index=True,
+                num_rows="fixed",
+                use_container_width=True,
+                key="standards_editor"
+            )
             submit_button_edit = st.form_submit_button("수정사항 저장 및 다음 단계로", use_container_width=True)
         if submit_button_edit:
-            with st.spinner("저장 중..."):
-                st.session_state.data['standards'] = edited_standards
-                del st.session_state.generated_step_4
-                st.success("성취기준 저장 완료.")
-                st.session_state.step = 5
-                st.rerun()
+            edited_rows = st.session_state.get("standards_editor", {}).get("edited_rows", {})
+            new_rows = apply_row_edits(standard_rows, edited_rows, STANDARD_COLUMNS)
+            errors = validate_rows(new_rows, STANDARD_COLUMNS, STANDARD_LABELS, unique="code")
+            if errors:
+                st.error("저장하지 못했습니다. 아래 항목을 확인해주세요.\n\n" + "\n".join(f"- {e}" for e in errors))
+            else:
+                with st.spinner("저장 중..."):
+                    st.session_state.data['standards'] = rows_to_standards(new_rows)
+                    del st.session_state.generated_step_4
+                    st.success("성취기준 저장 완료.")
+                    st.session_state.step = 5
+                    st.rerun()
     return False
 
 
 def show_step_5():
+    import pandas as pd
+
     st.markdown("<div class='step-header'><h3>5단계: 교수학습 및 평가</h3></div>", unsafe_allow_html=True)
+    show_variant_selector()
 
     if 'generated_step_5' not in st.session_state:
         with st.form("teaching_assessment_form"):
             st.info("교수학습방법 및 평가계획을 자동으로 생성합니다.")
             submit_button = st.form_submit_button("생성 및 다음 단계로", use_container_width=True)
         if submit_button:
-            with st.spinner("생성 중..."):
-                result = generate_content(5, st.session_state.data)
+            with generation_slot("step5"):
+                result = generate_content(5, generation_data())
                 if result:
                     st.session_state.data["teaching_methods_text"] = result.get("teaching_methods_text", "")
                     st.session_state.data["assessment_plan"] = result.get("assessment_plan", [])
@@ -883,155 +1144,76 @@ def show_step_5():
                 help="줄바꿈으로 여러 방법을 구분"
             )
 
-            st.markdown("""
-            ---
-            #### 평가계획
-            - 코드, 성취기준, 평가요소, 수업평가방법을 한 행에 배치  
-            - 평가기준(상·중·하)는 세로(행)로 각각 배치  
-            """)
-
-            old_plan = st.session_state.data.get("assessment_plan", [])
-            new_plan = []
-
-            for i, ap in enumerate(old_plan):
-                code = ap.get("code", "")
-                desc = ap.get("description", "")
-                elem = ap.get("element", "")
-                meth = ap.get("method", "")
-                crit_high = ap.get("criteria_high", "")
-                crit_mid = ap.get("criteria_mid", "")
-                crit_low = ap.get("criteria_low", "")
-
-                st.markdown(f"##### 평가항목 {i+1}")
-
-                # 첫 번째 행: (코드 + 성취기준) / 평가요소 / 수업평가방법
-                row1_col1, row1_col2, row1_col3 = st.columns([2, 2, 2])
-                with row1_col1:
-                    st.markdown(f"**코드**: `{code}`")
-                    st.markdown(f"**성취기준**: {desc}")
-
-                with row1_col2:
-                    new_elem = st.text_area("평가요소", value=elem, key=f"elem_{code}", height=80)
-                with row1_col3:
-                    new_meth = st.text_area("수업평가방법", value=meth, key=f"meth_{code}", height=80)
-
-                # 두 번째 행: 평가기준(상, 중, 하)를 각각 세로(행)로 배치
-                st.markdown("**평가기준(상·중·하)**")
-                crit_high_new = st.text_area(
-                    "상(A) 수준 기준",
-                    value=crit_high,
-                    key=f"critH_{code}",
-                    height=80
-                )
-                crit_mid_new = st.text_area(
-                    "중(B) 수준 기준",
-                    value=crit_mid,
-                    key=f"critM_{code}",
-                    height=80
-                )
-                crit_low_new = st.text_area(
-                    "하(C) 수준 기준",
-                    value=crit_low,
-                    key=f"critL_{code}",
-                    height=80
-                )
-
-                new_plan.append({
-                    "code": code,
-                    "description": desc,
-                    "element": new_elem,
-                    "method": new_meth,
-                    "criteria_high": crit_high_new,
-                    "criteria_mid": crit_mid_new,
-                    "criteria_low": crit_low_new
-                })
-
-                st.markdown("---")
+            st.markdown("---\n#### 평가계획")
+            st.caption("코드와 성취기준은 4단계에서 정한 내용이며, 나머지 칸을 눌러 바로 수정할 수 있습니다.")
+            assessment_rows = [
+                {col: str(ap.get(col, "")) for col in ASSESSMENT_COLUMNS}
+                for ap in st.session_state.data.get("assessment_plan", [])
+            ]
+            st.data_editor(
+                pd.DataFrame(assessment_rows, columns=ASSESSMENT_COLUMNS),
+                column_config={
+                    "code": st.column_config.TextColumn("코드", width="small"),
+                    "description": st.column_config.TextColumn("성취기준", width="medium"),
+                    "element": st.column_config.TextColumn("평가요소", width="medium"),
+                    "method": st.column_config.TextColumn("수업평가방법", width="medium"),
+                    "criteria_high": st.column_config.TextColumn("상(A) 수준 기준", width="medium"),
+                    "criteria_mid": st.column_config.TextColumn("중(B) 수준 기준", width="medium"),
+                    "criteria_low": st.column_config.TextColumn("하(C) 수준 기준", width="medium")
+                },
+                disabled=["code", "description"],
+                hide_index=True,
+                num_rows="fixed",
+                use_container_width=True,
+                key="assessment_editor"
+            )
 
             submit_button_edit = st.form_submit_button("수정사항 저장 및 다음 단계로", use_container_width=True)
 
         if submit_button_edit:
-            with st.spinner("수정사항 저장 중..."):
-                st.session_state.data["teaching_methods_text"] = teaching_methods_text
-                st.session_state.data["assessment_plan"] = new_plan
-                del st.session_state.generated_step_5
-                st.success("교수학습 및 평가 수정 완료.")
-                st.session_state.step = 6
-                st.rerun()
+            edited_rows = st.session_state.get("assessment_editor", {}).get("edited_rows", {})
+            new_plan = apply_row_edits(assessment_rows, edited_rows, ASSESSMENT_COLUMNS)
+            errors = validate_rows(new_plan, ASSESSMENT_COLUMNS[2:], ASSESSMENT_LABELS)
+            if errors:
+                st.error("저장하지 못했습니다. 아래 항목을 확인해주세요.\n\n" + "\n".join(f"- {e}" for e in errors))
+            else:
+                with st.spinner("수정사항 저장 중..."):
+                    st.session_state.data["teaching_methods_text"] = teaching_methods_text
+                    st.session_state.data["assessment_plan"] = new_plan
+                    del st.session_state.generated_step_5
+                    st.success("교수학습 및 평가 수정 완료.")
+                    st.session_state.step = 6
+                    st.rerun()
 
     return False
 
 
+@st.cache_resource(show_spinner=False)
+def get_lesson_checkpoints():
+    """6단계 차시 생성 중간 저장소 (rerun·재접속 후 이어서 생성)"""
+    from lesson_checkpoints import LessonCheckpoints
+
+    return LessonCheckpoints(os.path.join(DATA_DIR, "lesson_checkpoints.sqlite3"))
+
+
+def checkpoint_owner():
+    """이 세션의 6단계 중간 저장 기록을 다른 세션과 구분하는 값"""
+    if "checkpoint_owner" not in st.session_state:
+        import uuid
+
+        st.session_state.checkpoint_owner = uuid.uuid4().hex
+    return st.session_state.checkpoint_owner
+
+
+def lesson_checkpoint_key(total_hours, data):
+    return lesson_plan_key(total_hours, data, checkpoint_owner())
+
+
 def generate_lesson_plans_all_at_once(total_hours, data):
-    all_lesson_plans = []
-    progress_bar = st.progress(0)
-
-    necessity = data.get('necessity', '')
-    overview = data.get('overview', '')
-    domain = data.get('domain', '')
-    key_ideas = data.get('key_ideas', [])
-    content_elements = data.get('content_elements', {})
-    standards = data.get('standards', [])
-    teaching_methods = data.get('teaching_methods', [])
-    assessment_plan = data.get('assessment_plan', [])
-    
-    chunk_prompt = f"""
-아래 정보를 참고하여 **1차시부터 {total_hours}차시까지** 한 번에 모두 연결된 지도계획을 JSON으로 작성해주세요.
-
-[이전 단계 결과]
-대상 학년 {', '.join(data.get('grades', []))}에 맞는 수준으로 작성해야 한다.
-- 영역명: {domain}
-- 핵심 아이디어: {key_ideas}
-- 내용체계: {content_elements}
-- 성취기준: {standards}
-- 교수학습 방법: {teaching_methods}
-- 평가계획: {assessment_plan}
-- 활동명: {data.get('activity_name')}
-- 요구사항: {data.get('requirements')}
-
-각 차시는 다음 사항을 고려하여 작성:
-1. 대상 학년: {', '.join(data.get('grades', []))}에 알맞은 수업계획 작성하기
-2. 명확한 학습주제 재미있고 문학적 표현으로 학습주제 설정
-3. 구체적이고 학생활동 중심으로 진술하세요. ~~하기 형식으로 해주세요.
-4. 실제 수업에 필요한 교수학습자료 명시
-5. 이전 차시와의 연계성 고려
-6. 초등학교 3학년 4학년 수준에 맞는 내용으로 작성하여 주세요.
-
-(예시)
-학습주제: 질문에도 양심이 있다.
-학습내용: 질문을 할 때 지켜야 할 약속 만들기
-         수업 중 질문, 일상 속 질문 속에서 갖추어야 할 예절 알기
-
-"추가 문장 없이 JSON만 보내라"
-다음 JSON 형식으로 작성:
-{{
-  "lesson_plans": [
-    {{
-      "lesson_number": "차시번호",
-      "topic": "학습주제",
-      "content": "학습내용",
-      "materials": "교수학습자료"
-    }}
-  ]
-}}
-"""
-    messages = [
-        SystemMessage(content=SYSTEM_PROMPT),
-        HumanMessage(content=chunk_prompt)
-    ]
+    checkpoint = {"path": get_lesson_checkpoints().path, "key": lesson_checkpoint_key(total_hours, data)}
     try:
-        chat = ChatOpenAI(
-            openai_api_key=OPENAI_API_KEY,
-            model="gpt-4o",  
-            temperature=0.5,
-            max_tokens=3000
-        )
-        response = chat(messages)
-        raw_text = response.content.strip().replace('```json','').replace('```','').strip()
-        parsed = json.loads(raw_text)
-        lesson_plans = parsed.get("lesson_plans", [])
-        return lesson_plans
-    except json.JSONDecodeError as e:
+        return run_generation_job("lesson_plans", {"total_hours": total_hours, "data": dict(data), "checkpoint": checkpoint})
+    except ValueError as e:
         st.error(f"JSON 파싱 오류: {e}")
         return []
     except Exception as e:
@@ -1040,54 +1222,74 @@ def generate_lesson_plans_all_at_once(total_hours, data):
 
 
 def show_step_6():
+    import pandas as pd
+
     total_hours = st.session_state.data.get('total_hours', 30)
     st.markdown(f"<div class='step-header'><h3>6단계: 차시별 지도계획 (총 {total_hours}차시)</h3></div>", unsafe_allow_html=True)
+    show_variant_selector()
 
     if 'generated_step_6' not in st.session_state:
+        checkpoint_key = lesson_checkpoint_key(total_hours, generation_data())
+        saved = get_lesson_checkpoints().load(checkpoint_key)
+        restart = False
         with st.form("lesson_plans_form"):
-            st.info(f"총 {total_hours}차시를 한 번에 생성합니다.")
-            sb = st.form_submit_button("전체 차시 생성", use_container_width=True)
+            if saved:
+                # 생성 도중 rerun·연결 끊김으로 결과를 받지 못한 경우: 불러올지는 사용자가 정한다
+                if len(saved) >= total_hours:
+                    st.info(f"{total_hours}차시까지 생성된 기록이 있습니다. 이어서 생성하면 저장된 차시를 불러옵니다.")
+                else:
+                    st.info(f"{len(saved)}차시까지 생성된 기록이 있습니다. {len(saved) + 1}차시부터 이어서 생성합니다.")
+                col1, col2 = st.columns(2)
+                with col1:
+                    sb = st.form_submit_button("이어서 생성", use_container_width=True)
+                with col2:
+                    restart = st.form_submit_button("처음부터 새로 생성", use_container_width=True)
+            else:
+                st.info(f"총 {total_hours}차시를 한 번에 생성합니다.")
+                sb = st.form_submit_button("전체 차시 생성", use_container_width=True)
+        if restart:
+            get_lesson_checkpoints().clear(checkpoint_key)
+            sb = True
         if sb:
-            with st.spinner("생성 중..."):
-                lesson_plans = generate_lesson_plans_all_at_once(total_hours, st.session_state.data)
+            with generation_slot("lesson_plans"):
+                lesson_plans = generate_lesson_plans_all_at_once(total_hours, generation_data())
                 if lesson_plans:
                     st.session_state.data["lesson_plans"] = lesson_plans
-                    st.success(f"{total_hours}차시 계획 생성 완료.")
+                    if len(lesson_plans) < total_hours:
+                        st.warning(f"{len(lesson_plans)}차시까지만 생성되었습니다. 나머지 차시는 다시 생성하거나 직접 작성해주세요.")
+                    else:
+                        st.success(f"{total_hours}차시 계획 생성 완료.")
                     st.session_state.generated_step_6 = True
     else:
         with st.form("edit_lesson_plans_form"):
             st.markdown("#### 생성된 차시별 계획 수정")
-            lesson_plans = st.session_state.data.get('lesson_plans', [])
-            edited_plans = []
-            total_tabs = (total_hours + 9) // 10
-            tabs = st.tabs([f"{i*10+1}~{min((i+1)*10, total_hours)}차시" for i in range(total_tabs)])
-            for tab_idx, tab in enumerate(tabs):
-                with tab:
-                    start_idx = tab_idx * 10
-                    end_idx = min(start_idx + 10, total_hours)
-                    for i in range(start_idx, end_idx):
-                        if i < len(lesson_plans):
-                            st.markdown(f"##### {i+1}차시")
-                            col1, col2 = st.columns([1, 2])
-                            with col1:
-                                topic = st.text_input("학습주제", value=lesson_plans[i].get('topic', ''),
-                                                      key=f"topic_{i}")
-                                materials = st.text_input("교수학습자료", value=lesson_plans[i].get('materials', ''),
-                                                          key=f"materials_{i}")
-                            with col2:
-                                content = st.text_area("학습내용", value=lesson_plans[i].get('content', ''),
-                                                       key=f"content_{i}", height=100)
-                            edited_plans.append({
-                                "lesson_number": f"{i+1}",
-                                "topic": topic,
-                                "content": content,
-                                "materials": materials
-                            })
-                            st.markdown("---")
+            lesson_plans = st.session_state.data.get('lesson_plans', [])[:total_hours]
+            # 차시마다 입력창을 만들지 않고 표 하나로 편집 (보이는 행만 브라우저에서 그려짐)
+            st.data_editor(
+                pd.DataFrame([{col: str(lp.get(col, "")) for col in LESSON_COLUMNS} for lp in lesson_plans],
+                             columns=LESSON_COLUMNS),
+                column_config={
+                    "lesson_number": st.column_config.TextColumn("차시", width="small"),
+                    "topic": st.column_config.TextColumn("학습주제", width="medium"),
+                    "content": st.column_config.TextColumn("학습내용", width="large"),
+                    "materials": st.column_config.TextColumn("교수학습자료", width="medium")
+                },
+                disabled=["lesson_number"],
+                hide_index=True,
+                num_rows="fixed",
+                use_container_width=True,
+                height=min(36 * (len(lesson_plans) + 1) + 3, 600),
+                key="lesson_plans_editor"
+            )
             submit_button_edit = st.form_submit_button("수정사항 저장 및 다음 단계로", use_container_width=True)
         if submit_button_edit:
             with st.spinner("저장 중..."):
+                edited_rows = st.session_state.get("lesson_plans_editor", {}).get("edited_rows", {})
+                edited_plans = apply_row_edits(lesson_plans, edited_rows, LESSON_COLUMNS)
+                for i, plan in enumerate(edited_plans):
+                    plan["lesson_number"] = f"{i+1}"
                 st.session_state.data['lesson_plans'] = edited_plans
+                get_lesson_checkpoints().clear(lesson_checkpoint_key(total_hours, generation_data()))
                 del st.session_state.generated_step_6
                 st.success("차시별 계획 수정 완료.")
                 st.session_state.step = 7
@@ -1095,13 +1297,140 @@ def show_step_6():
     return False
 
 
+REVIEW_SECTIONS = ["기본정보", "내용체계", "성취기준", "교수학습 및 평가", "차시별계획"]
+
+
+def content_hash(value):
+    """JSON 직렬화 기준 내용 해시 (내용이 같으면 같은 값)"""
+    raw = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def cached_section_markdown(section, section_data, builder):
+    """검토 화면 섹션의 markdown 을 내용 해시가 바뀔 때만 다시 만든다"""
+    cache = st.session_state.setdefault("review_markdown_cache", {})
+    digest = content_hash(section_data)
+    cached = cache.get(section)
+    if cached and cached[0] == digest:
+        return cached[1]
+    markdown = builder(section_data)
+    cache[section] = (digest, markdown)
+    return markdown
+
+
+def cached_coverage(data):
+    """성취기준별 차시 반영 점검 결과를 성취기준·평가계획·차시 내용이 바뀔 때만 다시 계산한다"""
+    from standards_coverage import analyze_coverage
+
+    section_data = {key: data.get(key, []) for key in ("standards", "assessment_plan", "lesson_plans")}
+    digest = content_hash(section_data)
+    cached = st.session_state.get("coverage_cache")
+    if cached and cached[0] == digest:
+        return cached[1]
+    with profile_section("standards_coverage"):
+        coverage = analyze_coverage(section_data["lesson_plans"], section_data["standards"],
+                                    section_data["assessment_plan"])
+    st.session_state.coverage_cache = (digest, coverage)
+    return coverage
+
+
+def show_coverage_notice(coverage):
+    """빠진 성취기준과 어느 성취기준과도 이어지지 않는 차시 안내"""
+    if coverage["uncovered"]:
+        st.warning(f"차시별 계획에서 다루지 않는 것으로 보이는 성취기준: {', '.join(coverage['uncovered'])}"
+                   + (f" · 성취기준과 이어지지 않는 차시: {coverage['unaligned_ranges']}" if coverage["unaligned_lessons"] else "")
+                   + " (차시별계획 항목에서 자세히 볼 수 있습니다)")
+
+
+def basic_info_markdown(basic_info):
+    return "\n\n".join(f"**{k}**: {v}" for k, v in basic_info.items())
+
+
+def content_sets_markdown(content_sets):
+    def items(values, indent=""):
+        if not values:
+            return f"{indent}- (없음)"
+        return "\n".join(f"{indent}- {v}" for v in values)
+
+    blocks = []
+    for i, cset in enumerate(content_sets, start=1):
+        ce = cset.get("content_elements", {})
+        blocks.append("\n\n".join([
+            f"#### ▶ 내용체계 세트 {i}",
+            f"**영역명**: {cset.get('domain', '')}",
+            "**핵심 아이디어**:\n" + items(cset.get("key_ideas", [])),
+            "**내용 요소**:\n"
+            + "- 지식·이해\n" + items(ce.get("knowledge_and_understanding", []), "  ") + "\n"
+            + "- 과정·기능\n" + items(ce.get("process_and_skills", []), "  ") + "\n"
+            + "- 가치·태도\n" + items(ce.get("values_and_attitudes", []), "  ")
+        ]))
+    return "\n\n---\n\n".join(blocks)
+
+
+def standards_markdown(standards):
+    label_map = {"A": "상", "B": "중", "C": "하"}
+    blocks = []
+    for std in standards:
+        levels = "\n".join(
+            f"- {label_map.get(lv['level'], lv['level'])} 수준: {lv['description']}"
+            for lv in std['levels']
+        )
+        blocks.append(f"**{std['code']}**: {std['description']}\n\n##### 수준별 성취기준\n\n{levels}")
+    return "\n\n---\n\n".join(blocks)
+
+
+def teaching_assessment_markdown(section_data):
+    methods_text = section_data["teaching_methods_text"]
+    parts = ["#### 교수학습방법"]
+    if methods_text.strip():
+        parts.append("\n".join(f"- {line.strip()}" for line in methods_text.split('\n')))
+    else:
+        parts.append("(교수학습방법 없음)")
+    parts.append("#### 평가계획")
+    for ap in section_data["assessment_plan"]:
+        parts.append(
+            f"**{ap.get('code','')}** - {ap.get('description','')}\n\n"
+            f"- 평가요소: {ap.get('element','')}\n"
+            f"- 수업평가방법: {ap.get('method','')}\n"
+            f"- 상 수준 기준: {ap.get('criteria_high','')}\n"
+            f"- 중 수준 기준: {ap.get('criteria_mid','')}\n"
+            f"- 하 수준 기준: {ap.get('criteria_low','')}\n\n---"
+        )
+    return "\n\n".join(parts)
+
+
+def cached_excel_document(selected_sheets):
+    """계획서 내용과 선택한 항목이 그대로면 이전에 만든 Excel 을 재사용"""
+    digest = content_hash([st.session_state.data.to_dict(), selected_sheets])
+    cache = st.session_state.setdefault("review_excel_cache", {})
+    if digest in cache:
+        return cache[digest]
+    excel_data = create_excel_document(selected_sheets)
+    cache[digest] = excel_data
+    # 최근 몇 가지 선택 조합만 보관
+    while len(cache) > 4:
+        del cache[next(iter(cache))]
+    return excel_data
+
+
 def show_final_review():
     st.title("최종 계획서 검토")
     try:
         data = st.session_state.data
-        tabs = st.tabs(["기본정보", "내용체계", "성취기준", "교수학습 및 평가", "차시별계획"])
-
-        with tabs[0]:
+        imported = st.session_state.pop("imported_sections", None)
+        if imported:
+            missing = [s for s in REVIEW_SECTIONS if s not in imported]
+            st.success(f"계획서를 불러왔습니다: {', '.join(imported)}"
+                       + (f" (파일에 없는 항목: {', '.join(missing)})" if missing else ""))
+        remember_completed_plan(data)
+        # 탭은 모든 내용을 매번 그리므로, 선택한 항목 하나만 그린다
+        show_variant_selector()
+        section = st.radio("검토할 항목", REVIEW_SECTIONS, horizontal=True,
+                           key="review_section", label_visibility="collapsed")
+        coverage = cached_coverage(data)
+        show_coverage_notice(coverage)
+
+        if section == "기본정보":
             st.markdown("### 기본 정보")
             basic_info = {
                 "학교급": data.get('school_type', ''),
@@ -1114,75 +1443,31 @@ def show_final_review():
                 "필요성": data.get('necessity',''),
                 "개요": data.get('overview','')
             }
-            for k,v in basic_info.items():
-                st.markdown(f"**{k}**: {v}")
+            st.markdown(cached_section_markdown(section, basic_info, basic_info_markdown))
 
             st.button("기본정보 수정하기", key="edit_basic_info",
                       on_click=lambda: set_step(1),
                       use_container_width=True)
 
-        with tabs[1]:
+        elif section == "내용체계":
             st.markdown("### 내용체계 (4세트)")
             content_sets = data.get("content_sets", [])
             if not content_sets:
                 st.warning("현재 저장된 내용체계가 없습니다.")
             else:
-                for i, cset in enumerate(content_sets, start=1):
-                    st.markdown(f"#### ▶ 내용체계 세트 {i}")
-                    domain = cset.get("domain", "")
-                    key_ideas = cset.get("key_ideas", [])
-                    content_elements = cset.get("content_elements", {})
-
-                    st.write(f"**영역명**: {domain}")
-                    st.write("**핵심 아이디어**:")
-                    if key_ideas:
-                        for idea in key_ideas:
-                            st.write(f"- {idea}")
-                    else:
-                        st.write("- (없음)")
-
-                    st.write("**내용 요소**:")
-                    kua = content_elements.get("knowledge_and_understanding", [])
-                    pns = content_elements.get("process_and_skills", [])
-                    vat = content_elements.get("values_and_attitudes", [])
-
-                    st.markdown("- 지식·이해")
-                    if kua:
-                        for item in kua:
-                            st.write(f"  - {item}")
-                    else:
-                        st.write("  - (없음)")
-
-                    st.markdown("- 과정·기능")
-                    if pns:
-                        for item in pns:
-                            st.write(f"  - {item}")
-                    else:
-                        st.write("  - (없음)")
-
-                    st.markdown("- 가치·태도")
-                    if vat:
-                        for item in vat:
-                            st.write(f"  - {item}")
-                    else:
-                        st.write("  - (없음)")
-
-                    st.divider()
+                st.markdown(cached_section_markdown(section, content_sets, content_sets_markdown))
+                st.divider()
 
             st.button("내용체계 수정하기",
                       key="edit_content_sets",
                       on_click=lambda: set_step(3),
                       use_container_width=True)
 
-        with tabs[2]:
+        elif section == "성취기준":
             st.markdown("### 성취기준")
-            for std in data.get("standards", []):
-                st.markdown(f"**{std['code']}**: {std['description']}")
-                st.markdown("##### 수준별 성취기준")
-                for lv in std['levels']:
-                    label_map = {"A":"상", "B":"중", "C":"하"}
-                    label = label_map.get(lv["level"], lv["level"])
-                    st.write(f"- {label} 수준: {lv['description']}")
+            standards = data.get("standards", [])
+            if standards:
+                st.markdown(cached_section_markdown(section, standards, standards_markdown))
                 st.markdown("---")
 
             st.button("성취기준 수정하기",
@@ -1190,47 +1475,26 @@ def show_final_review():
                       on_click=lambda: set_step(4),
                       use_container_width=True)
 
-        with tabs[3]:
+        elif section == "교수학습 및 평가":
             st.markdown("### 교수학습 및 평가")
-            methods_text = data.get("teaching_methods_text","")
-
-            st.markdown("#### 교수학습방법")
-            if methods_text.strip():
-                lines = methods_text.split('\n')
-                for line in lines:
-                    st.write(f"- {line.strip()}")
-            else:
-                st.write("(교수학습방법 없음)")
-
-            st.markdown("#### 평가계획")
-            for ap in data.get("assessment_plan", []):
-                code = ap.get("code","")
-                desc = ap.get("description","")
-                elem = ap.get("element","")
-                meth = ap.get("method","")
-                hi = ap.get("criteria_high","")
-                mi = ap.get("criteria_mid","")
-                lo = ap.get("criteria_low","")
-
-                st.markdown(f"**{code}** - {desc}")
-                st.write(f"- 평가요소: {elem}")
-                st.write(f"- 수업평가방법: {meth}")
-                st.write(f"- 상 수준 기준: {hi}")
-                st.write(f"- 중 수준 기준: {mi}")
-                st.write(f"- 하 수준 기준: {lo}")
-                st.markdown("---")
+            section_data = {
+                "teaching_methods_text": data.get("teaching_methods_text", ""),
+                "assessment_plan": data.get("assessment_plan", [])
+            }
+            st.markdown(cached_section_markdown(section, section_data, teaching_assessment_markdown))
 
             st.button("교수학습 및 평가 수정하기",
                       key="edit_teaching_assessment",
                       on_click=lambda: set_step(5),
                       use_container_width=True)
 
-        with tabs[4]:
+        elif section == "차시별계획":
             st.markdown("### 차시별 계획")
-            lesson_plans_df = pd.DataFrame(data.get('lesson_plans', []))
-            if not lesson_plans_df.empty:
+            lesson_plans = data.get('lesson_plans', [])
+            if lesson_plans:
+                import pandas as pd
                 st.dataframe(
-                    lesson_plans_df,
+                    pd.DataFrame(lesson_plans),
                     column_config={
                         "lesson_number": "차시",
                         "topic": "학습주제",
@@ -1240,6 +1504,20 @@ def show_final_review():
                     hide_index=True,
                     height=400
                 )
+                if coverage["standards"]:
+                    st.markdown("#### 성취기준 반영 점검")
+                    st.dataframe(
+                        pd.DataFrame([{
+                            "성취기준": row["code"],
+                            "관련 차시": row["ranges"] or "없음",
+                            "유사도": round(row["score"], 2),
+                            "반영": "✅" if row["covered"] else "⚠️",
+                        } for row in coverage["standards"]]),
+                        hide_index=True,
+                    )
+                    if coverage["unaligned_lessons"]:
+                        st.caption(f"어느 성취기준과도 이어지지 않는 차시: {coverage['unaligned_ranges']} "
+                                   "— 빠진 성취기준을 이 차시에 반영하도록 해당 차시만 수정하면 됩니다.")
             else:
                 st.warning("차시별 계획이 없습니다.")
 
@@ -1263,8 +1541,10 @@ def show_final_review():
                 options=available_sheets,
                 default=available_sheets
             )
+            if data.get("variants"):
+                st.caption("성취기준·교수학습 및 평가·차시별계획은 학년마다 시트가 따로 들어갑니다.")
             if selected_sheets:
-                excel_data = create_excel_document(selected_sheets)
+                excel_data = cached_excel_document(selected_sheets)
                 st.download_button(
                     "📥 Excel 다운로드",
                     excel_data,
@@ -1284,187 +1564,134 @@ def show_final_review():
         st.error(f"최종 검토 처리 중 오류: {str(e)}")
 
 
+@profiled()
 def create_excel_document(selected_sheets):
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        workbook = writer.book
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#E2E8F0',
-            'border': 1,
-            'text_wrap': True,
-            'align': 'center',
-            'valign': 'vcenter'
-        })
-        content_format = workbook.add_format({
-            'text_wrap': True,
-            'valign': 'top',
-            'border': 1
-        })
-        data = st.session_state.data
+    return run_generation_job("excel", {"data": dict(st.session_state.data), "sheets": list(selected_sheets)})
 
-        if "기본정보" in selected_sheets:
-            basic_info = pd.DataFrame([{
-                '학교급': data.get('school_type', ''),
-                '대상학년': ', '.join(data.get('grades', [])),
-                '총차시': data.get('total_hours', ''),
-                '운영 학기': ', '.join(data.get('semester', [])),
-                '연계 교과': ', '.join(data.get('subjects', [])),
-                '활동명': data.get('activity_name', ''),
-                '요구사항': data.get('requirements', ''),
-                '필요성': data.get('necessity', ''),
-                '개요': data.get('overview', '')
-            }])
-            basic_info.T.to_excel(writer, sheet_name='기본정보', header=['내용'])
-            worksheet = writer.sheets['기본정보']
-            for idx, col in enumerate(basic_info.T.index, 1):
-                worksheet.set_column(idx, idx, 30, content_format)
-
-        if "내용체계" in selected_sheets:
-            content_sets = data.get("content_sets", [])
-            if not content_sets:
-                df_empty = pd.DataFrame([{"구분": "내용체계 없음", "내용": ""}])
-                df_empty.to_excel(writer, sheet_name='내용체계', index=False)
-                worksheet = writer.sheets['내용체계']
-                worksheet.set_column('A:A', 20, content_format)
-                worksheet.set_column('B:B', 80, content_format)
-            else:
-                rows = []
-                for idx, cset in enumerate(content_sets, start=1):
-                    domain = cset.get("domain", "")
-                    key_ideas = cset.get("key_ideas", [])
-                    ce = cset.get("content_elements", {})
 
-                    rows.append({
-                        "구분": f"영역명 (세트{idx})",
-                        "내용": domain
-                    })
+def set_step(step_number):
+    st.session_state.step = step_number
 
-                    for idea in key_ideas:
-                        rows.append({
-                            "구분": f"핵심 아이디어 (세트{idx})",
-                            "내용": idea
-                        })
-
-                    for item in ce.get("knowledge_and_understanding", []):
-                        rows.append({
-                            "구분": f"지식·이해 (세트{idx})",
-                            "내용": item
-                        })
-
-                    for item in ce.get("process_and_skills", []):
-                        rows.append({
-                            "구분": f"과정·기능 (세트{idx})",
-                            "내용": item
-                        })
-
-                    for item in ce.get("values_and_attitudes", []):
-                        rows.append({
-                            "구분": f"가치·태도 (세트{idx})",
-                            "내용": item
-                        })
-
-                df_goals = pd.DataFrame(rows)
-                df_goals.to_excel(writer, sheet_name='내용체계', index=False)
-                worksheet = writer.sheets['내용체계']
-                worksheet.set_column('A:A', 25, content_format)
-                worksheet.set_column('B:B', 80, content_format)
-
-        if "성취기준" in selected_sheets:
-            standards_data = []
-            for std in data.get('standards', []):
-                for level in std['levels']:
-                    label_map = {"A": "상", "B": "중", "C": "하"}
-                    label = label_map.get(level['level'], level['level'])
-                    standards_data.append({
-                        '성취기준코드': std['code'],
-                        '성취기준설명': std['description'],
-                        '수준': label,
-                        '수준별설명': level['description']
-                    })
-            df_std = pd.DataFrame(standards_data)
-            df_std.to_excel(writer, sheet_name='성취기준', index=False)
-            worksheet = writer.sheets['성취기준']
-            worksheet.set_column('A:A', 15, content_format)
-            worksheet.set_column('B:B', 50, content_format)
-            worksheet.set_column('C:C', 10, content_format)
-            worksheet.set_column('D:D', 60, content_format)
-
-        if "교수학습 및 평가" in selected_sheets:
-            sheet_rows = []
-            methods_text = data.get("teaching_methods_text", "").strip()
-            if methods_text:
-                lines = methods_text.split('\n')
-                for line in lines:
-                    if line.strip():
-                        sheet_rows.append({
-                            "유형": "교수학습방법",
-                            "코드": "",
-                            "성취기준": "",
-                            "평가요소": "",
-                            "수업평가방법": line.strip(),
-                            "상기준": "",
-                            "중기준": "",
-                            "하기준": ""
-                        })
-
-            for ap in data.get('assessment_plan', []):
-                sheet_rows.append({
-                    "유형": "평가계획",
-                    "코드": ap.get("code",""),
-                    "성취기준": ap.get("description",""),
-                    "평가요소": ap.get("element",""),
-                    "수업평가방법": ap.get("method",""),
-                    "상기준": ap.get("criteria_high",""),
-                    "중기준": ap.get("criteria_mid",""),
-                    "하기준": ap.get("criteria_low","")
-                })
-
-            df_methods = pd.DataFrame(sheet_rows)
-            df_methods.to_excel(writer, sheet_name='교수학습및평가', index=False)
-            worksheet = writer.sheets['교수학습및평가']
-            worksheet.set_column('A:A', 14, content_format)
-            worksheet.set_column('B:B', 14, content_format)
-            worksheet.set_column('C:C', 30, content_format)
-            worksheet.set_column('D:D', 30, content_format)
-            worksheet.set_column('E:E', 30, content_format)
-            worksheet.set_column('F:F', 30, content_format)
-            worksheet.set_column('G:G', 30, content_format)
-            worksheet.set_column('H:H', 30, content_format)
-
-        if "차시별계획" in selected_sheets:
-            df_lessons = pd.DataFrame(data.get('lesson_plans', []))
-            if not df_lessons.empty:
-                df_lessons.columns = ['차시', '학습주제', '학습내용', '교수학습자료']
-                df_lessons.to_excel(writer, sheet_name='차시별계획', index=False)
-                worksheet = writer.sheets['차시별계획']
-                worksheet.set_column('A:A', 10, content_format)
-                worksheet.set_column('B:B', 30, content_format)
-                worksheet.set_column('C:C', 80, content_format)
-                worksheet.set_column('D:D', 50, content_format)
-
-        for sheet in writer.sheets.values():
-            sheet.set_default_row(30)
-            sheet.set_row(0, 40)
 
-    return output.getvalue()
+# 이보다 짧은 챗봇 답변은 품질 미달로 보고 상위 모델로 다시 요청
+MIN_CHAT_ANSWER_CHARS = 20
 
+CHAT_PROMPT_TEMPLATE = """당신은 귀여운 친구 캐릭터 두 명, '🐰 토끼'와 '🐻 곰돌이'입니다.
+두 캐릭터는 협력하여 학교자율시간 관련 질문에 대해 번갈아 가며 귀엽고 친근한 말투로 답변합니다.
+2022 개정 교육과정의 학교자율시간에 대한 전문 지식을 바탕으로 답변합니다.
+{context}
+질문: {question}
+답변:"""
+
+# 사이드바에 보관·표시하는 대화 수와 한 페이지에 보여 줄 대화 수
+CHAT_HISTORY_LIMIT = 30
+CHAT_PAGE_SIZE = 5
+
+RECOMMENDED_QUESTIONS = [
+    "초등학교 3학년 학교자율시간의 활동명 10가지만 제시하여 주세요.",
+    "초등학교 6학년 세계요리탐험에 알맞은 수업지도 계획을 작성해주세요.",
+]
+
+
+def check_chat_answer(answer):
+    if len(answer) < MIN_CHAT_ANSWER_CHARS:
+        raise ValueError("답변이 너무 짧습니다.")
+    return answer
+
+
+def generate_chat_answer(question, context=""):
+    """챗봇 질문에 대한 답변 생성 (문서 검색 없이 바로 응답, context 는 이전 대화)"""
+    if context:
+        context = f"\n아래는 지금까지의 대화입니다. 이어지는 질문이면 참고하여 답변하세요.\n{context}\n"
+    return get_model_router().complete(
+        "chat",
+        CHAT_PROMPT_TEMPLATE.format(question=question, context=context),
+        system_prompt=SYSTEM_PROMPT,
+        temperature=0.7,
+        max_tokens=2000,
+        validate=check_chat_answer,
+        accept_last=True
+    )
 
-def set_step(step_number):
-    st.session_state.step = step_number
+
+def summarize_chat(summary, turns, max_tokens):
+    """오래된 대화를 이전 요약과 합쳐 짧게 요약"""
+    dialogue = "\n\n".join(f"Q: {q}\nA: {a}" for q, a in turns)
+    prompt = f"""다음은 학교자율시간 설계 챗봇과의 대화입니다.
+이전 요약과 새 대화를 합쳐, 이후 질문에 답할 때 필요한 사실(학년, 활동명, 교과, 요청 사항 등) 위주로
+{max_tokens}토큰 이내의 한국어 요약을 작성하세요. 요약만 출력하세요.
+
+[이전 요약]
+{summary or "(없음)"}
+
+[새 대화]
+{dialogue}
+"""
+    return get_model_router().complete("chat_summary", prompt, temperature=0.3, max_tokens=max_tokens)
+
+
+def get_chat_memory():
+    """세션별 대화 기억 (최근 대화 + 요약)"""
+    if "chat_memory" not in st.session_state:
+        from chat_memory import ConversationMemory
+        st.session_state.chat_memory = ConversationMemory(summarize=summarize_chat)
+    return st.session_state.chat_memory
+
+
+def show_chat_history():
+    """대화 내역을 페이지 단위로 표시 (최근 페이지가 기본)"""
+    history = st.session_state.chat_history
+    st.sidebar.markdown("### 대화 내역")
+    total_pages = (len(history) + CHAT_PAGE_SIZE - 1) // CHAT_PAGE_SIZE
+    page = total_pages
+    if total_pages > 1:
+        page = st.sidebar.number_input("페이지", min_value=1, max_value=total_pages,
+                                       value=total_pages, key="chat_history_page")
+    # 예전 대화가 잘려 나갔어도 번호는 처음부터 이어지도록 한다
+    first_number = st.session_state.get("chat_turn_count", len(history)) - len(history) + 1
+    start = (page - 1) * CHAT_PAGE_SIZE
+    for idx in range(start, min(start + CHAT_PAGE_SIZE, len(history))):
+        q, a = history[idx]
+        st.sidebar.markdown(f"**Q{first_number + idx}:** {q}")
+        st.sidebar.markdown(f"**🤖 A{first_number + idx}:** {a}")
+
+
+@st.cache_resource(show_spinner=False)
+def get_answer_cache():
+    """챗봇 답변 캐시 (프로세스당 하나, 디스크에 저장되어 세션·프로세스 간 공유)"""
+    # 프롬프트나 모델이 바뀌면 예전 답변은 쓰지 않는다
+    from answer_cache import AnswerCache
+
+    chat_model = get_model_router().model_for("chat")
+    namespace = hashlib.sha1((SYSTEM_PROMPT + CHAT_PROMPT_TEMPLATE + chat_model).encode("utf-8")).hexdigest()[:12]
+    return AnswerCache(os.path.join(DATA_DIR, "chat_answers.sqlite3"), namespace=namespace)
+
+
+@st.cache_resource(show_spinner=False)
+def warm_recommended_answers():
+    """추천 질문의 답변을 백그라운드에서 미리 만들어 둔다 (프로세스당 한 번)"""
+    def warm():
+        # 캐시 파일과 검색용 모듈 로딩도 첫 화면을 막지 않도록 백그라운드에서 한다
+        cache = get_answer_cache()
+        for q in RECOMMENDED_QUESTIONS:
+            if cache.get(q) is None:
+                try:
+                    cache.put(q, generate_chat_answer(q))
+                except Exception:
+                    pass
+
+    thread = threading.Thread(target=warm, daemon=True)
+    thread.start()
+    return thread
 
 
 def show_chatbot():
     st.sidebar.markdown("## 학교자율시간 교육과정 설계 챗봇")
 
     st.sidebar.markdown("**추천 질문:**")
-    recommended_questions = [
-        "초등학교 3학년 학교자율시간의 활동명 10가지만 제시하여 주세요.",
-        "초등학교 6학년 세계요리탐험에 알맞은 수업지도 계획을 작성해주세요.",
-    ]
     with st.sidebar.container():
         st.markdown('<div class="sidebar-questions">', unsafe_allow_html=True)
-        for q in recommended_questions:
+        for q in RECOMMENDED_QUESTIONS:
             if st.sidebar.button(q, key=f"rec_{q}"):
                 st.session_state.chat_input = q
         st.markdown('</div>', unsafe_allow_html=True)
@@ -1478,43 +1705,53 @@ def show_chatbot():
 
     if st.sidebar.button("질문 전송", key="send_question"):
         if user_input:
-            # 문서 검색 없이 바로 응답 생성
-            prompt = f"""당신은 귀여운 친구 캐릭터 두 명, '🐰 토끼'와 '🐻 곰돌이'입니다.
-두 캐릭터는 협력하여 학교자율시간 관련 질문에 대해 번갈아 가며 귀엽고 친근한 말투로 답변합니다.
-2022 개정 교육과정의 학교자율시간에 대한 전문 지식을 바탕으로 답변합니다.
-
-질문: {user_input}
-답변:"""
-            messages = [
-                SystemMessage(content=SYSTEM_PROMPT),
-                HumanMessage(content=prompt)
-            ]
-            chat = ChatOpenAI(
-                openai_api_key=OPENAI_API_KEY,
-                model="gpt-4o",
-                temperature=0.7,
-                max_tokens=2000
-            )
-            response = chat(messages)
-            answer = response.content.strip()
+            memory = get_chat_memory()
+            # 이전 대화가 없거나 추천 질문이면 대화 맥락과 무관하므로 공용 캐시를 사용
+            standalone = len(memory) == 0 or user_input in RECOMMENDED_QUESTIONS
+            cache = get_answer_cache()
+            answer = cache.get(user_input) if standalone else None
             st.sidebar.markdown("**🤖 답변:**")
-            sidebar_typewriter_effect("🤖 " + answer, delay=0.001)
+            if answer is None:
+                context = "" if standalone else memory.build_context()
+                answer = generate_chat_answer(user_input, context=context)
+                if standalone:
+                    cache.put(user_input, answer)
+                sidebar_typewriter_effect("🤖 " + answer, delay=0.001)
+            else:
+                # 캐시된 답변은 바로 표시
+                st.sidebar.markdown("🤖 " + answer)
+            memory.add(user_input, answer)
             st.session_state.chat_history.append((user_input, answer))
+            del st.session_state.chat_history[:-CHAT_HISTORY_LIMIT]
+            st.session_state.chat_turn_count = st.session_state.get("chat_turn_count", 0) + 1
+            # 새 대화가 추가되면 내역은 최근 페이지부터 보여준다
+            st.session_state.pop("chat_history_page", None)
         else:
             st.sidebar.warning("질문을 입력해주세요.")
 
     if st.session_state.chat_history:
-        st.sidebar.markdown("### 대화 내역")
-        for idx, (q, a) in enumerate(st.session_state.chat_history):
-            st.sidebar.markdown(f"**Q{idx+1}:** {q}")
-            st.sidebar.markdown(f"**🤖 A{idx+1}:** {a}")
+        show_chat_history()
 
 
 def main():
+    # APP_PROFILE=1 (APP_PROFILE_ALLOW_QUERY=1 이면 ?profile=1 도) 일 때만 rerun 별 시간/위젯 수를 기록
+    with profile_rerun(os.path.join(DATA_DIR, "profiles")):
+        run_app()
+
+
+def run_app():
     try:
-        set_page_config()
+        with profile_section("set_page_config"):
+            set_page_config()
+        # 재생 모드(APP_LLM_MODE=replay)는 기록된 응답만 쓰므로 API 키가 없어도 된다
+        if not get_api_key() and traffic_mode() != "replay":
+            st.error("OpenAI API 키가 설정되지 않았습니다. 환경 변수를 확인하세요.")
+            st.stop()
+        warm_recommended_answers()
         if 'data' not in st.session_state:
-            st.session_state.data = {}
+            st.session_state.data = Plan()
+        elif not isinstance(st.session_state.data, Plan):
+            st.session_state.data = Plan.from_dict(st.session_state.data)
         if 'step' not in st.session_state:
             st.session_state.step = 1
         st.title("학교자율시간 올인원")
@@ -1534,12 +1771,14 @@ def main():
             current_step = st.session_state.step
             step_function = step_functions.get(current_step)
             if step_function:
-                step_function()
+                with profile_section(step_function.__name__):
+                    step_function()
             else:
                 st.error("잘못된 단계입니다.")
 
         # 사이드바 챗봇 (임베딩 없이 작동)
-        show_chatbot()
+        with profile_section("show_chatbot"):
+            show_chatbot()
 
     except Exception as e:
         st.error(f"애플리케이션 실행 중 오류: {e}")
@@ -0,0 +1,241 @@
+import argparse
+import hashlib
+import math
+import os
+import random
+import re
+import time
+from collections import Counter
+
+import numpy as np
+
+from docstore import DEFAULT_COMPACT_PATH, CompactDocstore
+
+
+DEFAULT_BM25_PATH = os.path.join("faiss_index", "bm25.npz")
+
+_WORD_RE = re.compile(r"[가-힣]+|[a-z]+|\d+")
+
+# 어절 끝에서 떼어 낼 조사/어미 (긴 것부터 검사)
+_SUFFIXES = sorted([
+    "으로부터", "에서부터", "이라는", "에게서", "으로서", "으로써", "까지는", "에서는", "에서도",
+    "에서", "에게", "으로", "로서", "로써", "부터", "까지", "보다", "처럼", "이나", "이며",
+    "하고", "하는", "하여", "하기", "한다", "합니다", "입니다", "이다", "과의", "와의", "에는", "에도",
+    "은", "는", "이", "가", "을", "를", "의", "에", "와", "과", "도", "만", "로", "나",
+], key=len, reverse=True)
+
+
+def _strip_suffix(word):
+    for suffix in _SUFFIXES:
+        if len(word) > len(suffix) + 1 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    """한국어용 색인어 추출: 조사를 뗀 어절 + 음절 bigram, 영문/숫자는 단어 그대로"""
+    terms = []
+    for word in _WORD_RE.findall(text.lower()):
+        if "가" <= word[0] <= "힣":
+            stem = _strip_suffix(word)
+            if len(stem) != 2:
+                terms.append(stem)
+            terms.extend(stem[i:i + 2] for i in range(len(stem) - 1))
+        else:
+            terms.append(word)
+    return terms
+
+
+class BM25Index:
+    """배열 기반 역색인(CSR) 위의 BM25 검색
+
+    indptr[t]..indptr[t+1] 구간에 단어 t 가 나오는 문서 번호(doc_ids)와
+    미리 계산한 BM25 가중치(weights)가 들어 있어 질의는 배열 합산만 하면 된다.
+    """
+
+    def __init__(self, terms, indptr, doc_ids, weights, n_docs, source_hash=""):
+        self.terms = terms
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.n_docs = n_docs
+        # 색인을 만든 docstore 파일의 내용 해시 (다시 만들어야 하는지 판단할 때 사용)
+        self.source_hash = source_hash
+
+    @classmethod
+    def build(cls, texts, k1=1.2, b=0.75):
+        postings = {}
+        doc_lens = []
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        n_docs = len(doc_lens)
+        lens = np.asarray(doc_lens, dtype=np.float32)
+        norm = k1 * (1 - b + b * lens / max(float(lens.mean()) if n_docs else 0.0, 1.0))
+
+        terms = sorted(postings)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            indptr[i + 1] = indptr[i] + len(postings[term])
+        doc_ids = np.empty(indptr[-1], dtype=np.int32)
+        weights = np.empty(indptr[-1], dtype=np.float32)
+        for i, term in enumerate(terms):
+            plist = postings[term]
+            df = len(plist)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            ids = np.fromiter((d for d, _ in plist), dtype=np.int32, count=df)
+            tfs = np.fromiter((tf for _, tf in plist), dtype=np.float32, count=df)
+            doc_ids[indptr[i]:indptr[i + 1]] = ids
+            weights[indptr[i]:indptr[i + 1]] = idf * tfs * (k1 + 1) / (tfs + norm[ids])
+        return cls(terms, indptr, doc_ids, weights, n_docs)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(
+            path,
+            terms=np.array("\n".join(self.terms)),
+            indptr=self.indptr,
+            doc_ids=self.doc_ids,
+            weights=self.weights,
+            n_docs=np.array(self.n_docs),
+            source_hash=np.array(self.source_hash),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            terms = str(f["terms"]).split("\n") if f["terms"].size else []
+            # 예전 형식(파일 크기만 저장)은 해시가 없으므로 다시 만들게 된다
+            source_hash = str(f["source_hash"]) if "source_hash" in f.files else ""
+            return cls(terms, f["indptr"], f["doc_ids"], f["weights"], int(f["n_docs"]), source_hash)
+
+    def scores(self, query):
+        """모든 문서에 대한 BM25 점수 배열 (벡터 점수와 결합할 때 사용)"""
+        slices = []
+        for term, qtf in Counter(tokenize(query)).items():
+            t = self.vocab.get(term)
+            if t is not None:
+                slices.append((self.indptr[t], self.indptr[t + 1], qtf))
+        if not slices:
+            return np.zeros(self.n_docs, dtype=np.float64)
+        docs = np.concatenate([self.doc_ids[s:e] for s, e, _ in slices])
+        weights = np.concatenate([self.weights[s:e] * qtf for s, e, qtf in slices])
+        return np.bincount(docs, weights=weights, minlength=self.n_docs)
+
+    def search(self, query, k=5):
+        """상위 k개 (doc_id, score) 목록. 일치하는 단어가 없으면 빈 목록"""
+        scores = self.scores(query)
+        return top_k(scores, k)
+
+
+def top_k(scores, k):
+    """점수 배열에서 0보다 큰 상위 k개를 (index, score) 로 반환"""
+    k = min(k, int(np.count_nonzero(scores > 0)))
+    if k <= 0:
+        return []
+    idx = np.argpartition(-scores, k - 1)[:k]
+    idx = idx[np.argsort(-scores[idx])]
+    return [(int(i), float(scores[i])) for i in idx]
+
+
+def reciprocal_rank_fusion(rankings, k=5, c=60):
+    """여러 검색 결과 [(doc_id, score), ...] 를 순위 기반(RRF)으로 합친다"""
+    fused = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (c + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def file_hash(path):
+    """파일 내용의 sha1 (크기·문서 수가 같은 다른 docstore 도 구분)"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_or_build(index_path=DEFAULT_BM25_PATH, docstore_path=DEFAULT_COMPACT_PATH):
+    """저장된 색인이 현재 docstore 로 만든 것이면 읽고, 아니면 새로 만든다"""
+    store = CompactDocstore(docstore_path)
+    source_hash = file_hash(docstore_path)
+    if os.path.exists(index_path):
+        index = BM25Index.load(index_path)
+        if index.n_docs == len(store) and index.source_hash == source_hash:
+            return index
+    index = BM25Index.build(store.iter_texts())
+    index.source_hash = source_hash
+    try:
+        index.save(index_path)
+    except OSError:
+        pass
+    return index
+
+
+def bench(index, store, n_queries=500, k=5, seed=0):
+    """docstore 문장 일부를 질의로 써서 지연 시간과 적중률 측정"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n_queries):
+        doc_id = rng.randrange(len(store))
+        words = store.get_text(doc_id).split()
+        start = rng.randrange(max(len(words) - 6, 1))
+        queries.append((doc_id, " ".join(words[start:start + 6])))
+
+    timings = []
+    hits = 0
+    for doc_id, query in queries:
+        start = time.perf_counter()
+        result = index.search(query, k=k)
+        timings.append((time.perf_counter() - start) * 1000)
+        hits += any(d == doc_id for d, _ in result)
+    timings.sort()
+    p = lambda q: timings[min(int(q * len(timings)), len(timings) - 1)]
+    print(f"질의 {len(queries)}개: p50 {p(0.5):.3f} ms, p95 {p(0.95):.3f} ms, p99 {p(0.99):.3f} ms")
+    print(f"hit@{k}: {hits / len(queries):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="도움자료 docstore BM25 색인")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="docstore 로부터 BM25 색인 생성")
+    p.add_argument("--docstore", default=DEFAULT_COMPACT_PATH)
+    p.add_argument("--output", default=DEFAULT_BM25_PATH)
+
+    p = sub.add_parser("bench", help="질의 지연 시간 측정")
+    p.add_argument("--docstore", default=DEFAULT_COMPACT_PATH)
+    p.add_argument("--index", default=DEFAULT_BM25_PATH)
+    p.add_argument("-n", type=int, default=500)
+    p.add_argument("-k", type=int, default=5)
+
+    p = sub.add_parser("search", help="질의 한 개 실행")
+    p.add_argument("query")
+    p.add_argument("--docstore", default=DEFAULT_COMPACT_PATH)
+    p.add_argument("--index", default=DEFAULT_BM25_PATH)
+    p.add_argument("-k", type=int, default=5)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        start = time.perf_counter()
+        index = BM25Index.build(CompactDocstore(args.docstore).iter_texts())
+        index.source_hash = file_hash(args.docstore)
+        index.save(args.output)
+        print(f"단어 {len(index.terms)}개, 색인 항목 {len(index.doc_ids)}개, "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms → {args.output} "
+              f"({os.path.getsize(args.output) / 1e6:.2f} MB)")
+    elif args.command == "bench":
+        bench(load_or_build(args.index, args.docstore), CompactDocstore(args.docstore), n_queries=args.n, k=args.k)
+    elif args.command == "search":
+        store = CompactDocstore(args.docstore)
+        for doc_id, score in load_or_build(args.index, args.docstore).search(args.query, k=args.k):
+            print(f"{doc_id}\t{score:.2f}\t{store.get_text(doc_id)[:80]!r}")
+
+
+if __name__ == "__main__":
+    main()
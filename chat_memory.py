@@ -0,0 +1,107 @@
+from collections import deque
+
+from docstore import count_tokens
+
+
+def truncate_to_tokens(text, max_tokens):
+    """토큰 예산을 넘는 텍스트를 글자 비율로 잘라낸다"""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    cut = max(int(len(text) * max_tokens / tokens) - 1, 0)
+    return text[:cut].rstrip() + " …"
+
+
+def extractive_summary(summary, turns, max_tokens):
+    """LLM 없이 만드는 요약: 이전 요약 뒤에 질문과 답변 첫 문장을 덧붙이고 앞쪽부터 버린다"""
+    lines = [summary] if summary else []
+    for question, answer in turns:
+        first = answer.strip().split("\n")[0]
+        lines.append(f"- Q: {question} / A: {truncate_to_tokens(first, 60)}")
+    text = "\n".join(lines)
+    while count_tokens(text) > max_tokens and "\n" in text:
+        text = text.split("\n", 1)[1]
+    return truncate_to_tokens(text, max_tokens)
+
+
+class ConversationMemory:
+    """최근 max_turns 개의 대화는 그대로, 그 이전 대화는 요약 한 개로 유지하는 대화 기억
+
+    summarize(이전 요약, [(질문, 답변), ...], 최대 토큰) -> 새 요약
+    을 넘기면 오래된 대화를 접을 때 사용하고, 실패하면 추출식 요약으로 대신한다.
+    밀려난 대화는 fold_every 개가 모이거나 fold_tokens 를 넘을 때 한 번에 접고,
+    그 전까지는 저장된 요약 뒤에 추출식 요약으로 붙여 쓴다.
+    """
+
+    def __init__(self, max_turns=3, summary_tokens=300, context_tokens=1500, summarize=None,
+                 fold_every=4, fold_tokens=1000):
+        self.max_turns = max_turns
+        self.summary_tokens = summary_tokens
+        self.context_tokens = context_tokens
+        self.summarize = summarize
+        self.fold_every = fold_every
+        self.fold_tokens = fold_tokens
+        self.turns = deque()
+        self.pending = []  # 아직 요약에 접지 않은 밀려난 대화
+        self.summary = ""
+
+    def __len__(self):
+        return len(self.turns)
+
+    def add(self, question, answer):
+        self.turns.append((question, answer))
+        evicted = []
+        while len(self.turns) > self.max_turns:
+            evicted.append(self.turns.popleft())
+        if evicted:
+            self.pending.extend(evicted)
+            pending_tokens = sum(count_tokens(q) + count_tokens(a) for q, a in self.pending)
+            if len(self.pending) >= self.fold_every or pending_tokens > self.fold_tokens:
+                evicted, self.pending = self.pending, []
+                self._fold(evicted)
+
+    def _fold(self, evicted):
+        summary = None
+        if self.summarize is not None:
+            try:
+                summary = self.summarize(self.summary, evicted, self.summary_tokens)
+            except Exception:
+                summary = None
+        if not summary:
+            summary = extractive_summary(self.summary, evicted, self.summary_tokens)
+        self.summary = truncate_to_tokens(summary.strip(), self.summary_tokens)
+
+    def current_summary(self):
+        """저장된 요약 + 아직 접지 않은 대화의 추출식 요약"""
+        if not self.pending:
+            return self.summary
+        return extractive_summary(self.summary, self.pending, self.summary_tokens * 2)
+
+    def build_context(self):
+        """프롬프트에 넣을 이전 대화 (요약 + 최근 대화, context_tokens 이내)"""
+        summary = self.current_summary()
+        if not summary and not self.turns:
+            return ""
+        budget = self.context_tokens
+        parts = []
+        if summary:
+            parts.append(f"[이전 대화 요약]\n{summary}")
+            budget -= count_tokens(summary)
+
+        # 최근 대화는 최신 것부터 예산을 배정하고, 넘치면 답변을 잘라 넣는다
+        recent = []
+        for question, answer in reversed(self.turns):
+            if budget <= 50:
+                break
+            q_tokens = count_tokens(question)
+            answer = truncate_to_tokens(answer, max(budget - q_tokens, 0))
+            recent.append(f"Q: {question}\nA: {answer}")
+            budget -= q_tokens + count_tokens(answer)
+        if recent:
+            parts.append("[최근 대화]\n" + "\n\n".join(reversed(recent)))
+        return "\n\n".join(parts)
+
+    def clear(self):
+        self.turns.clear()
+        self.pending = []
+        self.summary = ""
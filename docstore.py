@@ -0,0 +1,574 @@
+import argparse
+import json
+import math
+import mmap
+import os
+import pickle
+import random
+import re
+import struct
+import subprocess
+import sys
+import time
+from collections import Counter
+
+
+DEFAULT_PICKLE_PATH = os.path.join("faiss_index", "index.pkl")
+DEFAULT_COMPACT_PATH = os.path.join("faiss_index", "docstore.bin")
+
+# pickle 안에서 허용하는 클래스 (FAISS.save_local 이 저장하는 docstore 형식)
+_ALLOWED_PICKLE_CLASSES = {
+    ("langchain_community.docstore.in_memory", "InMemoryDocstore"),
+    ("langchain_core.documents.base", "Document"),
+}
+
+
+class _PickledObject:
+    """허용된 클래스를 langchain 없이 속성 dict 로만 복원하기 위한 대체 객체"""
+
+    def __init__(self, *args, **kwargs):
+        self.state = {}
+
+    def __setstate__(self, state):
+        self.state = state
+
+
+class _RestrictedUnpickler(pickle.Unpickler):
+    """허용 목록에 있는 클래스만 복원하는 Unpickler (임의 코드 실행 방지)"""
+
+    def find_class(self, module, name):
+        if (module, name) in _ALLOWED_PICKLE_CLASSES:
+            return _PickledObject
+        raise pickle.UnpicklingError(f"허용되지 않은 클래스: {module}.{name}")
+
+
+def _object_fields(obj):
+    state = obj.state
+    if isinstance(state, tuple):
+        state = state[0]
+    return state.get("__dict__", state)
+
+
+def load_pickled_elements(path=DEFAULT_PICKLE_PATH):
+    """FAISS docstore pickle 을 읽어 (doc_id, text, metadata) 목록을 index 순서대로 반환"""
+    with open(path, "rb") as f:
+        docstore, index_to_docstore_id = _RestrictedUnpickler(f).load()
+    docs = _object_fields(docstore)["_dict"]
+    elements = []
+    for i in range(len(index_to_docstore_id)):
+        doc_id = index_to_docstore_id[i]
+        fields = _object_fields(docs[doc_id])
+        elements.append((doc_id, fields.get("page_content", ""), fields.get("metadata", {})))
+    return elements
+
+
+_ENCODER = None
+
+
+def count_tokens(text):
+    """gpt-4o 토크나이저 기준 토큰 수 (tiktoken 이 없으면 글자 수로 보수적으로 추정)"""
+    global _ENCODER
+    if _ENCODER is None:
+        try:
+            import tiktoken
+            _ENCODER = tiktoken.encoding_for_model("gpt-4o")
+        except Exception:
+            _ENCODER = False
+    if _ENCODER:
+        return len(_ENCODER.encode(text))
+    return len(text)
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def find_boilerplate(elements, min_repeats=8, max_chars=60):
+    """문서 전체에서 반복되는 짧은 문구(머리말, 양식 제목 등)를 찾는다"""
+    counts = Counter(_normalize(text) for _, text, _ in elements)
+    return {
+        text for text, n in counts.items()
+        if n >= min_repeats and len(text) <= max_chars
+    }
+
+
+def _split_long_line(line, max_tokens):
+    """토큰 제한보다 긴 요소(주로 표)를 공백 단위로 나눈다"""
+    if count_tokens(line) <= max_tokens:
+        return [line]
+    pieces = []
+    words = []
+    tokens = 0
+    for word in line.split(" "):
+        word_tokens = count_tokens(word) + 1
+        if words and tokens + word_tokens > max_tokens:
+            pieces.append(" ".join(words))
+            words = []
+            tokens = 0
+        words.append(word)
+        tokens += word_tokens
+    if words:
+        pieces.append(" ".join(words))
+    return pieces
+
+
+def consolidate_elements(elements, max_tokens=400, min_repeats=8):
+    """unstructured 요소들을 제목 계층(category_depth) 단위로 묶어 토큰 제한이 있는 청크로 변환
+
+    청크 텍스트는 앞에 붙는 "[제목 경로]" 줄과 줄바꿈까지 합쳐 max_tokens 이내로 만든다.
+
+    반환값: (chunks, element_to_chunk)
+      chunks: [{"text": ..., "metadata": {"source": ..., "section": ...}}, ...]
+      element_to_chunk: {원본 doc_id: 청크 번호} (제거된 요소는 포함되지 않음)
+    """
+    boilerplate = find_boilerplate(elements, min_repeats=min_repeats)
+    chunks = []
+    element_to_chunk = {}
+    seen_texts = {}
+
+    headings = []  # [(depth, 제목), ...]
+    current = {"source": None, "lines": [], "ids": [], "tokens": 0}
+
+    def header():
+        section = " > ".join(title for _, title in headings)
+        return f"[{section}]\n" if section else ""
+
+    def flush():
+        if not current["lines"]:
+            return
+        section = " > ".join(title for _, title in headings)
+        text = header() + "\n".join(current["lines"])
+        # 완전히 같은 내용의 청크는 하나만 유지
+        chunk_idx = seen_texts.get(text)
+        if chunk_idx is None:
+            chunk_idx = len(chunks)
+            seen_texts[text] = chunk_idx
+            chunks.append({
+                "text": text,
+                "metadata": {"source": current["source"], "section": section},
+            })
+        for doc_id in current["ids"]:
+            element_to_chunk[doc_id] = chunk_idx
+        current["lines"] = []
+        current["ids"] = []
+        current["tokens"] = 0
+
+    for doc_id, text, metadata in elements:
+        line = _normalize(text)
+        source = metadata.get("filename") or metadata.get("source", "")
+        if source != current["source"]:
+            flush()
+            headings = []
+            current["source"] = source
+        if not line:
+            continue
+
+        if metadata.get("category") == "Title":
+            flush()
+            depth = metadata.get("category_depth") or 0
+            while headings and headings[-1][0] >= depth:
+                headings.pop()
+            if line not in boilerplate:
+                headings.append((depth, line))
+            element_to_chunk[doc_id] = None
+            continue
+
+        if line in boilerplate:
+            continue
+
+        # 제목은 바뀔 때 앞 청크를 내보내므로, 지금 제목 줄이 이 요소가 들어갈 청크의 머리가 된다
+        header_tokens = count_tokens(header())
+        for piece in _split_long_line(line, max(max_tokens - header_tokens, 1)):
+            tokens = count_tokens(piece) + 1  # 앞 줄과 잇는 줄바꿈
+            if current["lines"] and current["tokens"] + tokens > max_tokens:
+                flush()
+            if not current["lines"]:
+                current["tokens"] = header_tokens
+                tokens -= 1
+            current["lines"].append(piece)
+            current["ids"].append(doc_id)
+            current["tokens"] += tokens
+
+    flush()
+
+    # 제목 요소는 바로 뒤에 오는 본문 청크에 속한 것으로 본다
+    pending = []
+    for doc_id, _, _ in elements:
+        if doc_id not in element_to_chunk:
+            continue
+        if element_to_chunk[doc_id] is None:
+            pending.append(doc_id)
+        else:
+            for title_id in pending:
+                element_to_chunk[title_id] = element_to_chunk[doc_id]
+            pending = []
+    for title_id in pending:
+        del element_to_chunk[title_id]
+
+    return chunks, element_to_chunk
+
+
+def save_pickled_chunks(chunks, path):
+    """청크를 기존과 같은 FAISS docstore pickle 형식으로 저장 (langchain 필요)"""
+    import uuid
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_core.documents import Document
+
+    docs = {}
+    index_to_docstore_id = {}
+    for i, chunk in enumerate(chunks):
+        doc_id = str(uuid.uuid4())
+        docs[doc_id] = Document(id=doc_id, page_content=chunk["text"], metadata=chunk["metadata"])
+        index_to_docstore_id[i] = doc_id
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump((InMemoryDocstore(docs), index_to_docstore_id), f)
+
+
+def _payload_bytes(units):
+    """텍스트와 메타데이터를 직렬화했을 때의 바이트 수"""
+    return sum(
+        len(text.encode("utf-8")) + len(json.dumps(metadata, ensure_ascii=False).encode("utf-8"))
+        for text, metadata in units
+    )
+
+
+def _bigrams(text):
+    text = re.sub(r"\s+", "", text)
+    return Counter(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def _rank_units(query, unit_vectors, df, n_units, k):
+    """문자 bigram TF-IDF 코사인으로 상위 k개 단위를 찾는다 (비교용 간이 검색기)"""
+    q = _bigrams(query)
+    q_weights = {g: c * math.log(1 + n_units / df[g]) for g, c in q.items() if g in df}
+    q_norm = math.sqrt(sum(w * w for w in q_weights.values())) or 1.0
+    scores = []
+    for idx, (vec, norm) in enumerate(unit_vectors):
+        dot = sum(w * vec.get(g, 0.0) for g, w in q_weights.items())
+        if dot:
+            scores.append((dot / (norm * q_norm), idx))
+    scores.sort(reverse=True)
+    return [idx for _, idx in scores[:k]]
+
+
+def _index_units(texts):
+    df = Counter()
+    grams = [_bigrams(t) for t in texts]
+    for g in grams:
+        df.update(g.keys())
+    n = len(texts)
+    vectors = []
+    for g in grams:
+        vec = {b: c * math.log(1 + n / df[b]) for b, c in g.items()}
+        vectors.append((vec, math.sqrt(sum(w * w for w in vec.values())) or 1.0))
+    return vectors, df
+
+
+def evaluate_recall(elements, chunks, element_to_chunk, k=5, n_probes=200, seed=0):
+    """통합 전후의 검색 재현율 비교
+
+    문장형 요소를 무작위로 골라 앞부분 일부를 질의로 사용한다.
+      hit@k: 질의 원문이 담긴 단위가 상위 k개 안에 있는 비율
+      section_recall@k: 같은 제목 아래의 요소들 중 상위 k개 단위로 함께 회수되는 비율
+    """
+    rng = random.Random(seed)
+    section_of = {}
+    headings = []
+    source = None
+    for doc_id, text, metadata in elements:
+        if metadata.get("filename") != source:
+            source = metadata.get("filename")
+            headings = []
+        if metadata.get("category") == "Title":
+            depth = metadata.get("category_depth") or 0
+            while headings and headings[-1][0] >= depth:
+                headings.pop()
+            headings.append((depth, doc_id))
+        section_of[doc_id] = (source, tuple(h for _, h in headings))
+
+    members = {}
+    for doc_id, sec in section_of.items():
+        members.setdefault(sec, set()).add(doc_id)
+
+    candidates = [
+        (doc_id, _normalize(text)) for doc_id, text, metadata in elements
+        if metadata.get("category") in ("NarrativeText", "ListItem")
+        and len(_normalize(text)) >= 30 and doc_id in element_to_chunk
+    ]
+    probes = rng.sample(candidates, min(n_probes, len(candidates)))
+
+    before_units = [[doc_id] for doc_id, _, _ in elements]
+    before_texts = [text for _, text, _ in elements]
+    after_units = [[] for _ in chunks]
+    for doc_id, chunk_idx in element_to_chunk.items():
+        after_units[chunk_idx].append(doc_id)
+    after_texts = [c["text"] for c in chunks]
+
+    results = {}
+    for label, units, texts in (("before", before_units, before_texts), ("after", after_units, after_texts)):
+        vectors, df = _index_units(texts)
+        hits = 0
+        section_recall = 0.0
+        for doc_id, text in probes:
+            query = text[:len(text) // 2]
+            top = _rank_units(query, vectors, df, len(texts), k)
+            retrieved = set()
+            for idx in top:
+                retrieved.update(units[idx])
+            if doc_id in retrieved:
+                hits += 1
+            section = members[section_of[doc_id]]
+            section_recall += len(section & retrieved) / len(section)
+        results[label] = {
+            "hit": hits / len(probes),
+            "section_recall": section_recall / len(probes),
+        }
+    return results
+
+
+def report(elements, chunks, element_to_chunk, pickle_path=None, output_path=None, k=5):
+    """통합 전후의 단위 수, 크기, 재현율을 출력"""
+    before = _payload_bytes((text, metadata) for _, text, metadata in elements)
+    after = _payload_bytes((c["text"], c["metadata"]) for c in chunks)
+    dropped = sum(1 for doc_id, _, _ in elements if doc_id not in element_to_chunk)
+    tokens = [count_tokens(c["text"]) for c in chunks]
+
+    print(f"단위 수: {len(elements)} 요소 → {len(chunks)} 청크 (제거된 중복/상용구 요소 {dropped}개)")
+    print(f"청크 토큰: 평균 {sum(tokens) / max(len(tokens), 1):.0f}, 최대 {max(tokens, default=0)}")
+    print(f"텍스트+메타데이터: {before / 1e6:.2f} MB → {after / 1e6:.2f} MB")
+    if pickle_path and os.path.exists(pickle_path):
+        size = os.path.getsize(pickle_path)
+        line = f"pickle 파일: {size / 1e6:.2f} MB"
+        if output_path and os.path.exists(output_path):
+            line += f" → {os.path.getsize(output_path) / 1e6:.2f} MB"
+        print(line)
+
+    recall = evaluate_recall(elements, chunks, element_to_chunk, k=k)
+    for label in ("before", "after"):
+        r = recall[label]
+        print(f"[{label}] hit@{k}: {r['hit']:.3f}, section_recall@{k}: {r['section_recall']:.3f}")
+
+
+# ---------------------------------------------------------------------------
+# 메모리 매핑 docstore 형식
+#
+#   [헤더] magic(8) | version(u32) | 문서 수 N(u32) | 텍스트 blob 위치(u64) | 메타데이터 blob 위치(u64)
+#   [오프셋표] 텍스트 오프셋 u64 x (N+1) | 메타데이터 오프셋 u64 x (N+1)
+#   [텍스트 blob] UTF-8 본문을 이어 붙인 것
+#   [메타데이터 blob] 문서별 JSON(UTF-8)을 이어 붙인 것
+#
+# 파일을 읽기 전용으로 mmap 하므로 여러 프로세스가 같은 페이지 캐시를 공유하고,
+# 문서는 ID(0..N-1)로 요청될 때만 문자열로 만들어진다.
+# ---------------------------------------------------------------------------
+
+_COMPACT_MAGIC = b"GDOCSTR1"
+# 파일 형식이나 청크 나누는 방식(consolidate_elements)이 바뀌면 올려서 예전 파일을 다시 만들게 한다
+_COMPACT_VERSION = 2
+_COMPACT_HEADER = struct.Struct("<8sIIQQ")
+
+
+def write_compact_docstore(units, path):
+    """(text, metadata) 목록을 메모리 매핑 가능한 단일 파일로 저장"""
+    texts = [text.encode("utf-8") for text, _ in units]
+    metas = [json.dumps(metadata, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for _, metadata in units]
+    n = len(texts)
+
+    def offsets(blobs):
+        table = [0]
+        for b in blobs:
+            table.append(table[-1] + len(b))
+        return table
+
+    text_offsets = offsets(texts)
+    meta_offsets = offsets(metas)
+    table_start = _COMPACT_HEADER.size
+    text_start = table_start + 8 * 2 * (n + 1)
+    meta_start = text_start + text_offsets[-1]
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # 여러 프로세스가 동시에 만들어도 서로의 임시 파일을 덮어쓰지 않도록 pid 를 붙인다
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_COMPACT_HEADER.pack(_COMPACT_MAGIC, _COMPACT_VERSION, n, text_start, meta_start))
+        f.write(struct.pack(f"<{n + 1}Q", *text_offsets))
+        f.write(struct.pack(f"<{n + 1}Q", *meta_offsets))
+        f.writelines(texts)
+        f.writelines(metas)
+    os.replace(tmp_path, path)
+
+
+class CompactDocstore:
+    """write_compact_docstore 로 만든 파일을 mmap 으로 열어 문서를 ID 별로 지연 로딩"""
+
+    def __init__(self, path=DEFAULT_COMPACT_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n, self._text_start, self._meta_start = _COMPACT_HEADER.unpack_from(self._mm, 0)
+        if magic != _COMPACT_MAGIC or version != _COMPACT_VERSION:
+            raise ValueError(f"docstore 형식이 아닙니다: {path}")
+        self._n = n
+        table = memoryview(self._mm)[_COMPACT_HEADER.size:self._text_start]
+        self._text_offsets = table[:8 * (n + 1)].cast("Q")
+        self._meta_offsets = table[8 * (n + 1):].cast("Q")
+
+    def __len__(self):
+        return self._n
+
+    def _check(self, doc_id):
+        if not 0 <= doc_id < self._n:
+            raise KeyError(doc_id)
+
+    def get_text(self, doc_id):
+        self._check(doc_id)
+        start = self._text_start + self._text_offsets[doc_id]
+        end = self._text_start + self._text_offsets[doc_id + 1]
+        return self._mm[start:end].decode("utf-8")
+
+    def get_metadata(self, doc_id):
+        self._check(doc_id)
+        start = self._meta_start + self._meta_offsets[doc_id]
+        end = self._meta_start + self._meta_offsets[doc_id + 1]
+        return json.loads(self._mm[start:end])
+
+    def __getitem__(self, doc_id):
+        return self.get_text(doc_id), self.get_metadata(doc_id)
+
+    def iter_texts(self):
+        for doc_id in range(self._n):
+            yield self.get_text(doc_id)
+
+    def as_document(self, doc_id):
+        """langchain Document 가 필요한 곳을 위한 변환"""
+        from langchain_core.documents import Document
+        text, metadata = self[doc_id]
+        return Document(id=str(doc_id), page_content=text, metadata=metadata)
+
+
+def load_or_build(path=DEFAULT_COMPACT_PATH, pickle_path=DEFAULT_PICKLE_PATH):
+    """mmap docstore 를 연다. 파일이 없거나 원본 pickle 보다 오래되었으면 pickle 에서 새로 만든다
+
+    docstore.bin 은 저장소에 넣지 않는 빌드 결과물이며, pickle 은 허용 목록 unpickler 로만 읽는다.
+    """
+    if os.path.exists(path) and (not os.path.exists(pickle_path)
+                                 or os.path.getmtime(path) >= os.path.getmtime(pickle_path)):
+        try:
+            return CompactDocstore(path)
+        except ValueError:
+            if not os.path.exists(pickle_path):
+                raise
+    chunks, _ = consolidate_elements(load_pickled_elements(pickle_path))
+    write_compact_docstore([(c["text"], c["metadata"]) for c in chunks], path)
+    return CompactDocstore(path)
+
+
+def _private_rss_kb():
+    """공유 페이지(mmap 된 파일 등)를 뺀 프로세스 고유 RSS"""
+    try:
+        with open("/proc/self/statm") as f:
+            fields = f.read().split()
+        pages = int(fields[1]) - int(fields[2])
+        return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _load_probe(kind, path, n_fetch):
+    """별도 프로세스에서 호출: 로딩 시간과 RSS 증가량을 JSON 으로 출력"""
+    rss_before = _private_rss_kb()
+    start = time.perf_counter()
+    if kind == "pickle":
+        # 측정에서도 임의 클래스를 만들 수 있는 pickle.load 는 쓰지 않는다
+        load_pickled_elements(path)
+        loader = "restricted unpickler"
+    else:
+        store = CompactDocstore(path)
+        loader = "mmap"
+    load_ms = (time.perf_counter() - start) * 1000
+
+    fetch_ms = None
+    if kind == "compact":
+        rng = random.Random(0)
+        ids = [rng.randrange(len(store)) for _ in range(n_fetch)]
+        start = time.perf_counter()
+        for doc_id in ids:
+            store[doc_id]
+        fetch_ms = (time.perf_counter() - start) * 1000 / max(n_fetch, 1)
+    print(json.dumps({
+        "loader": loader,
+        "load_ms": load_ms,
+        "fetch_ms": fetch_ms,
+        "rss_kb": _private_rss_kb() - rss_before,
+    }))
+
+
+def bench_load(pickle_path, compact_path, n_fetch=100):
+    """pickle 과 mmap docstore 의 시작 시간과 프로세스별 메모리 비교"""
+    for kind, path in (("pickle", pickle_path), ("compact", compact_path)):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "load-probe", kind, path, str(n_fetch)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(out)
+        line = f"[{kind}] {r['loader']}: 로딩 {r['load_ms']:.1f} ms, 고유 RSS +{r['rss_kb'] / 1024:.1f} MB"
+        if r["fetch_ms"] is not None:
+            line += f", 문서 1개 조회 {r['fetch_ms'] * 1000:.1f} µs"
+        print(f"{line}, 파일 {os.path.getsize(path) / 1e6:.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="학교자율시간 도움자료 docstore 도구")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("consolidate", help="요소를 제목 단위 청크로 통합하고 전후 비교 결과를 출력")
+    p.add_argument("--input", default=DEFAULT_PICKLE_PATH)
+    p.add_argument("--output", help="통합된 docstore 를 저장할 pickle 경로 (langchain 필요)")
+    p.add_argument("--max-tokens", type=int, default=400)
+    p.add_argument("--min-repeats", type=int, default=8, help="이 횟수 이상 반복되는 짧은 문구는 상용구로 제거")
+    p.add_argument("-k", type=int, default=5)
+
+    p = sub.add_parser("build", help="pickle 을 메모리 매핑 docstore 로 변환")
+    p.add_argument("--input", default=DEFAULT_PICKLE_PATH)
+    p.add_argument("--output", default=DEFAULT_COMPACT_PATH)
+    p.add_argument("--max-tokens", type=int, default=400)
+    p.add_argument("--min-repeats", type=int, default=8)
+    p.add_argument("--no-consolidate", action="store_true", help="요소를 청크로 묶지 않고 그대로 저장")
+
+    p = sub.add_parser("bench-load", help="pickle 과 mmap docstore 의 로딩 시간/메모리 비교")
+    p.add_argument("--pickle", default=DEFAULT_PICKLE_PATH)
+    p.add_argument("--compact", default=DEFAULT_COMPACT_PATH)
+    p.add_argument("--fetch", type=int, default=100)
+
+    p = sub.add_parser("load-probe")
+    p.add_argument("kind", choices=["pickle", "compact"])
+    p.add_argument("path")
+    p.add_argument("n_fetch", type=int)
+
+    args = parser.parse_args()
+    if args.command == "consolidate":
+        elements = load_pickled_elements(args.input)
+        chunks, element_to_chunk = consolidate_elements(
+            elements, max_tokens=args.max_tokens, min_repeats=args.min_repeats
+        )
+        if args.output:
+            save_pickled_chunks(chunks, args.output)
+        report(elements, chunks, element_to_chunk, pickle_path=args.input, output_path=args.output, k=args.k)
+    elif args.command == "build":
+        elements = load_pickled_elements(args.input)
+        if args.no_consolidate:
+            units = [(text, metadata) for _, text, metadata in elements]
+        else:
+            chunks, _ = consolidate_elements(elements, max_tokens=args.max_tokens, min_repeats=args.min_repeats)
+            units = [(c["text"], c["metadata"]) for c in chunks]
+        write_compact_docstore(units, args.output)
+        print(f"{len(units)}개 문서 → {args.output} ({os.path.getsize(args.output) / 1e6:.2f} MB)")
+    elif args.command == "bench-load":
+        bench_load(args.pickle, args.compact, n_fetch=args.fetch)
+    elif args.command == "load-probe":
+        _load_probe(args.kind, args.path, args.n_fetch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,693 @@
+import hashlib
+import json
+import re
+import threading
+from io import BytesIO
+
+
+SYSTEM_PROMPT = """한국의 초등학교 2022 개정 교육과정 전문가입니다.
+학교자율시간 계획서를 다음 원칙에 따라 작성합니다:
+
+1. 지도계획에 모든 차시에 학습내용과 학습 주제가 빈틈없이 내용이 꼭 들어가야 합니다.
+2. 학습자 중심의 교육과정 초등학교 3,4학년 수준에 맞는 쉽게 내용을 만들어 주세요.
+3. 실생활 연계 및 체험 중심 활동
+4. 교과 간 연계 및 통합적 접근
+5. 초등학교 3학년, 4학년 수준에 맞아야 한다. 
+7. 요구사항을 반영한 맞춤형 교육과정 구성
+8. 교수학습 방법의 다양화
+9. 객관적이고 공정한 평가계획 수립
+10.초등학교 수준에 맞는 내용 구성성
+"""
+
+
+def make_code_prefix(grades, subjects, activity_name):
+    """학년/교과/활동명을 바탕으로 성취기준 코드의 접두사(prefix)를 생성"""
+    grade_part = ""
+    if grades and len(grades) > 0:
+        grade_part = grades[0].replace("학년", "").replace("학년군","").strip()
+    
+    subject_part = ""
+    if subjects and len(subjects) > 0:
+        s = subjects[0]
+        if s:
+            subject_part = s[0]
+    
+    act_part = ""
+    if activity_name and len(activity_name) > 0:
+        act_part = activity_name[:2]
+    
+    code_prefix = f"{grade_part}{subject_part}{act_part}"
+    return code_prefix
+
+
+STEP_REQUIRED_FIELDS = {
+    3: ["domain", "key_ideas", "content_elements"],
+    4: ["code", "description", "levels"],
+    5: ["code", "description", "element", "method", "criteria_high", "criteria_mid", "criteria_low"],
+}
+
+
+def parse_step_response(step, response_text):
+    """단계별 JSON 응답을 파싱하고 형식을 검증 (실패 시 ValueError → 상위 모델로 다시 요청)"""
+    raw_text = response_text.replace('```json','').replace('```','').strip()
+    try:
+        parsed = json.loads(raw_text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON 파싱 실패: {e}")
+
+    if step == 1:
+        if not isinstance(parsed, dict):
+            raise ValueError("1단계 응답은 dict여야 합니다.")
+        for field in ["necessity", "overview"]:
+            if not str(parsed.get(field, "")).strip():
+                raise ValueError(f"'{field}' 내용이 비어 있습니다.")
+    elif step in [3, 4]:
+        if not isinstance(parsed, list) or not parsed:
+            raise ValueError(f"{step}단계 응답은 비어 있지 않은 배열이어야 합니다.")
+        for item in parsed:
+            for field in STEP_REQUIRED_FIELDS[step]:
+                if not isinstance(item, dict) or field not in item:
+                    raise ValueError(f"{step}단계 항목에 '{field}' 누락")
+    elif step == 5:
+        if not isinstance(parsed, dict):
+            raise ValueError("5단계 응답은 dict여야 합니다.")
+        if "teaching_methods_text" not in parsed or "assessment_plan" not in parsed:
+            raise ValueError("teaching_methods_text, assessment_plan 키가 모두 필요.")
+        for ap in parsed["assessment_plan"]:
+            for field in STEP_REQUIRED_FIELDS[5]:
+                if field not in ap:
+                    raise ValueError(f"assessment_plan 항목에 '{field}' 누락")
+    return parsed
+
+
+LESSON_COLUMNS = ["lesson_number", "topic", "content", "materials"]
+
+
+def parse_lesson_plans(response_text):
+    """차시 계획 JSON 을 파싱하고 각 차시에 필요한 항목이 있는지 확인"""
+    raw_text = response_text.replace('```json','').replace('```','').strip()
+    try:
+        parsed = json.loads(raw_text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON 파싱 실패: {e}")
+    lesson_plans = parsed.get("lesson_plans", []) if isinstance(parsed, dict) else []
+    if not lesson_plans:
+        raise ValueError("lesson_plans 가 비어 있습니다.")
+    for lp in lesson_plans:
+        for field in LESSON_COLUMNS:
+            if not isinstance(lp, dict) or field not in lp:
+                raise ValueError(f"차시 항목에 '{field}' 누락")
+    return lesson_plans
+
+
+def salvage_lesson_plans(response_text):
+    """max_tokens 에 걸려 잘린 응답에서 끝까지 작성된 차시만 꺼낸다 (하나도 없으면 ValueError)"""
+    raw_text = response_text.replace('```json','').replace('```','').strip()
+    match = re.search(r'"lesson_plans"\s*:\s*\[', raw_text)
+    if not match:
+        raise ValueError("잘린 응답에서 lesson_plans 를 찾지 못했습니다.")
+    decoder = json.JSONDecoder()
+    pos = match.end()
+    lesson_plans = []
+    while True:
+        while pos < len(raw_text) and raw_text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(raw_text) or raw_text[pos] != "{":
+            break
+        try:
+            lp, pos = decoder.raw_decode(raw_text, pos)
+        except json.JSONDecodeError:
+            break
+        if not isinstance(lp, dict) or any(field not in lp for field in LESSON_COLUMNS):
+            break
+        lesson_plans.append(lp)
+    if not lesson_plans:
+        raise ValueError("잘린 응답에 완성된 차시가 없습니다.")
+    return lesson_plans
+
+
+def lesson_index(lp):
+    """lesson_number("3", "3차시" 등)의 차시 번호 (숫자가 없으면 None)"""
+    match = re.search(r"\d+", str(lp.get("lesson_number", "")))
+    return int(match.group()) if match else None
+
+
+def build_step_prompt(step, data):
+    """단계별 프롬프트 (프롬프트가 없는 단계는 빈 문자열)"""
+    necessity = data.get('necessity', '')
+    overview = data.get('overview', '')
+    standards = data.get('standards', [])
+    content_sets = data.get("content_sets", [])
+    num_sets = len(content_sets)
+
+    step_prompts = {
+        1: f"""학교자율시간 활동의 기본 정보를 작성해주세요.
+
+활동명: {data.get('activity_name')}
+요구사항: {data.get('requirements')}
+학교급: {data.get('school_type')}
+대상 학년: {', '.join(data.get('grades', []))}
+연계 교과: {', '.join(data.get('subjects', []))}
+총 차시: {data.get('total_hours')}차시
+운영 학기: {', '.join(data.get('semester', []))}
+
+아래 예시와 같이, 주어진 **활동명**에 종속되어 결과물이 도출되도록 
+'필요성(necessity)', '개요(overview)'만 작성해 주세요.
+
+지침
+1. 필요성은 예시의 2~3배 분량으로 작성해주세요.
+2. 개요는 괄호( )로 목적·목표·주요 내용을 구분해 주세요
+
+[예시]
+필요성:
+ - 불확실한 미래사회를 살아갈 학생들에게 필수적 요소인 디지털 기기의 바른 이해와 사용법에 대한 학습이 필요
+ - 디지털 기기 활용뿐 아니라 디지털 윤리에 관한 학습을 통해 디지털 리터러시와 책임감 있는 디지털 시민으로서의 역량 함양 필요
+
+개요:
+ <목적>
+ - 디지털 기기 사용 경험을 바탕으로, 디지털 기술의 원리와 활용, 윤리적 문제점을 탐구하며 안전하고 책임감 있는 디지털 시민으로 성장
+ <목표>
+ - 디지털 기기의 작동 원리와 활용 방법을 이해한다.
+ - 디지털 기기를 안전하고 책임감 있게 사용하는 방법을 익힌다.
+ <주요 내용>
+ - 디지털 기기 작동 원리 및 간단한 프로그래밍
+ - 디지털 기기를 활용한 다양한 창작 활동
+ - 디지털 윤리에 대한 이해와 실천
+
+다음 JSON 형식으로 작성 (성격은 제외):
+{{
+  "necessity": "작성된 필요성 내용",
+  "overview": "작성된 개요 내용"
+}}
+""",
+
+        3: f"""
+활동명: {data.get('activity_name')} 부합되도록 작성해주세요.
+요구사항: {data.get('requirements')}을 가장 많이 반영해서 작성하면 좋겠어.
+학교급: {data.get('school_type')}도 반영해야 한다. 
+대상 학년: {', '.join(data.get('grades', []))}을 고려해서 작성해야 한다.
+연계 교과: {', '.join(data.get('subjects', []))}
+이전 단계 결과를 참고하여 작성하기
+핵심 아이디어는 IB교육육에서 이야기 하는 빅아이디어와 같은 거야. 학생들이 도달 할 수 있는 일반화된 이론이야 예시처럼 문장으로 진술해주세요.
+'영역명(domain)', '핵심 아이디어(key_ideas)', '내용 요소(content_elements)'(지식·이해 / 과정·기능 / 가치·태도) 4개 세트를 생성... 를 JSON 구조로 작성해주세요. 
+'content_elements'에는 **'knowledge_and_understanding'(지식·이해), 'process_and_skills'(과정·기능), 'values_and_attitudes'(가치·태도)**가 반드시 포함되어야 합니다.
+예시를 참고하여 작성해주세요.
+영역명도 창의적으로 다르게 구성하여 주세요 
+
+<예시>
+영역명
+ 기후위기와 기후행동
+
+핵심 아이디어
+ - 인간은 여러 활동을 통해 기후변화를 초래하였고, 기후변화는 우리의 삶에 다방면으로 영향을 미친다.
+ - 우리는 직면한 기후변화 문제를 완화하거나 적응함으로써 대처하며 생활 속에서 자신이 실천할 수 있는 방법을 탐색하고 행동해야 한다.
+
+내용 요소
+ -지식·이해
+  • 기후변화와 우리 삶의 관계
+  • 기후변화와 식생활
+ -과정·기능
+  • 의사소통 및 갈등해결
+  • 창의적 문제해결
+ -가치·태도
+  • 환경 공동체의식
+  • 환경 실천
+
+JSON 형식으로만 작성하고, 불필요한 문장은 쓰지 마세요. 추가 문장 없이 JSON만 반환
+총 4개의 객체가 있는 JSON 배열
+
+JSON 예시:
+[
+  {{
+    "domain": "...",
+    "key_ideas": [...],
+    "content_elements": {{
+      "knowledge_and_understanding": [...],
+      "process_and_skills": [...],
+      "values_and_attitudes": [...]
+    }}
+  }},
+  ...
+]
+""",
+
+        4: f"""
+이전 단계
+활동명: {data.get('activity_name')}
+요구사항: {data.get('requirements')}
+학교급: {data.get('school_type')}
+대상 학년: {', '.join(data.get('grades', []))}
+연계 교과: {', '.join(data.get('subjects', []))} 
+내용 체계: {content_sets}
+
+총 {num_sets}개 내용체계 세트가 생성되었으므로, 성취기준도 {num_sets}개 생성.
+
+아래는 학년/교과/활동명에서 추출한 코드 접두사입니다:
+code_prefix: "{make_code_prefix(data.get('grades', []), data.get('subjects', []), data.get('activity_name',''))}"
+
+지침:
+1. 성취기준코드는 반드시 code_prefix에 -01, -02, ... 식으로 순서 붙여 생성.
+2. 성취기준은 내용체계표와 내용이 비슷하고 문장의 형식은 아래 예시를 참고:
+   [4사세계시민-01] 글을 읽고 지구촌의 여러 문제를 이해하고 생각한다.
+3. 성취기준 levels는 A/B/C (상/중/하) 세 단계 작성.
+
+JSON 예시:
+[
+  {{
+    "code": "code_prefix-01",
+    "description": "성취기준 설명",
+    "levels": [
+      {{ "level": "A", "description": "상 수준 설명" }},
+      {{ "level": "B", "description": "중 수준 설명" }},
+      {{ "level": "C", "description": "하 수준 설명" }}
+    ]
+  }},
+  ...
+]
+""",
+
+        5: f"""
+이전 단계(성취기준): {standards}
+1.평가요소, 수업평가방법, 평가기준은 예시문을 참고해서 작성해주세요
+2.평가기준은 상,중,하로 나누어서 작성하여 주세요.
+3.평가요소는 ~하기 형식으로 만들어 주세요.
+4.다시 강조하지만 예시문 아래 예시문 형식으로 작성하여 주세요
+
+<예시>
+평가요소
+ - 국가유산의 의미와 유형 알아보고 가치 탐색하기
+수업평가방법
+ [개념학습/프로젝트]
+ - 국가유산의 의미를 이해하게 한 후 기준을 세워 국가유산을 유형별로 알아보고 문화유산의 가치를 파악하는지 평가하기
+평가기준
+ - 상:국가유산의 의미와 유형을 정확하게 이해하고 지역의 국가유산 조사를 통해 국가유산의 가치를 설명할 수 있다.
+ - 중:국가유산의 의미와 유형을 이해하고 지역의 국가유산 조사를 통해 국가유산의 가치를 설명할 수 있다.
+ - 하:주변의 도움을 받아 국가유산의 의미와 유형을 설명할 수 있다.
+
+"teaching_methods_text"교수학습도 예시문을 참고해서 작성하여 주세요
+<예시>
+- 인간 활동으로 발생한 환경 영향의 긍정적인 사례와 부정적인 사례를 균형적으로 탐구하여 인간과 환경에 대한 다양한 측면을 이해하도록 한다.
+- 다양한 사례를 통하여 환경오염의 현상을 이해하도록 지도하고 지속가능한 발전으로 이어질 수 있도록 내면화에 노력한다. 
+- 학교나 지역의 다양한 체험활동 장소와 주제에 따른 계절을 고려하여 학습계획을 세워 학습을 진행한다. 
+- 탐구 및 활동 시에는 사전 준비와 안전교육 등을 통하여 탐구과정에서 발생할 수 있는 안전사고를 예방하도록 한다. 
+
+"teaching_methods_text": 문자열 (여러 줄 가능),
+"assessment_plan": 리스트
+아래 예시 형식으로 JSON을 작성해주세요.
+- 평가기준은 '상', '중', '하' 각각을 별도 필드로 기재 (criteria_high, criteria_mid, criteria_low)
+
+JSON 예시:
+{{
+  "teaching_methods_text": "교수학습방법 여러 줄...",
+  "assessment_plan": [
+    {{
+      "code": "성취기준코드(예: code_prefix-01)",
+      "description": "성취기준문장",
+      "element": "평가요소",
+      "method": "수업평가방법",
+      "criteria_high": "상 수준 평가기준",
+      "criteria_mid": "중 수준 평가기준",
+      "criteria_low": "하 수준 평가기준"
+    }},
+    ...
+  ]
+}}
+"""
+    }
+
+    return step_prompts.get(step, "")
+
+
+def generate_step(router, step, data, guidance=""):
+    """단계별 내용 생성 (형식 검증 실패 시 ValueError)"""
+    prompt = build_step_prompt(step, data)
+    if not prompt:
+        return {}
+    return router.complete(
+        f"step{step}",
+        prompt + guidance + "\n\n(위 형식으로 JSON만 반환)",
+        system_prompt=SYSTEM_PROMPT,
+        temperature=0.7,
+        max_tokens=1800,
+        validate=lambda text: parse_step_response(step, text)
+    )
+
+
+def build_lesson_plan_prompt(total_hours, data, previous=None, end=None):
+    """6단계 차시별 지도계획 프롬프트
+
+    previous 가 있으면 그 다음 차시부터 이어서, end 가 total_hours 보다 작으면 end 차시까지만 작성하도록 요청한다.
+    """
+    necessity = data.get('necessity', '')
+    overview = data.get('overview', '')
+    domain = data.get('domain', '')
+    key_ideas = data.get('key_ideas', [])
+    content_elements = data.get('content_elements', {})
+    standards = data.get('standards', [])
+    teaching_methods = data.get('teaching_methods', [])
+    assessment_plan = data.get('assessment_plan', [])
+    
+    end = min(end or total_hours, total_hours)
+    part = f" (전체 {total_hours}차시 중 일부이며, 나머지 차시는 이어서 따로 요청합니다.)" if end < total_hours else ""
+    if previous:
+        written = "\n".join(f"- {i}차시: {lp.get('topic', '')}" for i, lp in enumerate(previous, 1))
+        scope = (f"**{len(previous) + 1}차시부터 {end}차시까지** 앞 차시에 이어지는 지도계획을 JSON으로 작성해주세요.{part}\n"
+                 f"1~{len(previous)}차시는 이미 작성했으니 다시 쓰지 마세요.\n\n[이미 작성한 차시]\n{written}")
+    elif part:
+        scope = f"**1차시부터 {end}차시까지** 연결된 지도계획을 JSON으로 작성해주세요.{part}"
+    else:
+        scope = f"**1차시부터 {total_hours}차시까지** 한 번에 모두 연결된 지도계획을 JSON으로 작성해주세요."
+
+    chunk_prompt = f"""
+아래 정보를 참고하여 {scope}
+
+[이전 단계 결과]
+대상 학년 {', '.join(data.get('grades', []))}에 맞는 수준으로 작성해야 한다.
+- 영역명: {domain}
+- 핵심 아이디어: {key_ideas}
+- 내용체계: {content_elements}
+- 성취기준: {standards}
+- 교수학습 방법: {teaching_methods}
+- 평가계획: {assessment_plan}
+- 활동명: {data.get('activity_name')}
+- 요구사항: {data.get('requirements')}
+
+각 차시는 다음 사항을 고려하여 작성:
+1. 대상 학년: {', '.join(data.get('grades', []))}에 알맞은 수업계획 작성하기
+2. 명확한 학습주제 재미있고 문학적 표현으로 학습주제 설정
+3. 구체적이고 학생활동 중심으로 진술하세요. ~~하기 형식으로 해주세요.
+4. 실제 수업에 필요한 교수학습자료 명시
+5. 이전 차시와의 연계성 고려
+6. 초등학교 3학년 4학년 수준에 맞는 내용으로 작성하여 주세요.
+
+(예시)
+학습주제: 질문에도 양심이 있다.
+학습내용: 질문을 할 때 지켜야 할 약속 만들기
+         수업 중 질문, 일상 속 질문 속에서 갖추어야 할 예절 알기
+
+"추가 문장 없이 JSON만 보내라"
+다음 JSON 형식으로 작성:
+{{
+  "lesson_plans": [
+    {{
+      "lesson_number": "차시번호",
+      "topic": "학습주제",
+      "content": "학습내용",
+      "materials": "교수학습자료"
+    }}
+  ]
+}}
+"""
+    return chunk_prompt
+
+
+# 차시 하나에 드는 출력 토큰 수 (처음 값, 이후 실제 응답으로 갱신)와 요청 한 번의 max_tokens 범위
+DEFAULT_TOKENS_PER_LESSON = 110
+MIN_LESSON_TOKENS = 1000
+MAX_LESSON_TOKENS = 8000
+# 잘린 응답 뒤에 "N차시부터 이어서" 요청을 보내는 최대 횟수
+MAX_LESSON_CONTINUATIONS = 5
+# 요청 한 번에 작성하는 차시 수 (끝난 묶음마다 중간 저장)
+LESSONS_PER_REQUEST = 20
+
+# 여러 세션·학년별 생성 스레드가 함께 갱신하므로 잠금을 잡고 고친다
+_tokens_per_lesson = DEFAULT_TOKENS_PER_LESSON
+_tokens_lock = threading.Lock()
+
+
+def lesson_max_tokens(lesson_count):
+    """남은 차시 수와 지금까지 관찰한 차시당 토큰 수로 max_tokens 결정 (25% 여유)"""
+    with _tokens_lock:
+        per_lesson = _tokens_per_lesson
+    return int(min(MAX_LESSON_TOKENS, max(MIN_LESSON_TOKENS, 200 + lesson_count * per_lesson * 1.25)))
+
+
+def _observe_tokens_per_lesson(output_tokens, lesson_count):
+    global _tokens_per_lesson
+    if output_tokens and lesson_count:
+        with _tokens_lock:
+            _tokens_per_lesson += 0.3 * (output_tokens / lesson_count - _tokens_per_lesson)
+
+
+def _lesson_key(lp):
+    return tuple(re.sub(r"\s+", " ", str(lp.get(field, ""))).strip() for field in ("topic", "content"))
+
+
+def lesson_plan_key(total_hours, data, owner=""):
+    """같은 입력의 6단계 생성을 구분하는 키 (중간 저장 기록을 찾는 데 사용)
+
+    owner(세션마다 정하는 값)를 함께 넣어, 입력이 같은 다른 사용자의 기록을 불러오지 않게 한다.
+    """
+    prompt = SYSTEM_PROMPT + build_lesson_plan_prompt(total_hours, data)
+    return hashlib.sha1((owner + "\n" + prompt).encode("utf-8")).hexdigest()
+
+
+def generate_lesson_plans(router, total_hours, data, lesson_plans=None, on_progress=None):
+    """1차시부터 total_hours 차시까지의 지도계획 목록
+
+    LESSONS_PER_REQUEST 차시씩 나눠 요청하고, 묶음이 끝날 때마다 지금까지의 차시 목록으로 on_progress 를 부른다.
+    lesson_plans(이전에 저장한 차시)가 있으면 그 다음 차시부터 만든다.
+    응답이 max_tokens 에 걸려 잘리면 끝까지 작성된 차시만 살리고 다음 차시부터 이어서 다시 요청한다.
+    첫 응답이 형식 검증에 실패하면 ValueError, 이어 쓰기가 실패하면 그때까지 만든 차시만 반환한다.
+    """
+    lesson_plans = list(lesson_plans or [])[:total_hours]
+    requests = -(-total_hours // LESSONS_PER_REQUEST) + MAX_LESSON_CONTINUATIONS
+    for _ in range(requests):
+        if len(lesson_plans) >= total_hours:
+            break
+        end = min(total_hours, len(lesson_plans) + LESSONS_PER_REQUEST)
+        try:
+            new_lessons, info = router.complete(
+                "lesson_plans",
+                build_lesson_plan_prompt(total_hours, data, previous=lesson_plans, end=end),
+                system_prompt=SYSTEM_PROMPT,
+                temperature=0.5,
+                max_tokens=lesson_max_tokens(end - len(lesson_plans)),
+                validate=parse_lesson_plans,
+                on_truncated=salvage_lesson_plans,
+                details=True
+            )
+        except ValueError:
+            if not lesson_plans:
+                raise
+            break
+        _observe_tokens_per_lesson(info["output_tokens"], len(new_lessons))
+        # 이미 작성한 차시를 다시 보낸 것(주제·내용이 같음)만 건너뛰고, 차시 번호는 모델이 매긴 값 대신 위치로 다시 매긴다
+        seen = {_lesson_key(lp) for lp in lesson_plans}
+        accepted = []
+        for lp in new_lessons:
+            if _lesson_key(lp) not in seen:
+                seen.add(_lesson_key(lp))
+                accepted.append(dict(lp, lesson_number=str(len(lesson_plans) + len(accepted) + 1)))
+        if not accepted:
+            break
+        lesson_plans.extend(accepted[:total_hours - len(lesson_plans)])
+        if on_progress:
+            on_progress(lesson_plans)
+    return lesson_plans
+
+
+# 학년별 계획 모드에서 학년마다 따로 만드는 결과와 그 검토/Excel 항목 (기본정보·내용체계는 모든 학년이 공유)
+VARIANT_FIELDS = ("standards", "teaching_methods_text", "assessment_plan", "lesson_plans")
+GRADE_SHEETS = ["성취기준", "교수학습 및 평가", "차시별계획"]
+
+
+def variant_plans(data):
+    """학년별 계획이 있으면 {학년: 그 학년 기준 계획 dict}, 없으면 빈 dict
+
+    지금 편집 중인 학년(variant_grade)은 data 의 성취기준·평가·차시 값이 최신이므로 그것을 쓴다.
+    """
+    variants = data.get("variants") or {}
+    shared = {key: value for key, value in data.items() if key not in ("variants", "variant_grade")}
+    plans = {}
+    for grade in data.get("grades", []):
+        if grade == data.get("variant_grade"):
+            plans[grade] = dict(shared, grades=[grade])
+        elif grade in variants:
+            plans[grade] = dict(shared, grades=[grade], **variants[grade])
+    return plans
+
+
+def create_excel_bytes(data, selected_sheets):
+    """선택한 항목의 시트만 담은 계획서 Excel 파일 (bytes)
+
+    학년별 계획이면 기본정보·내용체계는 한 번, 성취기준·교수학습및평가·차시별계획은 학년마다 "성취기준(3학년)"처럼 따로 넣는다.
+    """
+    import pandas as pd
+
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        workbook = writer.book
+        header_format = workbook.add_format({
+            'bold': True,
+            'bg_color': '#E2E8F0',
+            'border': 1,
+            'text_wrap': True,
+            'align': 'center',
+            'valign': 'vcenter'
+        })
+        content_format = workbook.add_format({
+            'text_wrap': True,
+            'valign': 'top',
+            'border': 1
+        })
+
+        variants = variant_plans(data)
+        if variants:
+            _write_plan_sheets(writer, content_format, data, [s for s in selected_sheets if s not in GRADE_SHEETS])
+            for grade, grade_data in variants.items():
+                grade_sheets = [s for s in selected_sheets if s in GRADE_SHEETS]
+                _write_plan_sheets(writer, content_format, grade_data, grade_sheets, suffix=f"({grade})")
+        else:
+            _write_plan_sheets(writer, content_format, data, selected_sheets)
+
+        for sheet in writer.sheets.values():
+            sheet.set_default_row(30)
+            sheet.set_row(0, 40)
+
+    return output.getvalue()
+
+
+def _write_plan_sheets(writer, content_format, data, selected_sheets, suffix=""):
+    """선택한 항목의 시트를 writer 에 쓴다 (suffix 는 학년별 시트 이름 뒤에 붙는 '(3학년)' 등)"""
+    import pandas as pd
+
+    if "기본정보" in selected_sheets:
+        basic_info = pd.DataFrame([{
+            '학교급': data.get('school_type', ''),
+            '대상학년': ', '.join(data.get('grades', [])),
+            '총차시': data.get('total_hours', ''),
+            '운영 학기': ', '.join(data.get('semester', [])),
+            '연계 교과': ', '.join(data.get('subjects', [])),
+            '활동명': data.get('activity_name', ''),
+            '요구사항': data.get('requirements', ''),
+            '필요성': data.get('necessity', ''),
+            '개요': data.get('overview', '')
+        }])
+        basic_info.T.to_excel(writer, sheet_name=f'기본정보{suffix}', header=['내용'])
+        worksheet = writer.sheets[f'기본정보{suffix}']
+        for idx, col in enumerate(basic_info.T.index, 1):
+            worksheet.set_column(idx, idx, 30, content_format)
+
+    if "내용체계" in selected_sheets:
+        content_sets = data.get("content_sets", [])
+        if not content_sets:
+            df_empty = pd.DataFrame([{"구분": "내용체계 없음", "내용": ""}])
+            df_empty.to_excel(writer, sheet_name=f'내용체계{suffix}', index=False)
+            worksheet = writer.sheets[f'내용체계{suffix}']
+            worksheet.set_column('A:A', 20, content_format)
+            worksheet.set_column('B:B', 80, content_format)
+        else:
+            rows = []
+            for idx, cset in enumerate(content_sets, start=1):
+                domain = cset.get("domain", "")
+                key_ideas = cset.get("key_ideas", [])
+                ce = cset.get("content_elements", {})
+
+                rows.append({
+                    "구분": f"영역명 (세트{idx})",
+                    "내용": domain
+                })
+
+                for idea in key_ideas:
+                    rows.append({
+                        "구분": f"핵심 아이디어 (세트{idx})",
+                        "내용": idea
+                    })
+
+                for item in ce.get("knowledge_and_understanding", []):
+                    rows.append({
+                        "구분": f"지식·이해 (세트{idx})",
+                        "내용": item
+                    })
+
+                for item in ce.get("process_and_skills", []):
+                    rows.append({
+                        "구분": f"과정·기능 (세트{idx})",
+                        "내용": item
+                    })
+
+                for item in ce.get("values_and_attitudes", []):
+                    rows.append({
+                        "구분": f"가치·태도 (세트{idx})",
+                        "내용": item
+                    })
+
+            df_goals = pd.DataFrame(rows)
+            df_goals.to_excel(writer, sheet_name=f'내용체계{suffix}', index=False)
+            worksheet = writer.sheets[f'내용체계{suffix}']
+            worksheet.set_column('A:A', 25, content_format)
+            worksheet.set_column('B:B', 80, content_format)
+
+    if "성취기준" in selected_sheets:
+        standards_data = []
+        for std in data.get('standards', []):
+            for level in std['levels']:
+                label_map = {"A": "상", "B": "중", "C": "하"}
+                label = label_map.get(level['level'], level['level'])
+                standards_data.append({
+                    '성취기준코드': std['code'],
+                    '성취기준설명': std['description'],
+                    '수준': label,
+                    '수준별설명': level['description']
+                })
+        df_std = pd.DataFrame(standards_data)
+        df_std.to_excel(writer, sheet_name=f'성취기준{suffix}', index=False)
+        worksheet = writer.sheets[f'성취기준{suffix}']
+        worksheet.set_column('A:A', 15, content_format)
+        worksheet.set_column('B:B', 50, content_format)
+        worksheet.set_column('C:C', 10, content_format)
+        worksheet.set_column('D:D', 60, content_format)
+
+    if "교수학습 및 평가" in selected_sheets:
+        sheet_rows = []
+        methods_text = data.get("teaching_methods_text", "").strip()
+        if methods_text:
+            lines = methods_text.split('\n')
+            for line in lines:
+                if line.strip():
+                    sheet_rows.append({
+                        "유형": "교수학습방법",
+                        "코드": "",
+                        "성취기준": "",
+                        "평가요소": "",
+                        "수업평가방법": line.strip(),
+                        "상기준": "",
+                        "중기준": "",
+                        "하기준": ""
+                    })
+
+        for ap in data.get('assessment_plan', []):
+            sheet_rows.append({
+                "유형": "평가계획",
+                "코드": ap.get("code",""),
+                "성취기준": ap.get("description",""),
+                "평가요소": ap.get("element",""),
+                "수업평가방법": ap.get("method",""),
+                "상기준": ap.get("criteria_high",""),
+                "중기준": ap.get("criteria_mid",""),
+                "하기준": ap.get("criteria_low","")
+            })
+
+        df_methods = pd.DataFrame(sheet_rows)
+        df_methods.to_excel(writer, sheet_name=f'교수학습및평가{suffix}', index=False)
+        worksheet = writer.sheets[f'교수학습및평가{suffix}']
+        worksheet.set_column('A:A', 14, content_format)
+        worksheet.set_column('B:B', 14, content_format)
+        worksheet.set_column('C:C', 30, content_format)
+        worksheet.set_column('D:D', 30, content_format)
+        worksheet.set_column('E:E', 30, content_format)
+        worksheet.set_column('F:F', 30, content_format)
+        worksheet.set_column('G:G', 30, content_format)
+        worksheet.set_column('H:H', 30, content_format)
+
+    if "차시별계획" in selected_sheets:
+        df_lessons = pd.DataFrame(data.get('lesson_plans', []))
+        if not df_lessons.empty:
+            df_lessons.columns = ['차시', '학습주제', '학습내용', '교수학습자료']
+            df_lessons.to_excel(writer, sheet_name=f'차시별계획{suffix}', index=False)
+            worksheet = writer.sheets[f'차시별계획{suffix}']
+            worksheet.set_column('A:A', 10, content_format)
+            worksheet.set_column('B:B', 30, content_format)
+            worksheet.set_column('C:C', 80, content_format)
+            worksheet.set_column('D:D', 50, content_format)
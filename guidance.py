@@ -0,0 +1,75 @@
+import os
+
+import bm25
+import docstore
+from docstore import DEFAULT_COMPACT_PATH, DEFAULT_PICKLE_PATH, count_tokens
+from vectorstore import DEFAULT_VECTOR_DIR, QuantizedVectorStore, embed_texts
+
+
+# 3~5단계(내용체계, 성취기준, 평가)에 필요한 자료가 잘 걸리도록 질의에 덧붙이는 말
+GUIDANCE_QUERY_TERMS = "내용 체계 성취기준 코드 평가 기준 교수·학습 방법"
+
+
+class GuidanceRetriever:
+    """학교자율시간 도움자료 검색 (BM25, 임베딩이 있으면 벡터 검색과 RRF 결합)"""
+
+    def __init__(self, docstore_path=DEFAULT_COMPACT_PATH, bm25_path=bm25.DEFAULT_BM25_PATH,
+                 vector_dir=DEFAULT_VECTOR_DIR, api_key=None, pickle_path=DEFAULT_PICKLE_PATH):
+        self.store = docstore.load_or_build(docstore_path, pickle_path)
+        self.lexical = bm25.load_or_build(bm25_path, docstore_path)
+        self.vectors = None
+        self.api_key = api_key
+        if api_key and os.path.exists(os.path.join(vector_dir, "meta.json")):
+            vectors = QuantizedVectorStore(vector_dir)
+            # 크기가 같게 다시 만든 docstore 에 예전 벡터가 붙지 않도록 내용 해시까지 확인
+            if len(vectors) == len(self.store) and vectors.meta.get("source_hash") == self.lexical.source_hash:
+                self.vectors = vectors
+
+    def search(self, query, k=5):
+        """상위 k개 문서 번호 목록"""
+        rankings = [self.lexical.search(query, k=k * 2)]
+        if self.vectors is not None:
+            try:
+                embedding = embed_texts([query], self.api_key, model=self.vectors.meta.get("model"))
+                rankings.append(self.vectors.search(embedding, k=k * 2)[0])
+            except Exception:
+                pass
+        return [doc_id for doc_id, _ in bm25.reciprocal_rank_fusion(rankings, k=k)]
+
+    def retrieve(self, activity_name, grades, subjects, k=6, max_tokens=1200):
+        """활동명/학년/교과에 맞는 도움자료 문단을 토큰 예산 안에서 반환"""
+        query = " ".join([activity_name or "", " ".join(grades), " ".join(subjects), GUIDANCE_QUERY_TERMS])
+        passages = [self.store.get_text(doc_id) for doc_id in self.search(query, k=k)]
+        return fit_to_budget(passages, max_tokens)
+
+
+def fit_to_budget(passages, max_tokens):
+    """순위대로 문단을 담고, 예산을 넘는 마지막 문단은 잘라서 넣는다"""
+    selected = []
+    used = 0
+    for passage in passages:
+        tokens = count_tokens(passage)
+        if used + tokens <= max_tokens:
+            selected.append(passage)
+            used += tokens
+            continue
+        remaining = max_tokens - used
+        if remaining > 50:
+            # 글자 수 대비 토큰 비율로 남은 예산만큼 자른다
+            cut = int(len(passage) * remaining / tokens)
+            selected.append(passage[:cut].rstrip() + " …")
+        break
+    return selected
+
+
+def format_guidance(passages):
+    """프롬프트에 넣을 참고 자료 블록"""
+    if not passages:
+        return ""
+    body = "\n\n".join(f"({i}) {p}" for i, p in enumerate(passages, 1))
+    return f"""
+
+[참고 자료: 학교자율시간 도움자료 발췌]
+아래 자료의 성취기준 코드 형식, 진술 방식, 평가 기준 작성 방식을 따르세요.
+{body}
+"""
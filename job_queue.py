@@ -0,0 +1,364 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_QUEUE_PATH = os.path.join(os.environ.get("APP_DATA_DIR", os.path.join(BASE_DIR, ".app_data")), "jobs.sqlite3")
+
+
+class NoWorkerError(TimeoutError):
+    """정해진 시간 안에 작업을 가져간 작업자가 없음 (작업은 취소됨)"""
+
+
+class JobTimeoutError(TimeoutError):
+    """제한 시간 안에 작업이 끝나지 않음 (작업은 취소되어 늦게 나온 결과는 버려짐)"""
+
+
+class JobCancelled(Exception):
+    """기다리던 쪽이 취소한 작업 (작업자가 다음 LLM 호출 전에 멈춘다)"""
+
+
+class JobError(Exception):
+    """작업자 프로세스에서 난 오류 (원래 예외 종류 이름을 함께 전달)"""
+
+    def __init__(self, error_type, message):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+class JobQueue:
+    """SQLite 파일 기반 작업 큐 (여러 Streamlit/작업자 프로세스가 같은 파일을 공유)
+
+    작업은 queued → running → done/failed/cancelled 로 바뀌고, 결과는 작업을 넣은 세션이 번호로 찾아간다.
+    작업자는 실행 중인 작업의 heartbeat_at 을 주기적으로 갱신하고, stale_after 초 동안 갱신이 없는
+    running 작업(작업자가 죽음)만 다시 queued 로 돌린다. 오래 걸리는 작업이 두 번 실행되지 않는다.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, stale_after=120):
+        self.path = path
+        self.stale_after = stale_after
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    session_id TEXT,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    worker TEXT,
+                    result BLOB,
+                    result_type TEXT,
+                    error_type TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    heartbeat_at REAL,
+                    finished_at REAL
+                )
+            """)
+            # 예전 파일에는 heartbeat_at 이 없다
+            if "heartbeat_at" not in [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    @contextmanager
+    def _connect(self):
+        """with 블록이 끝나면 닫히는 연결 (sqlite3.Connection 의 with 는 commit 만 하고 닫지 않는다)"""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA busy_timeout=30000")
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, kind, payload, session_id=None):
+        """작업 번호 반환"""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO jobs (kind, payload, session_id, created_at) VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(payload, ensure_ascii=False), session_id, time.time()),
+            )
+            return cur.lastrowid
+
+    def claim(self, worker):
+        """가장 오래된 대기 작업 하나를 가져온다: (번호, 종류, payload) 또는 None"""
+        with self._connect() as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT id, kind, payload FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute("UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ? WHERE id = ?",
+                             (worker, time.time(), time.time(), row[0]))
+                conn.execute("COMMIT")
+                return row[0], row[1], json.loads(row[2])
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def heartbeat(self, job_id, worker):
+        """실행 중임을 알림. 작업이 취소되었거나 다른 작업자에게 넘어갔으면 False"""
+        with self._connect() as conn:
+            cur = conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running' AND worker = ?",
+                               (time.time(), job_id, worker))
+            return cur.rowcount > 0
+
+    def complete(self, job_id, result):
+        if isinstance(result, bytes):
+            blob, result_type = result, "bytes"
+        else:
+            blob, result_type = json.dumps(result, ensure_ascii=False).encode("utf-8"), "json"
+        with self._connect() as conn:
+            # 취소된 작업의 결과는 기다리는 쪽이 없으므로 남기지 않는다
+            conn.execute("UPDATE jobs SET status = 'done', result = ?, result_type = ?, finished_at = ? "
+                         "WHERE id = ? AND status = 'running'",
+                         (blob, result_type, time.time(), job_id))
+
+    def fail(self, job_id, error):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = 'failed', error_type = ?, error = ?, finished_at = ? "
+                         "WHERE id = ? AND status = 'running'",
+                         (type(error).__name__, str(error), time.time(), job_id))
+
+    def cancel(self, job_id):
+        """아직 시작하지 않은 작업을 취소. 취소했으면 True"""
+        with self._connect() as conn:
+            cur = conn.execute("DELETE FROM jobs WHERE id = ? AND status = 'queued'", (job_id,))
+            return cur.rowcount > 0
+
+    def abandon(self, job_id):
+        """기다리기를 그만둔 작업 정리: 대기 중이면 지우고, 실행 중이면 cancelled 로 표시"""
+        if self.cancel(job_id):
+            return
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'running'",
+                         (time.time(), job_id))
+            conn.execute("DELETE FROM jobs WHERE id = ? AND status IN ('done', 'failed')", (job_id,))
+
+    def status(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def result(self, job_id):
+        """끝난 작업의 결과를 꺼내고 행을 지운다. 실패한 작업은 JobError, 아직이거나 취소된 작업이면 None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT status, result, result_type, error_type, error FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None or row[0] in ("queued", "running", "cancelled"):
+                return None
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        status, blob, result_type, error_type, error = row
+        if status == "failed":
+            raise JobError(error_type, error)
+        return bytes(blob) if result_type == "bytes" else json.loads(blob)
+
+    def wait(self, job_id, timeout=300, claim_timeout=None, poll=0.1):
+        """작업이 끝날 때까지 기다려 결과를 반환
+
+        claim_timeout 초 안에 아무 작업자도 가져가지 않으면 작업을 취소하고 NoWorkerError 를,
+        timeout 초 안에 끝나지 않으면 작업을 취소하고 JobTimeoutError 를 낸다.
+        """
+        start = time.monotonic()
+        while True:
+            status = self.status(job_id)
+            if status is None:
+                raise KeyError(job_id)
+            if status in ("done", "failed"):
+                return self.result(job_id)
+            elapsed = time.monotonic() - start
+            if status == "queued" and claim_timeout is not None and elapsed > claim_timeout:
+                if self.cancel(job_id):
+                    raise NoWorkerError(f"작업 {job_id}을(를) 가져간 작업자가 없습니다.")
+            if elapsed > timeout:
+                self.abandon(job_id)
+                raise JobTimeoutError(f"작업 {job_id}이(가) {timeout}초 안에 끝나지 않아 취소했습니다.")
+            time.sleep(poll)
+
+    def requeue_stale(self):
+        """stale_after 초 동안 heartbeat 가 없는 running 작업(작업자 종료 등)을 다시 대기열로"""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, started_at = NULL, heartbeat_at = NULL "
+                "WHERE status = 'running' AND COALESCE(heartbeat_at, started_at) < ?",
+                (time.time() - self.stale_after,),
+            )
+            return cur.rowcount
+
+    def purge(self, older_than=3600):
+        """가져가지 않은 오래된 결과 정리"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < ?",
+                         (time.time() - older_than,))
+
+    def counts(self):
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+_routers = {}
+
+
+def _get_router(data_dir):
+    """작업자 프로세스의 모델 라우터 (앱과 같은 설정, 사용량은 같은 로그 파일에 기록)"""
+    if data_dir not in _routers:
+        from llm import ModelRouter, load_model_config
+        tiers, routes = load_model_config()
+        _routers[data_dir] = ModelRouter(tiers, routes, usage_path=os.path.join(data_dir, "llm_usage.jsonl"))
+    return _routers[data_dir]
+
+
+def _check_cancelled(cancelled):
+    if cancelled is not None and cancelled.is_set():
+        raise JobCancelled("취소된 작업입니다.")
+
+
+def run_job(kind, payload, router, cancelled=None):
+    """작업 하나 실행 (작업자 프로세스와, 큐를 쓰지 않을 때의 앱이 함께 사용)
+
+    cancelled(threading.Event)가 설정되면 다음 LLM 호출 전에 JobCancelled 를 낸다.
+    """
+    import generation
+
+    if kind == "step":
+        return generation.generate_step(router, payload["step"], payload["data"], payload.get("guidance", ""))
+    if kind == "lesson_plans":
+        # checkpoint 가 있으면 저장된 차시부터 이어서 만들고, 묶음이 끝날 때마다 저장
+        total_hours, checkpoint = payload["total_hours"], payload.get("checkpoint")
+        if not checkpoint:
+            return generation.generate_lesson_plans(router, total_hours, payload["data"],
+                                                    on_progress=lambda lesson_plans: _check_cancelled(cancelled))
+        from lesson_checkpoints import LessonCheckpoints
+        store, key = LessonCheckpoints(checkpoint["path"]), checkpoint["key"]
+
+        def save(lesson_plans):
+            # 취소되어도 만든 차시는 저장해 두어 다시 생성할 때 이어서 쓴다
+            store.save(key, total_hours, lesson_plans)
+            _check_cancelled(cancelled)
+
+        return generation.generate_lesson_plans(
+            router, total_hours, payload["data"], lesson_plans=store.load(key), on_progress=save)
+    if kind == "grade_variant":
+        # 학년별 계획 하나: 이 학년 기준으로 성취기준 → 교수학습 및 평가 → 차시별 계획을 차례로 생성
+        data, guidance = dict(payload["data"]), payload.get("guidance", "")
+        data["standards"] = generation.generate_step(router, 4, data, guidance)
+        _check_cancelled(cancelled)
+        data.update(generation.generate_step(router, 5, data, guidance))
+        _check_cancelled(cancelled)
+        lessons = {"total_hours": data["total_hours"], "data": data}
+        if payload.get("checkpoint_path"):
+            lessons["checkpoint"] = {"path": payload["checkpoint_path"],
+                                     "key": generation.lesson_plan_key(data["total_hours"], data,
+                                                                       payload.get("checkpoint_owner", ""))}
+        data["lesson_plans"] = run_job("lesson_plans", lessons, router, cancelled)
+        return {key: data.get(key) for key in generation.VARIANT_FIELDS}
+    if kind == "excel":
+        return generation.create_excel_bytes(payload["data"], payload["sheets"])
+    raise ValueError(f"알 수 없는 작업 종류: {kind}")
+
+
+@contextmanager
+def _heartbeat(queue, job_id, worker, interval):
+    """작업을 실행하는 동안 interval 초마다 heartbeat 를 갱신하는 스레드
+
+    작업이 취소되었거나 다른 작업자에게 넘어갔으면 내주는 Event 를 설정한다 (run_job 의 cancelled).
+    """
+    stop = threading.Event()
+    cancelled = threading.Event()
+
+    def beat():
+        while not stop.wait(interval):
+            try:
+                if not queue.heartbeat(job_id, worker):
+                    cancelled.set()
+                    return
+            except sqlite3.Error:
+                pass
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield cancelled
+    finally:
+        stop.set()
+        thread.join()
+
+
+def worker_loop(path=DEFAULT_QUEUE_PATH, idle_sleep=0.2, max_jobs=None, heartbeat_interval=15):
+    """큐에서 작업을 하나씩 가져와 실행 (프로세스 하나가 한 번에 한 작업)"""
+    queue = JobQueue(path)
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    done = 0
+    last_maintenance = 0.0
+    while max_jobs is None or done < max_jobs:
+        if time.monotonic() - last_maintenance > 30:
+            queue.requeue_stale()
+            queue.purge()
+            last_maintenance = time.monotonic()
+        job = queue.claim(name)
+        if job is None:
+            time.sleep(idle_sleep)
+            continue
+        job_id, kind, payload = job
+        try:
+            with _heartbeat(queue, job_id, name, heartbeat_interval) as cancelled:
+                result = run_job(kind, payload, _get_router(os.path.dirname(path)), cancelled)
+            queue.complete(job_id, result)
+        except JobCancelled:
+            print(f"작업 {job_id} 취소됨", flush=True)
+        except Exception as e:
+            traceback.print_exc()
+            queue.fail(job_id, e)
+        done += 1
+
+
+def start_workers(n, path=DEFAULT_QUEUE_PATH):
+    """작업자 프로세스 n 개 시작 (데몬 프로세스 목록 반환)"""
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for _ in range(n):
+        process = context.Process(target=worker_loop, args=(path,), daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="생성/내보내기 작업자")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("worker", help="큐의 작업을 처리하는 작업자 프로세스 실행")
+    p.add_argument("-n", "--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--queue", default=DEFAULT_QUEUE_PATH)
+    p.add_argument("--exit-with-parent", action="store_true", help="실행한 프로세스(앱)가 끝나면 함께 종료")
+
+    p = sub.add_parser("status", help="상태별 작업 수")
+    p.add_argument("--queue", default=DEFAULT_QUEUE_PATH)
+
+    args = parser.parse_args()
+    if args.command == "worker":
+        processes = start_workers(args.workers, args.queue)
+        print(f"작업자 {len(processes)}개 실행 중 (큐: {args.queue})", flush=True)
+        parent = os.getppid()
+        while any(process.is_alive() for process in processes):
+            if args.exit_with_parent and os.getppid() != parent:
+                break
+            time.sleep(1)
+    elif args.command == "status":
+        print(JobQueue(args.queue).counts())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+
+class LessonCheckpoints:
+    """6단계 차시 생성 중간 결과 (SQLite 파일에 저장하여 rerun·재접속·작업자 프로세스 간 공유)
+
+    키는 세션별 값과 생성 요청 내용(프롬프트)의 해시(generation.lesson_plan_key)이므로, 같은 세션에서 같은 입력으로
+    다시 생성하면 마지막으로 저장된 차시 다음부터 이어서 만들고 다른 세션의 기록은 보이지 않는다.
+    max_age 초가 지난 기록은 버린다.
+    """
+
+    def __init__(self, path, max_age=24 * 3600):
+        self.path = path
+        self.max_age = max_age
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lesson_checkpoints (
+                    key TEXT PRIMARY KEY,
+                    total_hours INTEGER NOT NULL,
+                    lessons TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("DELETE FROM lesson_checkpoints WHERE updated_at < ?", (time.time() - max_age,))
+
+    @contextmanager
+    def _connect(self):
+        """with 블록이 끝나면 commit 하고 닫히는 연결 (sqlite3.Connection 의 with 는 닫지 않는다)"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def load(self, key):
+        """저장된 차시 목록 (없으면 빈 리스트)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT lessons FROM lesson_checkpoints WHERE key = ? AND updated_at >= ?",
+                (key, time.time() - self.max_age),
+            ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def save(self, key, total_hours, lessons):
+        """지금까지 만든 차시 전체를 저장 (이미 더 많이 저장돼 있으면 그대로 둔다)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT lessons FROM lesson_checkpoints WHERE key = ?", (key,)).fetchone()
+            if row and len(json.loads(row[0])) > len(lessons):
+                return
+            conn.execute(
+                "INSERT OR REPLACE INTO lesson_checkpoints (key, total_hours, lessons, updated_at) VALUES (?, ?, ?, ?)",
+                (key, total_hours, json.dumps(lessons, ensure_ascii=False), time.time()),
+            )
+
+    def clear(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM lesson_checkpoints WHERE key = ?", (key,))
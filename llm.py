@@ -0,0 +1,377 @@
+import argparse
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+import streamlit as st
+
+
+DEFAULT_MODEL = "gpt-4o"
+
+# 모델 등급: 빠르고 저렴한 모델과 품질이 높은 모델
+DEFAULT_TIERS = {
+    "fast": "gpt-4o-mini",
+    "strong": "gpt-4o",
+}
+
+# 호출 경로별 기본 등급 (짧은 출력과 챗봇은 fast, 긴 구조화 출력은 strong)
+DEFAULT_ROUTES = {
+    "step1": "fast",
+    "step3": "strong",
+    "step4": "strong",
+    "step5": "strong",
+    "lesson_plans": "strong",
+    "chat": "fast",
+    "chat_summary": "fast",
+}
+
+# 100만 토큰당 달러 (입력, 출력)
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# langchain 은 불러오는 데 1초 이상 걸리므로 첫 LLM 호출 때 불러온다
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_api_key():
+    """OpenAI API 키 (없으면 빈 문자열). secrets 는 처음 필요할 때 읽는다"""
+    try:
+        return st.secrets["openai"]["api_key"] or ""
+    except Exception:
+        return ""
+
+
+def get_chat_model(model=DEFAULT_MODEL, temperature=0.7, max_tokens=2000):
+    """같은 설정의 ChatOpenAI 객체는 프로세스 안에서 재사용"""
+    key = (model, temperature, max_tokens)
+    with _clients_lock:
+        chat = _clients.get(key)
+        if chat is None:
+            from langchain_openai import ChatOpenAI
+            chat = ChatOpenAI(
+                openai_api_key=get_api_key(),
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            _clients[key] = chat
+    return chat
+
+
+_traffic = None
+_traffic_loaded = False
+
+
+def _get_traffic():
+    """APP_LLM_MODE 에 따른 요청 기록기/재생기 (프로세스당 한 번 만든다, 꺼져 있으면 None)"""
+    global _traffic, _traffic_loaded
+    if not _traffic_loaded:
+        with _clients_lock:
+            if not _traffic_loaded:
+                from llm_replay import traffic_from_env
+                _traffic = traffic_from_env()
+                _traffic_loaded = True
+    return _traffic
+
+
+def traffic_mode():
+    """"record", "replay"(기록 재생 또는 가짜 응답) 또는 None"""
+    traffic = _get_traffic()
+    if traffic is None:
+        return None
+    return "replay" if hasattr(traffic, "replay") else "record"
+
+
+def _invoke(prompt, system_prompt, model, temperature, max_tokens, route=None):
+    """답변 메시지 객체 반환 (토큰 사용량 확인용). 기록/재생 모드면 요청을 남기거나 기록된 응답을 돌려준다"""
+    traffic = _get_traffic()
+    if traffic is not None and hasattr(traffic, "replay"):
+        return traffic.replay(prompt, system_prompt, model, temperature, max_tokens, route=route)
+
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    messages = []
+    if system_prompt:
+        messages.append(SystemMessage(content=system_prompt))
+    messages.append(HumanMessage(content=prompt))
+    start = time.perf_counter()
+    response = get_chat_model(model, temperature, max_tokens)(messages)
+    if traffic is not None:
+        traffic.record(route, prompt, system_prompt, model, temperature, max_tokens, response,
+                       (time.perf_counter() - start) * 1000)
+    return response
+
+
+def chat_completion(prompt, system_prompt=None, model=DEFAULT_MODEL, temperature=0.7, max_tokens=2000):
+    """시스템 프롬프트와 사용자 프롬프트 하나로 답변 텍스트를 받는다"""
+    return _invoke(prompt, system_prompt, model, temperature, max_tokens).content.strip()
+
+
+def estimate_cost(model, input_tokens, output_tokens):
+    price_in, price_out = MODEL_PRICES.get(model, MODEL_PRICES[DEFAULT_MODEL])
+    return (input_tokens * price_in + output_tokens * price_out) / 1e6
+
+
+def _token_usage(response, prompt, system_prompt, text):
+    """응답의 토큰 사용량 (API 가 알려주지 않으면 글자 수 기준으로 추정)"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is not None:
+        return usage["input_tokens"], usage.get("output_tokens", 0)
+    from docstore import count_tokens
+    return count_tokens((system_prompt or "") + prompt), count_tokens(text)
+
+
+def _finish_reason(response):
+    """응답이 끝난 이유 ("stop", max_tokens 에 걸려 잘린 경우 "length")"""
+    metadata = getattr(response, "response_metadata", None) or {}
+    return metadata.get("finish_reason")
+
+
+def load_model_config():
+    """secrets 의 [models] 항목으로 등급별 모델과 경로별 등급을 바꿀 수 있다
+
+    [models]
+    fast = "gpt-4o-mini"
+    strong = "gpt-4o"
+    chat = "strong"
+    """
+    tiers, routes = dict(DEFAULT_TIERS), dict(DEFAULT_ROUTES)
+    try:
+        overrides = dict(st.secrets.get("models", {}))
+    except Exception:
+        overrides = {}
+    for key, value in overrides.items():
+        if key in tiers:
+            tiers[key] = value
+        else:
+            routes[key] = value
+    return tiers, routes
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.aborted = False  # 호출이 Exception 이 아닌 BaseException(중단, 종료 등)으로 끝남
+
+
+class SingleFlight:
+    """같은 키의 요청이 진행 중이면 새로 호출하지 않고 그 호출의 결과를 함께 받는다
+
+    진행 중인 요청만 묶으며, 끝난 결과는 남겨 두지 않는다 (영구 캐시는 AnswerCache 담당).
+    먼저 호출한 쪽이 중단되면(BaseException) 기다리던 요청이 다시 호출한다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, func):
+        """(결과, 다른 요청의 결과를 공유했는지 여부)"""
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+            if leader:
+                break
+            flight.done.wait()
+            if flight.aborted:
+                # 중단은 그 요청만의 사정이므로 전하지 않고 다시 시도 (그중 하나가 새로 호출)
+                continue
+            if flight.error is not None:
+                raise flight.error
+            # 호출한 쪽에서 결과를 고쳐 써도 서로 영향이 없도록 복사본을 준다
+            return copy.deepcopy(flight.result), True
+        try:
+            flight.result = func()
+            return flight.result, False
+        except Exception as e:
+            flight.error = e
+            raise
+        except BaseException:
+            flight.aborted = True
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+def request_key(*parts):
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ModelRouter:
+    """호출 경로별로 모델 등급을 골라 호출하고, 검증에 실패하면 strong 모델로 한 번 더 호출
+
+    validate(답변 텍스트) 는 검증된 값을 돌려주거나 ValueError 를 낸다.
+    max_tokens 에 걸려 잘린 답변은 on_truncated(답변 텍스트)가 있으면 validate 대신 그것으로 처리한다.
+    호출마다 경로, 모델, 지연 시간, 토큰 수, 비용, 상위 모델 재호출 여부, 잘림 여부를 usage_path(JSON Lines)에 남긴다.
+    같은 경로·프롬프트·설정의 요청이 동시에 들어오면 한 번만 호출하고 결과를 나눠 준다.
+    """
+
+    def __init__(self, tiers=None, routes=None, usage_path=None):
+        self.tiers = dict(tiers or DEFAULT_TIERS)
+        self.routes = dict(routes or DEFAULT_ROUTES)
+        self.usage_path = usage_path
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self._stats = defaultdict(lambda: {"calls": 0, "escalations": 0, "failures": 0, "coalesced": 0,
+                                           "ms": 0.0, "cost": 0.0})
+        if usage_path:
+            os.makedirs(os.path.dirname(usage_path) or ".", exist_ok=True)
+
+    def model_for(self, route, tier=None):
+        tier = tier or self.routes.get(route, "strong")
+        return self.tiers.get(tier, self.tiers["strong"])
+
+    def complete(self, route, prompt, system_prompt=None, temperature=0.7, max_tokens=2000, validate=None,
+                 accept_last=False, on_truncated=None, details=False):
+        """검증을 통과한 값(validate 가 없으면 답변 텍스트)을 반환
+
+        accept_last=True 이면 strong 모델 답변이 검증(품질 확인)에 실패해도 예외 대신 그 텍스트를 반환한다.
+        details=True 이면 (값, {"model", "finish_reason", "output_tokens"}) 를 반환한다.
+        """
+        key = request_key(route, prompt, system_prompt, temperature, max_tokens, accept_last, on_truncated is not None)
+        (result, info), shared = self._flights.do(key, lambda: self._complete(
+            route, prompt, system_prompt, temperature, max_tokens, validate, accept_last, on_truncated))
+        if shared:
+            self._record_coalesced(route)
+        return (result, info) if details else result
+
+    def _complete(self, route, prompt, system_prompt, temperature, max_tokens, validate, accept_last, on_truncated):
+        models = [self.model_for(route)]
+        if models[0] != self.tiers["strong"]:
+            models.append(self.tiers["strong"])
+
+        request_ms = 0.0
+        for attempt, model in enumerate(models):
+            start = time.perf_counter()
+            response = _invoke(prompt, system_prompt, model, temperature, max_tokens, route)
+            ms = (time.perf_counter() - start) * 1000
+            request_ms += ms
+            text = response.content.strip()
+            input_tokens, output_tokens = _token_usage(response, prompt, system_prompt, text)
+            finish_reason = _finish_reason(response)
+            truncated = finish_reason == "length"
+            check = on_truncated if truncated and on_truncated else validate
+            error = None
+            try:
+                result = check(text) if check else text
+            except ValueError as e:
+                error = e
+            last = attempt == len(models) - 1
+            self._record(route, model, attempt, ms, request_ms, input_tokens, output_tokens,
+                         ok=error is None, escalating=error is not None and not last, truncated=truncated)
+            info = {"model": model, "finish_reason": finish_reason, "output_tokens": output_tokens}
+            if error is None:
+                return result, info
+            if last:
+                if accept_last:
+                    return text, info
+                raise error
+
+    def _record(self, route, model, attempt, ms, request_ms, input_tokens, output_tokens, ok, escalating,
+                truncated=False):
+        cost = estimate_cost(model, input_tokens, output_tokens)
+        with self._lock:
+            stats = self._stats[route]
+            if attempt == 0:
+                stats["calls"] += 1
+            stats["escalations"] += int(escalating)
+            stats["failures"] += int(not ok and not escalating)
+            if not escalating:
+                stats["ms"] += request_ms
+            stats["cost"] += cost
+            if self.usage_path:
+                with open(self.usage_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({
+                        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "route": route,
+                        "model": model,
+                        "attempt": attempt,
+                        "ok": ok,
+                        "escalated": escalating,
+                        "truncated": truncated,
+                        "ms": round(ms, 1),
+                        # 첫 호출부터 이 호출까지 걸린 시간 (재호출이 끝난 행이 요청 전체 시간)
+                        "request_ms": round(request_ms, 1),
+                        "input_tokens": input_tokens,
+                        "output_tokens": output_tokens,
+                        "cost": round(cost, 6),
+                    }) + "\n")
+
+    def _record_coalesced(self, route):
+        with self._lock:
+            self._stats[route]["coalesced"] += 1
+            if self.usage_path:
+                with open(self.usage_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({
+                        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "route": route,
+                        "coalesced": True,
+                    }) + "\n")
+
+    def stats(self):
+        """이 프로세스에서의 경로별 호출 수, 상위 모델 재호출 비율, 공유된 요청 수, 평균 지연(ms), 누적 비용($)"""
+        with self._lock:
+            return {
+                route: {
+                    "calls": s["calls"],
+                    "escalation_rate": s["escalations"] / s["calls"] if s["calls"] else 0.0,
+                    "failures": s["failures"],
+                    "coalesced": s["coalesced"],
+                    "avg_ms": s["ms"] / s["calls"] if s["calls"] else 0.0,
+                    "cost": s["cost"],
+                }
+                for route, s in self._stats.items()
+            }
+
+
+def usage_report(path):
+    """usage 로그를 경로별로 집계해 출력"""
+    records = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                r = json.loads(line)
+                records[r["route"]].append(r)
+    print(f"{'경로':<14}{'호출':>6}{'재호출율':>10}{'실패':>6}{'잘림':>6}{'공유':>6}{'p50 ms':>9}{'p95 ms':>9}{'비용 $':>10}")
+    for route, rows in sorted(records.items()):
+        # 진행 중인 같은 요청의 결과를 받아 간 경우 (호출 없음)
+        coalesced = sum(1 for r in rows if r.get("coalesced"))
+        rows = [r for r in rows if not r.get("coalesced")]
+        calls = sum(1 for r in rows if r["attempt"] == 0)
+        escalations = sum(1 for r in rows if r["escalated"])
+        failures = sum(1 for r in rows if not r["ok"] and not r["escalated"])
+        truncations = sum(1 for r in rows if r.get("truncated"))
+        latencies = sorted(r["request_ms"] for r in rows if not r["escalated"])
+        p50 = latencies[len(latencies) // 2] if latencies else 0.0
+        p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] if latencies else 0.0
+        cost = sum(r["cost"] for r in rows)
+        rate = escalations / calls if calls else 0.0
+        print(f"{route:<14}{calls:>6}{rate:>10.1%}{failures:>6}{truncations:>6}{coalesced:>6}{p50:>9.0f}{p95:>9.0f}{cost:>10.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 호출 경로별 사용량 집계")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("report", help="경로별 지연 시간, 비용, 상위 모델 재호출 비율")
+    p.add_argument("--log", default=os.path.join(".app_data", "llm_usage.jsonl"))
+    args = parser.parse_args()
+    if args.command == "report":
+        usage_report(args.log)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import types
+from collections import defaultdict
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODE_ENV = "APP_LLM_MODE"
+ARCHIVE_ENV = "APP_LLM_ARCHIVE"
+# 재생·가짜 응답의 지연 시간에 곱하는 값 (0: 기다리지 않음, 1: 기록된/설정된 만큼 기다림)
+LATENCY_ENV = "APP_LLM_REPLAY_LATENCY"
+
+# 가짜 응답(stub)의 경로별 지연 시간: (중앙값 초, 로그정규 분포의 sigma)
+STUB_LATENCY = {
+    "step1": (3.0, 0.4),
+    "step3": (12.0, 0.35),
+    "step4": (10.0, 0.35),
+    "step5": (14.0, 0.35),
+    "lesson_plans": (25.0, 0.3),
+    "chat": (5.0, 0.5),
+    "chat_summary": (3.0, 0.4),
+}
+DEFAULT_ARCHIVE_PATH = os.path.join(os.environ.get("APP_DATA_DIR", os.path.join(BASE_DIR, ".app_data")), "llm_traffic.jsonl")
+
+
+class ReplayMiss(LookupError):
+    """재생 기록에 없는 요청"""
+
+
+def traffic_key(prompt, system_prompt, model, temperature):
+    """재생할 때 찾는 키. max_tokens 는 넣지 않는다 (6단계는 지금까지 관찰한 차시당 토큰 수로 정해져 실행마다 달라짐)"""
+    raw = json.dumps([prompt, system_prompt, model, temperature], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _system_hash(system_prompt):
+    return hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()[:12] if system_prompt else None
+
+
+class TrafficRecorder:
+    """LLM 요청과 응답, 지연 시간을 JSON Lines 로 기록
+
+    매번 같은 시스템 프롬프트는 {"system": 해시, "text": 내용} 줄로 한 번만 남기고 요청 줄에는 해시만 적는다.
+    여러 프로세스(작업자)가 같은 파일에 줄 단위로 덧붙인다.
+    """
+
+    def __init__(self, path=DEFAULT_ARCHIVE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._systems = set()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def record(self, route, prompt, system_prompt, model, temperature, max_tokens, response, ms):
+        usage = getattr(response, "usage_metadata", None) or {}
+        metadata = getattr(response, "response_metadata", None) or {}
+        system = _system_hash(system_prompt)
+        lines = []
+        with self._lock:
+            if system and system not in self._systems:
+                self._systems.add(system)
+                lines.append({"system": system, "text": system_prompt})
+            lines.append({
+                "key": traffic_key(prompt, system_prompt, model, temperature),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "route": route,
+                "model": model,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "system": system,
+                "prompt": prompt,
+                "response": response.content,
+                "finish_reason": metadata.get("finish_reason"),
+                "input_tokens": usage.get("input_tokens"),
+                "output_tokens": usage.get("output_tokens"),
+                "ms": round(ms, 1),
+            })
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines))
+
+
+def read_archive(path):
+    """(시스템 프롬프트 {해시: 내용}, 요청 기록 목록)"""
+    systems, records = {}, []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if "key" in row:
+                records.append(row)
+            else:
+                systems[row["system"]] = row["text"]
+    return systems, records
+
+
+class TrafficReplayer:
+    """기록한 응답을 같은 요청(프롬프트, 시스템 프롬프트, 모델, temperature)에 돌려준다
+
+    같은 요청이 여러 번 기록되어 있으면 기록된 순서대로 돌아가며 준다. latency 가 0 보다 크면
+    기록된 지연 시간 × latency 만큼 기다린 뒤 응답한다.
+    """
+
+    def __init__(self, path=DEFAULT_ARCHIVE_PATH, latency=0.0):
+        self.path = path
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._responses = defaultdict(list)
+        self._next = defaultdict(int)
+        self.misses = 0
+        systems, records = read_archive(path)
+        for row in records:
+            # 예전 기록의 key 에는 max_tokens 가 들어 있으므로 저장된 요청 내용으로 다시 계산한다
+            key = traffic_key(row["prompt"], systems.get(row.get("system")), row.get("model"), row.get("temperature"))
+            self._responses[key].append(row)
+
+    def __len__(self):
+        return sum(len(rows) for rows in self._responses.values())
+
+    def replay(self, prompt, system_prompt, model, temperature, max_tokens, route=None):
+        key = traffic_key(prompt, system_prompt, model, temperature)
+        with self._lock:
+            rows = self._responses.get(key)
+            if not rows:
+                self.misses += 1
+                raise ReplayMiss(f"재생 기록에 없는 요청입니다 (모델 {model}, 프롬프트 {prompt[:40]!r}...)")
+            row = rows[self._next[key] % len(rows)]
+            self._next[key] += 1
+        if self.latency > 0 and row.get("ms"):
+            time.sleep(row["ms"] / 1000 * self.latency)
+        usage = {}
+        if row.get("input_tokens") is not None:
+            usage = {"input_tokens": row["input_tokens"], "output_tokens": row.get("output_tokens") or 0}
+        return types.SimpleNamespace(
+            content=row["response"],
+            usage_metadata=usage,
+            response_metadata={"finish_reason": row.get("finish_reason")},
+        )
+
+
+def _stub_text(route, prompt):
+    """경로별 형식 검증을 통과하는 가짜 응답"""
+    if route == "step1":
+        return {"necessity": "학생들이 실생활 문제를 탐구하며 협력하는 경험이 필요하다. " * 3,
+                "overview": "체험과 탐구 중심으로 운영하는 학교자율시간 활동이다. " * 3}
+    if route == "step3":
+        return [{
+            "domain": f"영역 {i}",
+            "key_ideas": [f"핵심 아이디어 {i}-1", f"핵심 아이디어 {i}-2"],
+            "content_elements": {
+                "knowledge_and_understanding": [f"지식 {i}-1", f"지식 {i}-2"],
+                "process_and_skills": [f"과정 {i}-1", f"과정 {i}-2"],
+                "values_and_attitudes": [f"가치 {i}-1"],
+            },
+        } for i in range(1, 5)]
+    if route == "step4":
+        match = re.search(r"총 (\d+)개 내용체계", prompt)
+        return [{
+            "code": f"4과탐구-{i:02d}",
+            "description": f"성취기준 {i}: 주변 현상을 탐구하고 설명한다.",
+            "levels": [{"level": level, "description": f"{label} 수준 설명 {i}"}
+                       for level, label in (("A", "상"), ("B", "중"), ("C", "하"))],
+        } for i in range(1, int(match.group(1)) + 1 if match else 5)]
+    if route == "step5":
+        return {
+            "teaching_methods_text": "- 체험 중심으로 탐구하도록 지도한다.\n- 안전교육을 먼저 실시한다.",
+            "assessment_plan": [{
+                "code": f"4과탐구-{i:02d}", "description": f"성취기준 {i}: 주변 현상을 탐구하고 설명한다.",
+                "element": f"평가요소 {i} 탐구하기", "method": "[프로젝트] 관찰 평가",
+                "criteria_high": "정확하게 설명할 수 있다.", "criteria_mid": "설명할 수 있다.",
+                "criteria_low": "도움을 받아 설명할 수 있다.",
+            } for i in range(1, 5)],
+        }
+    if route == "lesson_plans":
+        match = re.search(r"\*\*(\d+)차시부터 (\d+)차시까지\*\*", prompt)
+        start, end = (int(match.group(1)), int(match.group(2))) if match else (1, 1)
+        return {"lesson_plans": [{
+            "lesson_number": str(i), "topic": f"{i}차시 탐험 이야기",
+            "content": f"{i}차시 주제를 조사하고 친구들과 발표하기", "materials": "활동지, 태블릿",
+        } for i in range(start, end + 1)]}
+    return "질문하신 내용에 대해 학교자율시간 운영 사례를 바탕으로 단계별로 안내해 드립니다. " * 4
+
+
+class StubBackend:
+    """부하 테스트용 가짜 LLM: 경로별 형식에 맞는 응답을 로그정규 분포의 지연 시간 뒤에 돌려준다 (네트워크 없음)"""
+
+    def __init__(self, latency=1.0, latencies=None, seed=None):
+        self.latency = latency
+        self.latencies = dict(STUB_LATENCY, **(latencies or {}))
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def replay(self, prompt, system_prompt, model, temperature, max_tokens, route=None):
+        median, sigma = self.latencies.get(route, (5.0, 0.5))
+        with self._lock:
+            seconds = self._random.lognormvariate(0, sigma) * median * self.latency
+        body = _stub_text(route, prompt)
+        text = body if isinstance(body, str) else json.dumps(body, ensure_ascii=False)
+        if seconds > 0:
+            time.sleep(seconds)
+        return types.SimpleNamespace(
+            content=text,
+            usage_metadata={"input_tokens": len((system_prompt or "") + prompt) // 2, "output_tokens": len(text) // 2},
+            response_metadata={"finish_reason": "stop"},
+        )
+
+
+def traffic_from_env():
+    """APP_LLM_MODE 가 record 이면 TrafficRecorder, replay 이면 TrafficReplayer, stub 이면 StubBackend, 아니면 None"""
+    mode = os.environ.get(MODE_ENV, "").strip().lower()
+    path = os.environ.get(ARCHIVE_ENV) or DEFAULT_ARCHIVE_PATH
+    if mode == "record":
+        return TrafficRecorder(path)
+    if mode == "replay":
+        return TrafficReplayer(path, latency=float(os.environ.get(LATENCY_ENV, "0") or 0))
+    if mode == "stub":
+        return StubBackend(latency=float(os.environ.get(LATENCY_ENV, "1") or 0))
+    return None
+
+
+def archive_summary(path):
+    """기록을 경로(route)별로 집계해 출력"""
+    systems, records = read_archive(path)
+    by_route = defaultdict(list)
+    for row in records:
+        by_route[row.get("route") or "-"].append(row)
+    print(f"{path}: 요청 {len(records)}개, 서로 다른 요청 {len({r['key'] for r in records})}개, 시스템 프롬프트 {len(systems)}개")
+    print(f"{'경로':<14}{'요청':>6}{'잘림':>6}{'p50 ms':>9}{'p95 ms':>9}{'출력 토큰':>10}")
+    for route, rows in sorted(by_route.items()):
+        latencies = sorted(r["ms"] for r in rows)
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+        truncated = sum(1 for r in rows if r.get("finish_reason") == "length")
+        output_tokens = sum(r.get("output_tokens") or 0 for r in rows)
+        print(f"{route:<14}{len(rows):>6}{truncated:>6}{p50:>9.0f}{p95:>9.0f}{output_tokens:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 요청 기록/재생 도구 (APP_LLM_MODE=record|replay|stub 로 앱에서 사용)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("summary", help="기록 파일의 경로별 요청 수와 지연 시간")
+    p.add_argument("archive", nargs="?", default=DEFAULT_ARCHIVE_PATH)
+    args = parser.parse_args()
+    if args.command == "summary":
+        archive_summary(args.archive)
+
+
+if __name__ == "__main__":
+    main()
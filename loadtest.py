@@ -0,0 +1,321 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(BASE_DIR, "app.py")
+
+# 세션마다 바꿔 쓰는 활동명 (비슷한 기존 계획 안내도 함께 거치도록 일부는 겹친다)
+ACTIVITY_NAMES = ["바다 탐험대", "우리 마을 지도 만들기", "인공지능 놀이터", "세계 요리 탐험", "숲속 생태 교실"]
+
+# 위저드에서 다음으로 넘어가는 버튼 (먼저 찾은 것을 누른다)
+NEXT_BUTTONS = [
+    "새로 생성",
+    "수정사항 저장 및 다음 단계로",
+    "4세트 생성 및 다음 단계로",
+    "4세트 저장 및 다음 단계로",
+    "생성 및 다음 단계로",
+    "전체 차시 생성",
+    "남은 차시 이어서 생성",
+    "다음 단계로",
+]
+REVIEW_SECTIONS = ["기본정보", "내용체계", "성취기준", "교수학습 및 평가", "차시별계획"]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def process_rss_mb(pid):
+    """pid 와 그 자식 프로세스(작업자)의 상주 메모리 합 (MB, /proc 기준)"""
+    total = 0
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/status") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            continue
+        if int(entry) == pid or int(status.get("PPid", "0").strip() or 0) == pid:
+            total += int(status.get("VmRSS", "0 kB").split()[0])
+    return total / 1024
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, latency):
+    """가짜 LLM(APP_LLM_MODE=stub)으로 앱 서버를 띄우고 준비될 때까지 기다린다
+
+    서버 로그는 데이터 폴더의 server.log 에 쓴다 (파이프로 받으면 오래 돌릴 때 버퍼가 차서 서버가 멈춘다).
+    """
+    env = dict(os.environ)
+    env.setdefault("APP_DATA_DIR", tempfile.mkdtemp(prefix="loadtest-"))
+    os.makedirs(env["APP_DATA_DIR"], exist_ok=True)
+    log_path = os.path.join(env["APP_DATA_DIR"], "server.log")
+    env.setdefault("APP_PROFILE", "0")
+    env["APP_LLM_MODE"] = "stub"
+    env["APP_LLM_REPLAY_LATENCY"] = str(latency)
+    with open(log_path, "ab") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", APP_PATH, "--server.headless=true", f"--server.port={port}",
+             "--server.address=127.0.0.1", "--server.enableXsrfProtection=false", "--server.fileWatcherType=none",
+             "--browser.gatherUsageStats=false"],
+            env=env, stdout=subprocess.DEVNULL, stderr=log, cwd=BASE_DIR,
+        )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return process, env["APP_DATA_DIR"]
+        except OSError:
+            time.sleep(0.3)
+        if process.poll() is not None:
+            with open(log_path, encoding="utf-8", errors="replace") as log:
+                raise RuntimeError(f"서버 실행 실패 ({log_path}): {log.read()[-2000:]}")
+    process.kill()
+    raise RuntimeError("서버가 60초 안에 준비되지 않았습니다.")
+
+
+class BrowserSession:
+    """브라우저 하나처럼 웹소켓으로 서버에 붙어 위젯 값을 보내고 rerun 결과(요소 트리)를 받는다"""
+
+    def __init__(self, base_url, timeout=600):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.values = {}  # 위젯 id -> 마지막으로 보낸 WidgetState (브라우저처럼 rerun 마다 다시 보낸다)
+        self.tree = None
+        self.rerun_ms = []
+        self.errors = []
+        self._ws = None
+
+    async def connect(self):
+        import websockets
+
+        url = self.base_url.replace("http", "ws", 1) + "/_stcore/stream"
+        self._ws = await websockets.connect(url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def rerun(self, *states, triggers=()):
+        """states(값 위젯)를 저장해 두고 triggers(버튼 클릭)와 함께 보낸 뒤 실행이 끝날 때까지 기다린다"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        from streamlit.testing.v1.element_tree import parse_tree_from_messages
+
+        for state in states:
+            self.values[state.id] = state
+        msg = BackMsg()
+        msg.rerun_script.widget_states.widgets.extend(list(self.values.values()) + list(triggers))
+        start = time.perf_counter()
+        await self._ws.send(msg.SerializeToString())
+        messages = []
+        while True:
+            forward = ForwardMsg.FromString(await asyncio.wait_for(self._ws.recv(), self.timeout))
+            kind = forward.WhichOneof("type")
+            if kind == "new_session":
+                # st.rerun() 이면 서버가 바로 다시 실행하므로 마지막 실행의 화면만 남긴다
+                messages = []
+            elif kind == "delta":
+                messages.append(forward)
+            elif kind == "script_finished" and forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                break
+        self.rerun_ms.append((time.perf_counter() - start) * 1000)
+        self.tree = parse_tree_from_messages(messages)
+        self.errors.extend(str(e.value) for e in self.tree.exception)
+        self.errors.extend(e.value for e in self.tree.error)
+        return self.tree
+
+    def widget(self, kind, label=None, key=None):
+        for node in self.tree.get(kind):
+            if (label is None or node.label == label) and (key is None or node.key == key):
+                return node
+        return None
+
+    @staticmethod
+    def state(widget, **value):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        ws = WidgetState(id=widget.id)
+        for field, v in value.items():
+            if field == "string_array_value":
+                ws.string_array_value.data[:] = v
+            else:
+                setattr(ws, field, v)
+        return ws
+
+    def click(self, button):
+        return self.rerun(triggers=[self.state(button, trigger_value=True)])
+
+    def step(self):
+        """지금 보이는 단계 (최종 검토는 7)"""
+        if any(t.value == "최종 계획서 검토" for t in self.tree.get("title")):
+            return 7
+        for m in self.tree.markdown:
+            match = re.search(r"<h3>(\d)단계", m.value)
+            if match:
+                return int(match.group(1))
+        return None
+
+    async def download_sizes(self):
+        """화면의 다운로드 버튼 파일을 실제로 받아 크기(bytes) 목록을 반환"""
+        sizes = []
+        for button in self.tree.get("download_button"):
+            url = self.base_url + button.proto.url
+
+            def fetch():
+                with urllib.request.urlopen(url, timeout=60) as response:
+                    return len(response.read())
+            sizes.append(await asyncio.to_thread(fetch))
+        return sizes
+
+
+async def walk_wizard(base_url, index, total_hours, max_reruns=60):
+    """가상 교사 한 명이 1단계부터 최종 검토(두 Excel 다운로드 포함)까지 진행"""
+    session = BrowserSession(base_url)
+    result = {"completed": False, "downloads": 0}
+    try:
+        await session.connect()
+        await session.rerun()
+        s = session
+        await s.rerun(
+            s.state(s.widget("multiselect", key="elem_grades"), string_array_value=["4학년"]),
+            s.state(s.widget("multiselect", key="elem_subjects"), string_array_value=["과학"]),
+            s.state(s.widget("number_input", label="총 차시"), double_value=total_hours),
+            s.state(s.widget("text_input", label="활동명"), string_value=ACTIVITY_NAMES[index % len(ACTIVITY_NAMES)]),
+            s.state(s.widget("text_area", label="요구사항"), string_value="체험 중심으로 협력하는 활동"),
+            triggers=[s.state(s.widget("button", label="정보 생성 및 다음 단계로"), trigger_value=True)],
+        )
+        asked = False
+        while len(s.rerun_ms) < max_reruns and s.step() != 7:
+            if s.step() == 2:
+                result["downloads"] += len([size for size in await s.download_sizes() if size > 0])
+            if s.step() == 3 and not asked:
+                # 사이드바 챗봇 질문 하나
+                await s.rerun(s.state(s.widget("text_input", key="chat_input"),
+                                      string_value=f"{index}번 선생님의 평가 계획 질문"),
+                              triggers=[s.state(s.widget("button", key="send_question"), trigger_value=True)])
+                asked = True
+                continue
+            labels = {b.label: b for b in s.tree.get("button")}
+            button = next((labels[label] for label in NEXT_BUTTONS if label in labels), None)
+            await (s.click(button) if button is not None else s.rerun())
+        if s.step() == 7:
+            for section in REVIEW_SECTIONS:
+                await s.rerun(s.state(s.widget("radio", key="review_section"), string_value=section))
+            lessons = s.tree.get("dataframe")
+            result["downloads"] += len([size for size in await s.download_sizes() if size > 0])
+            result["completed"] = bool(lessons) and len(lessons[0].value) == total_hours
+    except Exception as e:
+        session.errors.append(f"{type(e).__name__}: {e}")
+    finally:
+        await session.close()
+    result.update(rerun_ms=session.rerun_ms, errors=session.errors)
+    return result
+
+
+async def run_level(base_url, sessions, total_hours, ramp_up=0.0):
+    async def delayed(i):
+        await asyncio.sleep(ramp_up * i / sessions)
+        return await walk_wizard(base_url, i, total_hours)
+
+    return await asyncio.gather(*(delayed(i) for i in range(sessions)))
+
+
+def summarize(sessions, results, seconds, rss_before, rss_after):
+    rerun_ms = [ms for r in results for ms in r["rerun_ms"]]
+    completed = sum(r["completed"] for r in results)
+    failed = [r for r in results if r["errors"] or not r["completed"]]
+    return {
+        "sessions": sessions,
+        "completed": completed,
+        "error_rate": len(failed) / sessions,
+        "reruns": len(rerun_ms),
+        "p50_ms": percentile(rerun_ms, 50),
+        "p95_ms": percentile(rerun_ms, 95),
+        "p99_ms": percentile(rerun_ms, 99),
+        "seconds": seconds,
+        "sessions_per_min": completed / seconds * 60,
+        "reruns_per_s": len(rerun_ms) / seconds,
+        "excel_downloads": sum(r["downloads"] for r in results),
+        "rss_mb": rss_after,
+        "rss_growth_mb": rss_after - rss_before,
+        "errors": sorted({e.strip().splitlines()[-1][:200] for r in failed for e in r["errors"]}),
+        "incomplete": sessions - completed,
+    }
+
+
+def print_report(rows):
+    print(f"{'세션':>5}{'완료':>6}{'오류율':>8}{'rerun':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'완료/분':>9}{'rerun/s':>9}{'Excel':>7}{'RSS MB':>9}{'증가 MB':>9}")
+    for r in rows:
+        print(f"{r['sessions']:>5}{r['completed']:>6}{r['error_rate']:>8.1%}{r['reruns']:>7}{r['p50_ms']:>9.0f}"
+              f"{r['p95_ms']:>9.0f}{r['p99_ms']:>9.0f}{r['sessions_per_min']:>9.1f}{r['reruns_per_s']:>9.2f}"
+              f"{r['excel_downloads']:>7}{r['rss_mb']:>9.0f}{r['rss_growth_mb']:>9.1f}")
+        for error in r["errors"]:
+            print(f"      오류: {error}")
+        if r["incomplete"] and not r["errors"]:
+            print(f"      {r['incomplete']}개 세션이 오류 없이 최종 검토까지 가지 못함 (rerun 한도 초과)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="동시 세션 부하 테스트: 가짜 LLM(네트워크 없음)으로 앱 서버를 띄우고 N명이 1단계부터 최종 검토까지 진행")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8], help="동시 세션 수 (차례로 늘려 가며 실행)")
+    parser.add_argument("--hours", type=int, default=34, help="세션마다 만드는 총 차시")
+    parser.add_argument("--latency", type=float, default=0.1,
+                        help="가짜 LLM 지연 시간 배율 (1 이면 실제와 비슷한 분포, 0 이면 지연 없음)")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="세션 시작을 나눠 퍼뜨리는 시간 (초)")
+    parser.add_argument("--url", help="이미 실행 중인 서버 주소 (없으면 가짜 LLM 서버를 직접 띄움)")
+    parser.add_argument("--json", help="결과를 JSON 으로도 저장할 경로")
+    args = parser.parse_args()
+
+    process = None
+    base_url = args.url
+    if base_url is None:
+        port = free_port()
+        process, data_dir = start_server(port, args.latency)
+        base_url = f"http://127.0.0.1:{port}"
+        print(f"서버 {base_url} (데이터 폴더 {data_dir}, 작업자 {os.environ.get('APP_WORKERS') or '없음'}, "
+              f"동시 생성 한도 {os.environ.get('APP_MAX_GENERATIONS') or '기본값'})", flush=True)
+    try:
+        rows = []
+        for sessions in args.sessions:
+            rss_before = process_rss_mb(process.pid) if process else 0.0
+            start = time.perf_counter()
+            results = asyncio.run(run_level(base_url, sessions, args.hours, args.ramp_up))
+            seconds = time.perf_counter() - start
+            rss_after = process_rss_mb(process.pid) if process else 0.0
+            rows.append(summarize(sessions, results, seconds, rss_before, rss_after))
+            print(f"동시 세션 {sessions}명 완료 ({seconds:.0f}초)", flush=True)
+        print_report(rows)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(rows, f, ensure_ascii=False, indent=2)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
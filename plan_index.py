@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from bm25 import tokenize
+
+
+# 활동명에서 같은 뜻으로 자주 쓰는 영문 약어
+ACTIVITY_ALIASES = {
+    "ai": "인공지능",
+    "sw": "소프트웨어",
+    "it": "정보기술",
+}
+
+# 기존 계획에서 가져오는 생성 결과 (학년/교과/활동명 등 입력값은 새로 입력한 값을 유지)
+PLAN_CONTENT_FIELDS = [
+    "necessity", "overview", "content_sets", "domain", "key_ideas", "content_elements",
+    "standards", "teaching_methods_text", "assessment_plan", "lesson_plans",
+]
+
+# 유사도 가중치 (활동명, 학년, 교과, 요구사항)
+WEIGHTS = (0.5, 0.2, 0.15, 0.15)
+
+
+def _normalize_activity(text):
+    text = (text or "").lower()
+    for alias, word in ACTIVITY_ALIASES.items():
+        text = re.sub(rf"(?<![a-z]){alias}(?![a-z])", f" {word} ", text)
+    return text
+
+
+def plan_signature(data):
+    """유사도 비교용 (학교급, 활동명 색인어, 학년, 교과, 요구사항 색인어)"""
+    return (
+        data.get("school_type", ""),
+        set(tokenize(_normalize_activity(data.get("activity_name", "")))),
+        frozenset(data.get("grades", [])),
+        frozenset(data.get("subjects", [])),
+        set(tokenize(data.get("requirements", "") or "")),
+    )
+
+
+def _dice(a, b):
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def plan_similarity(sig_a, sig_b):
+    """두 계획 서명의 유사도 (0~1). 학교급이 다르면 0"""
+    if sig_a[0] != sig_b[0]:
+        return 0.0
+    w_activity, w_grades, w_subjects, w_requirements = WEIGHTS
+    return (w_activity * _dice(sig_a[1], sig_b[1])
+            + w_grades * _jaccard(sig_a[2], sig_b[2])
+            + w_subjects * _jaccard(sig_a[3], sig_b[3])
+            + w_requirements * _dice(sig_a[4], sig_b[4]))
+
+
+def plan_content_hash(data):
+    content = {field: data.get(field) for field in PLAN_CONTENT_FIELDS}
+    return hashlib.sha1(json.dumps(content, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class PlanIndex:
+    """완성된 계획서 색인 (SQLite 파일에 저장하여 세션·프로세스 간 공유)
+
+    활동명 색인어의 역색인으로 후보를 좁힌 뒤, 학년·교과·요구사항까지 합친 유사도가
+    threshold 이상인 계획을 높은 순으로 돌려준다. 계획 본문은 고를 때만 읽는다.
+    """
+
+    def __init__(self, path, threshold=0.6):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._signatures = {}  # 계획 번호 -> 서명
+        self._summaries = {}  # 계획 번호 -> 목록에 보여줄 요약
+        self._postings = defaultdict(set)  # 활동명 색인어 -> 계획 번호
+        self._last_rowid = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS plans (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    content_hash TEXT NOT NULL UNIQUE,
+                    school_type TEXT NOT NULL,
+                    activity_name TEXT NOT NULL,
+                    grades TEXT NOT NULL,
+                    subjects TEXT NOT NULL,
+                    requirements TEXT NOT NULL,
+                    total_hours INTEGER,
+                    data TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+        self._refresh()
+
+    @contextmanager
+    def _connect(self):
+        """with 블록이 끝나면 commit 하고 닫히는 연결 (sqlite3.Connection 의 with 는 닫지 않는다)"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _refresh(self):
+        """다른 프로세스가 추가한 계획을 메모리 색인에 반영"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, school_type, activity_name, grades, subjects, requirements, total_hours, created_at "
+                "FROM plans WHERE id > ? ORDER BY id",
+                (self._last_rowid,),
+            ).fetchall()
+        for plan_id, school_type, activity_name, grades, subjects, requirements, total_hours, created_at in rows:
+            fields = {
+                "school_type": school_type,
+                "activity_name": activity_name,
+                "grades": json.loads(grades),
+                "subjects": json.loads(subjects),
+                "requirements": requirements,
+            }
+            self._add_to_index(plan_id, fields, total_hours, created_at)
+            self._last_rowid = plan_id
+
+    def _add_to_index(self, plan_id, fields, total_hours, created_at):
+        signature = plan_signature(fields)
+        self._signatures[plan_id] = signature
+        self._summaries[plan_id] = dict(fields, id=plan_id, total_hours=total_hours, created_at=created_at)
+        for term in signature[1]:
+            self._postings[term].add(plan_id)
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def add(self, data):
+        """완성된 계획 저장 (같은 내용은 한 번만). 계획 번호 반환"""
+        content_hash = plan_content_hash(data)
+        fields = {
+            "school_type": data.get("school_type", ""),
+            "activity_name": data.get("activity_name", ""),
+            "grades": list(data.get("grades", [])),
+            "subjects": list(data.get("subjects", [])),
+            "requirements": data.get("requirements", "") or "",
+        }
+        created_at = time.time()
+        with self._lock:
+            with self._connect() as conn:
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO plans (content_hash, school_type, activity_name, grades, subjects, "
+                    "requirements, total_hours, data, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (content_hash, fields["school_type"], fields["activity_name"],
+                     json.dumps(fields["grades"], ensure_ascii=False), json.dumps(fields["subjects"], ensure_ascii=False),
+                     fields["requirements"], data.get("total_hours"), json.dumps(data, ensure_ascii=False), created_at),
+                )
+                if cur.rowcount:
+                    return cur.lastrowid
+                return conn.execute("SELECT id FROM plans WHERE content_hash = ?", (content_hash,)).fetchone()[0]
+
+    def search(self, data, k=3):
+        """[(유사도, 계획 요약), ...] 유사도 높은 순"""
+        signature = plan_signature(data)
+        with self._lock:
+            self._refresh()
+            candidates = set()
+            for term in signature[1]:
+                candidates |= self._postings.get(term, set())
+            scored = []
+            for plan_id in candidates:
+                score = plan_similarity(signature, self._signatures[plan_id])
+                if score >= self.threshold:
+                    scored.append((score, self._summaries[plan_id]))
+        # 점수가 같으면 최근 계획 우선
+        scored.sort(key=lambda x: (x[0], x[1]["created_at"]), reverse=True)
+        return scored[:k]
+
+    def get(self, plan_id):
+        """저장된 계획 전체 (없으면 None)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM plans WHERE id = ?", (plan_id,)).fetchone()
+        return json.loads(row[0]) if row else None
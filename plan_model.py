@@ -0,0 +1,355 @@
+import sys
+
+
+CONTENT_ELEMENT_KEYS = ("knowledge_and_understanding", "process_and_skills", "values_and_attitudes")
+LESSON_FIELDS = ("lesson_number", "topic", "content", "materials")
+ASSESSMENT_FIELDS = ("element", "method", "criteria_high", "criteria_mid", "criteria_low")
+
+# 짧은 문자열 값으로 저장하는 기본 정보 (학년/교과/학기는 튜플)
+SCALAR_FIELDS = (
+    "school_type", "activity_name", "requirements", "total_hours", "use_guidance",
+    "necessity", "overview", "teaching_methods_text",
+)
+LIST_FIELDS = ("grades", "subjects", "semester")
+# content_sets 에서 계산하는 값 (따로 저장하지 않음)
+DERIVED_FIELDS = ("domain", "key_ideas", "content_elements")
+
+_MISSING = object()
+
+
+def _intern(value):
+    """학년, 교과, 코드처럼 세션마다 반복되는 짧은 문자열은 하나의 객체를 공유"""
+    return sys.intern(value) if isinstance(value, str) and len(value) <= 32 else value
+
+
+def _seq(value):
+    """리스트는 튜플로 (LLM 이 문자열 하나로 준 값은 그대로 둔다)"""
+    return tuple(_intern(v) for v in value) if isinstance(value, (list, tuple)) else value
+
+
+def _unseq(value):
+    return list(value) if isinstance(value, tuple) else value
+
+
+class FrozenList(list):
+    """고쳐 쓰면 TypeError 를 내는 리스트 (계산해서 돌려주는 값이 저장된 값처럼 보이지 않도록)
+
+    repr/JSON 은 list 와 같고, 복사(copy/deepcopy/pickle)하면 보통 list 가 된다.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("계산된 값이라 고칠 수 없습니다. data[key] = 새 값 으로 저장하세요.")
+
+    append = extend = insert = remove = pop = clear = sort = reverse = _readonly
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+
+    def __reduce_ex__(self, protocol):
+        return list, (list(self),)
+
+
+class FrozenDict(dict):
+    """고쳐 쓰면 TypeError 를 내는 dict (FrozenList 와 같은 용도)"""
+
+    _readonly = FrozenList._readonly
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    update = setdefault = pop = popitem = clear = _readonly
+
+    def __reduce_ex__(self, protocol):
+        return dict, (dict(self),)
+
+
+def _frozen(value):
+    if isinstance(value, dict):
+        return FrozenDict((k, _frozen(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return FrozenList(value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, dict):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_thaw(v) for v in value]
+    return value
+
+
+def _extra(d, known):
+    extra = {k: v for k, v in d.items() if k not in known}
+    return extra or None
+
+
+class ContentSet:
+    __slots__ = ("domain", "key_ideas", "elements", "extra")
+
+    def __init__(self, domain="", key_ideas=(), elements=((), (), ()), extra=None):
+        self.domain = domain
+        self.key_ideas = key_ideas
+        self.elements = elements
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, d):
+        elements = d.get("content_elements") or {}
+        if isinstance(elements, dict):
+            element_values = tuple(_seq(elements.get(k, [])) for k in CONTENT_ELEMENT_KEYS)
+            element_extra = _extra(elements, CONTENT_ELEMENT_KEYS)
+        else:
+            element_values, element_extra = ((), (), ()), {"content_elements": elements}
+        extra = _extra(d, ("domain", "key_ideas", "content_elements"))
+        if element_extra:
+            extra = dict(extra or {}, _content_elements=element_extra)
+        return cls(d.get("domain", ""), _seq(d.get("key_ideas", [])), element_values, extra)
+
+    def content_elements(self):
+        elements = {k: _unseq(v) for k, v in zip(CONTENT_ELEMENT_KEYS, self.elements)}
+        if self.extra and "_content_elements" in self.extra:
+            extra = self.extra["_content_elements"]
+            if "content_elements" in extra:
+                return extra["content_elements"]
+            elements.update(extra)
+        return elements
+
+    def to_dict(self):
+        d = {"domain": self.domain, "key_ideas": _unseq(self.key_ideas), "content_elements": self.content_elements()}
+        if self.extra:
+            d.update({k: v for k, v in self.extra.items() if k != "_content_elements"})
+        return d
+
+
+class Standard:
+    __slots__ = ("code", "description", "levels", "extra")
+
+    def __init__(self, code="", description="", levels=(), extra=None):
+        self.code = code
+        self.description = description
+        self.levels = levels  # ((수준, 설명), ...)
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, d):
+        levels = tuple(
+            (_intern(lv.get("level", "")), lv.get("description", "")) if isinstance(lv, dict) else (None, lv)
+            for lv in d.get("levels", []) or []
+        )
+        return cls(_intern(d.get("code", "")), d.get("description", ""), levels,
+                   _extra(d, ("code", "description", "levels")))
+
+    def to_dict(self):
+        levels = [{"level": lv, "description": desc} if lv is not None else desc for lv, desc in self.levels]
+        d = {"code": self.code, "description": self.description, "levels": levels}
+        if self.extra:
+            d.update(self.extra)
+        return d
+
+
+class Assessment:
+    """평가계획 한 줄. 코드가 같은 성취기준과 설명이 같으면 설명을 따로 저장하지 않는다"""
+    __slots__ = ("code", "description", "values", "extra")
+
+    def __init__(self, code="", description=None, values=("",) * 5, extra=None):
+        self.code = code
+        self.description = description
+        self.values = values
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, d, standard_descriptions):
+        code = _intern(d.get("code", ""))
+        description = d.get("description", "")
+        if standard_descriptions.get(code) == description:
+            description = None
+        values = tuple(_intern(d.get(f, "")) for f in ASSESSMENT_FIELDS)
+        return cls(code, description, values, _extra(d, ("code", "description") + ASSESSMENT_FIELDS))
+
+    def to_dict(self, standard_descriptions):
+        description = self.description
+        if description is None:
+            description = standard_descriptions.get(self.code, "")
+        d = {"code": self.code, "description": description}
+        d.update(zip(ASSESSMENT_FIELDS, self.values))
+        if self.extra:
+            d.update(self.extra)
+        return d
+
+
+class LessonTable:
+    """차시별 계획을 열 단위 튜플로 저장 (차시마다 dict 를 두지 않음)"""
+    __slots__ = ("columns", "extras")
+
+    def __init__(self, columns, extras=None):
+        self.columns = columns
+        self.extras = extras
+
+    @classmethod
+    def from_rows(cls, rows):
+        columns = tuple(tuple(_intern(row.get(f, "")) for row in rows) for f in LESSON_FIELDS)
+        extras = [_extra(row, LESSON_FIELDS) for row in rows]
+        return cls(columns, extras if any(extras) else None)
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def to_rows(self):
+        rows = [dict(zip(LESSON_FIELDS, values)) for values in zip(*self.columns)]
+        if self.extras:
+            for row, extra in zip(rows, self.extras):
+                if extra:
+                    row.update(extra)
+        return rows
+
+
+class Plan:
+    """계획서 데이터 (세션 상태에 하나)
+
+    내용체계/성취기준/평가계획/차시 계획을 한 번씩만 저장하고, 기존 코드가 쓰던 dict 형태
+    (data.get("standards"), data["domain"] 등)는 읽을 때마다 만들어 준다.
+    돌려받은 리스트/dict 를 고쳐도 저장된 값은 바뀌지 않으므로 항상 data[key] = 새 값 으로 저장한다.
+    content_sets 에서 계산하는 domain/key_ideas/content_elements 는 고치려 하면 TypeError 가 나는 값으로 준다.
+    """
+    __slots__ = SCALAR_FIELDS + LIST_FIELDS + ("content_sets", "standards", "assessments", "lessons", "extra")
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, _MISSING)
+        self.extra = {}
+
+    @classmethod
+    def from_dict(cls, data):
+        plan = cls()
+        plan.update(data)
+        return plan
+
+    def _standard_descriptions(self):
+        if self.standards is _MISSING:
+            return {}
+        return {s.code: s.description for s in self.standards}
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        if key in SCALAR_FIELDS:
+            value = getattr(self, key)
+        elif key in LIST_FIELDS:
+            value = _unseq(getattr(self, key))
+        elif key == "content_sets":
+            value = _MISSING if self.content_sets is _MISSING else [cs.to_dict() for cs in self.content_sets]
+        elif key in DERIVED_FIELDS and key not in self.extra:
+            value = _frozen(self._derived(key))
+        elif key == "standards":
+            value = _MISSING if self.standards is _MISSING else [s.to_dict() for s in self.standards]
+        elif key == "assessment_plan":
+            if self.assessments is _MISSING:
+                value = _MISSING
+            else:
+                descriptions = self._standard_descriptions()
+                value = [a.to_dict(descriptions) for a in self.assessments]
+        elif key == "lesson_plans":
+            value = _MISSING if self.lessons is _MISSING else self.lessons.to_rows()
+        else:
+            value = self.extra.get(key, _MISSING)
+        return default if value is _MISSING else value
+
+    def _derived(self, key):
+        """3단계에서 저장하던 값: 영역명/내용 요소는 첫 세트, 핵심 아이디어는 모든 세트"""
+        if self.content_sets is _MISSING:
+            return _MISSING
+        sets = self.content_sets
+        if key == "domain":
+            return sets[0].domain if sets else ""
+        if key == "content_elements":
+            return sets[0].content_elements() if sets else {}
+        return [idea for cs in sets for idea in (cs.key_ideas if isinstance(cs.key_ideas, tuple) else [cs.key_ideas])]
+
+    def __setitem__(self, key, value):
+        if key in SCALAR_FIELDS:
+            setattr(self, key, _intern(value))
+        elif key in LIST_FIELDS:
+            setattr(self, key, _seq(value))
+        elif key == "content_sets":
+            self.content_sets = tuple(ContentSet.from_dict(cs) for cs in value or [])
+            for derived in DERIVED_FIELDS:
+                self.extra.pop(derived, None)
+        elif key in DERIVED_FIELDS:
+            # 내용체계가 있으면 계산 값과 같으므로 버리고, 없을 때만 그대로 보관
+            if self.content_sets is _MISSING or value != self._derived(key):
+                self.extra[key] = value
+        elif key == "standards":
+            # 평가계획의 설명 중복 제거는 성취기준 설명을 기준으로 하므로 먼저 원래 값으로 되돌린다
+            assessment_plan = self.get("assessment_plan", _MISSING)
+            self.standards = tuple(Standard.from_dict(s) for s in value or [])
+            if assessment_plan is not _MISSING:
+                self["assessment_plan"] = assessment_plan
+        elif key == "assessment_plan":
+            descriptions = self._standard_descriptions()
+            self.assessments = tuple(Assessment.from_dict(a, descriptions) for a in value or [])
+        elif key == "lesson_plans":
+            self.lessons = LessonTable.from_rows(value or [])
+        else:
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        """값을 만들지 않고 저장 여부만 확인"""
+        if key in SCALAR_FIELDS or key in LIST_FIELDS or key == "content_sets":
+            return getattr(self, key) is not _MISSING
+        if key in DERIVED_FIELDS and key not in self.extra:
+            return self.content_sets is not _MISSING
+        if key in ("standards", "assessment_plan", "lesson_plans"):
+            attr = {"assessment_plan": "assessments", "lesson_plans": "lessons"}.get(key, key)
+            return getattr(self, attr) is not _MISSING
+        return key in self.extra
+
+    def pop(self, key, default=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        attr = {"assessment_plan": "assessments", "lesson_plans": "lessons"}.get(key, key)
+        if attr in self.__slots__ and attr != "extra":
+            setattr(self, attr, _MISSING)
+        else:
+            self.extra.pop(key, None)
+        return value
+
+    def update(self, other=(), **kwargs):
+        items = list(other.items()) if hasattr(other, "items") else list(other)
+        # 성취기준을 평가계획보다 먼저 넣어야 설명 중복을 찾을 수 있다
+        items.sort(key=lambda kv: kv[0] == "assessment_plan")
+        for key, value in items + list(kwargs.items()):
+            self[key] = value
+
+    def keys(self):
+        return [key for key in self._all_keys() if key in self]
+
+    def _all_keys(self):
+        return (SCALAR_FIELDS + LIST_FIELDS + ("content_sets",) + DERIVED_FIELDS
+                + ("standards", "assessment_plan", "lesson_plans") + tuple(k for k in self.extra if k not in DERIVED_FIELDS))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        items = []
+        for key in self._all_keys():
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                items.append((key, value))
+        return items
+
+    def to_dict(self):
+        """기존 dict 형태 (JSON 저장, Excel/Word 내보내기용). 계산된 값도 고쳐 쓸 수 있는 보통 list/dict 로 준다"""
+        return {key: _thaw(value) if key in DERIVED_FIELDS else value for key, value in self.items()}
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__ if getattr(self, name) is not _MISSING}
+
+    def __setstate__(self, state):
+        self.__init__()
+        for name, value in state.items():
+            setattr(self, name, value)
@@ -0,0 +1,319 @@
+import argparse
+import functools
+import html
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+
+
+PROFILE_ENV = "APP_PROFILE"
+# 1 일 때만 ?profile= 쿼리 값으로 프로파일링을 켤 수 있다 (기본은 환경 변수만 따름)
+PROFILE_ALLOW_QUERY_ENV = "APP_PROFILE_ALLOW_QUERY"
+# 남겨 둘 함수별 추적 파일(.prof/.html) 수와 날짜 폴더 보관 일수
+MAX_TRACES = int(os.environ.get("APP_PROFILE_MAX_TRACES", "200"))
+KEEP_DAYS = int(os.environ.get("APP_PROFILE_KEEP_DAYS", "7"))
+PRUNE_INTERVAL = 60
+
+# 스크립트 실행(rerun)마다 하나씩 만들어지는 기록. 세션마다 스레드가 다르므로 thread-local 로 둔다
+_local = threading.local()
+# cProfile 은 프로세스에 하나만 켤 수 있으므로(3.12+ 에서는 ValueError) 켠 세션이 잡고 있는다
+_cprofile_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def profiling_mode():
+    """APP_PROFILE 환경 변수로 프로파일링 방식 결정 (APP_PROFILE_ALLOW_QUERY=1 이면 ?profile= 쿼리 값이 우선)
+
+    꺼짐: None, 시간/위젯 수만: "basic", 함수별 추적까지: "cprofile" 또는 "pyinstrument"
+    """
+    mode = os.environ.get(PROFILE_ENV, "")
+    if os.environ.get(PROFILE_ALLOW_QUERY_ENV, "") == "1":
+        try:
+            mode = st.query_params.get("profile", mode)
+        except Exception:
+            pass
+    mode = (mode or "").strip().lower()
+    if mode in ("", "0", "off", "false", "no"):
+        return None
+    return mode if mode in ("cprofile", "pyinstrument") else "basic"
+
+
+def _script_run_ctx():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        return get_script_run_ctx()
+    except Exception:
+        return None
+
+
+def _widget_count():
+    ctx = _script_run_ctx()
+    return len(getattr(ctx, "widget_ids_this_run", ()) or ()) if ctx else 0
+
+
+def _deep_size(obj, seen=None):
+    """객체가 참조하는 컨테이너/문자열까지 합한 대략적인 메모리 크기(bytes)"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_size(v, seen) for v in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += _deep_size(vars(obj), seen)
+    elif hasattr(obj, "__slots__"):
+        size += sum(_deep_size(getattr(obj, s), seen) for s in obj.__slots__ if hasattr(obj, s))
+    return size
+
+
+class RerunProfile:
+    """한 번의 rerun 에서 구간별 실행 시간과 생성된 위젯 수를 모은다"""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.sections = []
+        self.total_ms = 0.0
+        self.widgets = 0
+        self.session_state_bytes = 0
+        self.trace_path = None
+
+    def add(self, name, ms, widgets):
+        self.sections.append({"name": name, "ms": round(ms, 2), "widgets": widgets})
+
+    def top(self, n=5):
+        return sorted(self.sections, key=lambda s: s["ms"], reverse=True)[:n]
+
+    def to_dict(self):
+        return {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "mode": self.mode,
+            "total_ms": round(self.total_ms, 2),
+            "widgets": self.widgets,
+            "session_state_bytes": self.session_state_bytes,
+            "sections": self.sections,
+            "trace": self.trace_path,
+        }
+
+
+@contextmanager
+def profile_section(name):
+    """현재 rerun 을 프로파일링 중이면 구간 시간을 기록 (아니면 아무것도 하지 않음)"""
+    profile = getattr(_local, "current", None)
+    if profile is None:
+        yield
+        return
+    widgets_before = _widget_count()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, (time.perf_counter() - start) * 1000, _widget_count() - widgets_before)
+
+
+def profiled(name=None):
+    """함수 전체를 profile_section 으로 감싸는 데코레이터"""
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_section(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _start_tracer(mode):
+    if mode == "cprofile":
+        import cProfile
+        # 다른 세션이 추적 중이면 이번 rerun 은 시간/위젯 수만 기록
+        if not _cprofile_lock.acquire(blocking=False):
+            return None
+        tracer = cProfile.Profile()
+        try:
+            tracer.enable()
+        except ValueError:
+            _cprofile_lock.release()
+            return None
+        return tracer
+    if mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            return None
+        tracer = Profiler()
+        tracer.start()
+        return tracer
+    return None
+
+
+def _stop_tracer(mode, tracer, path_prefix):
+    if tracer is None:
+        return None
+    if mode == "cprofile":
+        tracer.disable()
+        _cprofile_lock.release()
+        path = path_prefix + ".prof"
+        tracer.dump_stats(path)
+        return path
+    tracer.stop()
+    path = path_prefix + ".html"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(tracer.output_html())
+    return path
+
+
+def prune_profiles(output_dir, max_traces=MAX_TRACES, keep_days=KEEP_DAYS):
+    """keep_days 보다 오래된 날짜 폴더를 지우고, 추적 파일은 최근 max_traces 개만 남긴다"""
+    if not os.path.isdir(output_dir):
+        return
+    oldest = time.strftime("%Y%m%d", time.localtime(time.time() - keep_days * 86400))
+    traces = []
+    for day in os.listdir(output_dir):
+        day_dir = os.path.join(output_dir, day)
+        if not os.path.isdir(day_dir):
+            continue
+        if day < oldest:
+            shutil.rmtree(day_dir, ignore_errors=True)
+            continue
+        traces += [os.path.join(day_dir, name) for name in os.listdir(day_dir) if name.endswith((".prof", ".html"))]
+    traces.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+    for path in traces[:-max_traces] if max_traces > 0 else traces:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@contextmanager
+def profile_rerun(output_dir):
+    """rerun 전체를 감싸 기록을 output_dir 에 남기고 화면 구석에 요약을 띄운다"""
+    mode = profiling_mode()
+    if mode is None:
+        yield
+        return
+
+    ctx = _script_run_ctx()
+    session_id = getattr(ctx, "session_id", "local") if ctx else "local"
+    run_dir = os.path.join(output_dir, time.strftime("%Y%m%d"))
+    os.makedirs(run_dir, exist_ok=True)
+    path_prefix = os.path.join(run_dir, f"{session_id}-{time.strftime('%H%M%S')}-{int(time.time() * 1000) % 1000:03d}")
+
+    profile = RerunProfile(mode)
+    _local.current = profile
+    tracer = _start_tracer(mode)
+    start = time.perf_counter()
+    completed = False
+    try:
+        yield profile
+        completed = True
+    finally:
+        profile.total_ms = (time.perf_counter() - start) * 1000
+        _local.current = None
+        profile.trace_path = _stop_tracer(mode, tracer, path_prefix)
+        profile.widgets = _widget_count()
+        try:
+            profile.session_state_bytes = _deep_size(st.session_state.to_dict())
+        except Exception:
+            pass
+        with open(os.path.join(run_dir, f"{session_id}.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(profile.to_dict(), ensure_ascii=False) + "\n")
+        global _last_prune
+        if time.time() - _last_prune > PRUNE_INTERVAL:
+            _last_prune = time.time()
+            prune_profiles(output_dir)
+        # st.rerun()/st.stop() 으로 중단된 실행은 화면이 버려지므로 요약을 그리지 않는다
+        if completed:
+            show_overlay(profile)
+
+
+def show_overlay(profile):
+    rows = "".join(
+        f"<tr><td>{html.escape(s['name'])}</td><td style='text-align:right'>{s['ms']:.0f} ms</td>"
+        f"<td style='text-align:right'>{s['widgets']}</td></tr>"
+        for s in profile.top()
+    )
+    st.markdown(f"""
+    <div style="position:fixed; right:1rem; bottom:1rem; z-index:10000; background:rgba(17,24,39,0.88);
+                color:#f9fafb; font-size:0.75rem; padding:0.6rem 0.8rem; border-radius:0.5rem; max-width:22rem;">
+        <b>⏱ rerun {profile.total_ms:.0f} ms</b> · 위젯 {profile.widgets} · 세션 상태 {profile.session_state_bytes / 1024:.0f} KB
+        <table style="margin-top:0.3rem; color:#f9fafb;">{rows}</table>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+# 첫 화면에 필요 없는데 불러오면 콜드 스타트가 느려지는 모듈
+HEAVY_MODULES = ["pandas", "numpy", "langchain_core", "langchain_openai", "langchain"]
+
+
+def _cold_start_probe(app_path):
+    """별도 프로세스에서 호출: 앱 스크립트의 첫 실행(첫 화면)과 두 번째 실행 시간을 JSON 으로 출력"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(app_path, default_timeout=120)
+    at.secrets["openai"] = {"api_key": "sk-cold-start-probe"}
+    start = time.perf_counter()
+    at.run()
+    first_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    at.run()
+    rerun_ms = (time.perf_counter() - start) * 1000
+    print(json.dumps({
+        "first_ms": first_ms,
+        "rerun_ms": rerun_ms,
+        "errors": [e.value for e in at.exception],
+        "loaded": [m for m in HEAVY_MODULES if m in sys.modules],
+    }), flush=True)
+    # 앱이 띄운 백그라운드 스레드(추천 질문 답변 준비 등)를 기다리지 않고 종료
+    os._exit(0)
+
+
+def bench_cold_start(app_paths, runs=5):
+    """앱 스크립트마다 새 프로세스에서 첫 화면까지 걸리는 시간을 runs 번 재서 중앙값 비교"""
+    for app_path in app_paths:
+        results = []
+        for _ in range(runs):
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "cold-start-probe", os.path.abspath(app_path)],
+                check=True, capture_output=True, text=True, env=dict(os.environ, **{PROFILE_ENV: "0"}),
+            ).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+        first = sorted(r["first_ms"] for r in results)[len(results) // 2]
+        rerun = sorted(r["rerun_ms"] for r in results)[len(results) // 2]
+        loaded = ", ".join(results[-1]["loaded"]) or "없음"
+        print(f"[{app_path}] 첫 화면 {first:.0f} ms, 두 번째 rerun {rerun:.0f} ms (중앙값, {runs}회), 불러온 무거운 모듈: {loaded}")
+        if results[-1]["errors"]:
+            print(f"  오류: {results[-1]['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="앱 렌더링 성능 측정 도구")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("cold-start", help="새 프로세스에서 첫 화면까지 걸리는 시간 비교")
+    p.add_argument("apps", nargs="*", default=["app.py"])
+    p.add_argument("--runs", type=int, default=5)
+
+    p = sub.add_parser("cold-start-probe")
+    p.add_argument("app")
+
+    args = parser.parse_args()
+    if args.command == "cold-start":
+        bench_cold_start(args.apps, runs=args.runs)
+    elif args.command == "cold-start-probe":
+        _cold_start_probe(args.app)
+
+
+if __name__ == "__main__":
+    main()
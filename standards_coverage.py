@@ -0,0 +1,114 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from bm25 import tokenize
+from generation import lesson_index
+
+
+# 차시와 성취기준의 유사도가 이 값 이상이면 그 차시가 성취기준을 다룬다고 본다
+COVERAGE_THRESHOLD = 0.15
+
+
+def standard_text(standard, assessment_plan=()):
+    """성취기준 비교용 문장: 진술 + 수준별 설명 + 같은 코드의 평가요소"""
+    parts = [standard.get("description", "")]
+    parts += [level.get("description", "") for level in standard.get("levels", [])]
+    parts += [a.get("element", "") for a in assessment_plan if a.get("code") == standard.get("code")]
+    return " ".join(parts)
+
+
+def lesson_text(lp):
+    return f"{lp.get('topic', '')} {lp.get('content', '')}"
+
+
+def tfidf_matrix(texts):
+    """행을 L2 정규화한 TF-IDF 행렬 (문서 × 색인어, 색인어는 bm25.tokenize 의 어절 + 음절 bigram)"""
+    vocab, rows, cols = {}, [], []
+    for i, text in enumerate(texts):
+        for term in tokenize(text):
+            rows.append(i)
+            cols.append(vocab.setdefault(term, len(vocab)))
+    tf = np.zeros((len(texts), len(vocab)), dtype=np.float32)
+    np.add.at(tf, (rows, cols), 1)
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log((1 + len(texts)) / (1 + df)) + 1
+    matrix = np.log1p(tf) * idf
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return matrix
+
+
+def similarity_matrix(lesson_plans, standards, assessment_plan=()):
+    """차시 × 성취기준 코사인 유사도 (두 목록을 한 어휘로 색인)"""
+    texts = [lesson_text(lp) for lp in lesson_plans] + [standard_text(s, assessment_plan) for s in standards]
+    matrix = tfidf_matrix(texts)
+    return matrix[:len(lesson_plans)] @ matrix[len(lesson_plans):].T
+
+
+def lesson_ranges(numbers):
+    """[1, 2, 3, 7] -> "1~3, 7차시" (없으면 빈 문자열)"""
+    ranges = []
+    for n in sorted(set(numbers)):
+        if ranges and n == ranges[-1][1] + 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    if not ranges:
+        return ""
+    return ", ".join(f"{a}~{b}" if a != b else f"{a}" for a, b in ranges) + "차시"
+
+
+def analyze_coverage(lesson_plans, standards, assessment_plan=(), threshold=COVERAGE_THRESHOLD):
+    """성취기준별 관련 차시와 빠진 성취기준, 어느 성취기준과도 이어지지 않는 차시를 계산 (LLM 호출 없음)
+
+    반환값: {"standards": [{code, description, lessons, ranges, score, covered}],
+             "uncovered": [성취기준 코드], "unaligned_lessons": [차시 번호], "unaligned_ranges": 문자열}
+    """
+    numbers = [lesson_index(lp) or i for i, lp in enumerate(lesson_plans, 1)]
+    if lesson_plans and standards:
+        sim = similarity_matrix(lesson_plans, standards, assessment_plan)
+    else:
+        sim = np.zeros((len(lesson_plans), len(standards)), dtype=np.float32)
+    related = sim >= threshold
+
+    rows = []
+    for j, standard in enumerate(standards):
+        lessons = [numbers[i] for i in np.flatnonzero(related[:, j])]
+        rows.append({
+            "code": standard.get("code", ""),
+            "description": standard.get("description", ""),
+            "lessons": lessons,
+            "ranges": lesson_ranges(lessons),
+            "score": float(sim[:, j].max()) if lesson_plans else 0.0,
+            "covered": bool(lessons),
+        })
+    unaligned = [numbers[i] for i in np.flatnonzero(~related.any(axis=1))] if standards else []
+    return {
+        "standards": rows,
+        "uncovered": [row["code"] for row in rows if not row["covered"]],
+        "unaligned_lessons": unaligned,
+        "unaligned_ranges": lesson_ranges(unaligned),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="성취기준별 차시 반영 점검 (계획 JSON: standards, lesson_plans, assessment_plan)")
+    parser.add_argument("plan", help="계획 데이터 JSON 파일")
+    parser.add_argument("--threshold", type=float, default=COVERAGE_THRESHOLD)
+    args = parser.parse_args()
+    with open(args.plan, encoding="utf-8") as f:
+        data = json.load(f)
+
+    start = time.perf_counter()
+    result = analyze_coverage(data.get("lesson_plans", []), data.get("standards", []),
+                              data.get("assessment_plan", []), threshold=args.threshold)
+    ms = (time.perf_counter() - start) * 1000
+    for row in result["standards"]:
+        print(f"{'  ' if row['covered'] else '✗ '}{row['code']:<14}{row['score']:>6.2f}  {row['ranges'] or '-'}")
+    print(f"빠진 성취기준 {len(result['uncovered'])}개, 이어지지 않는 차시: {result['unaligned_ranges'] or '없음'} ({ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("시간 안에 조건이 맞지 않았습니다.")
+        time.sleep(0.01)
+
+
+class Requests:
+    """요청마다 스레드에서 acquire 하고, 들어간 순서를 기록한다"""
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.admitted = []
+        self.tickets = {}
+        self._lock = threading.Lock()
+
+    def start(self, name, kind="step", weight=1):
+        def run():
+            ticket = self.controller.acquire(kind, poll=0.01, weight=weight)
+            with self._lock:
+                self.admitted.append(name)
+                self.tickets[name] = ticket
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def release(self, name):
+        self.controller.release(self.tickets.pop(name))
+
+
+@pytest.fixture
+def controller():
+    return AdmissionController(4, estimates={"step": 10, "variants": 30})
+
+
+def test_weighted_request_keeps_its_place_in_line(controller):
+    """자리가 하나 비어 있어도 두 자리가 필요한 앞 요청을 뒤 요청이 앞지르지 않는다"""
+    requests = Requests(controller)
+    for name in ("a", "b", "c"):
+        requests.start(name)
+    wait_until(lambda: len(requests.admitted) == 3)
+
+    requests.start("variants", kind="variants", weight=2)
+    wait_until(lambda: controller.stats()["waiting"] == 1)
+    requests.start("d")
+    wait_until(lambda: controller.stats()["waiting"] == 2)
+    time.sleep(0.05)
+    assert requests.admitted == ["a", "b", "c"]
+    assert controller.stats()["slots_used"] == 3
+
+    requests.release("a")
+    wait_until(lambda: "variants" in requests.admitted)
+    assert controller.stats()["slots_used"] == 4
+    assert "d" not in requests.admitted
+
+    requests.release("variants")
+    wait_until(lambda: "d" in requests.admitted)
+    assert requests.admitted == ["a", "b", "c", "variants", "d"]
+
+
+def test_weight_is_clamped_to_limit(controller):
+    """한도보다 큰 weight 도 한도만큼만 차지하므로 영원히 기다리지 않는다"""
+    ticket = controller.acquire("variants", weight=10)
+    assert controller.stats()["slots_used"] == 4
+    controller.release(ticket)
+    assert controller.stats()["slots_used"] == 0
+
+
+def test_waiting_position_and_estimate_account_for_weight(controller):
+    requests = Requests(controller)
+    requests.start("a", weight=3)
+    wait_until(lambda: requests.admitted == ["a"])
+    positions = []
+
+    def on_wait(position, eta):
+        positions.append((position, eta))
+        raise KeyboardInterrupt  # 세션이 중단된 것처럼 대기를 그만둔다
+
+    with pytest.raises(KeyboardInterrupt):
+        controller.acquire("variants", on_wait=on_wait, weight=2)
+    position, eta = positions[0]
+    assert position == 1
+    # 진행 중인 요청(예상 10초)이 끝나야 두 자리가 비므로 대기 시간은 0보다 크다
+    assert 0 < eta <= 10
+    # 중단된 요청은 대기열에서 빠진다
+    assert controller.stats()["waiting"] == 0
+    requests.release("a")
@@ -0,0 +1,91 @@
+import json
+import types
+
+import pytest
+
+import generation
+import llm
+from generation import generate_lesson_plans, salvage_lesson_plans
+
+
+def lesson(n, topic=None):
+    return {"lesson_number": str(n), "topic": topic or f"{n}차시 주제", "content": f"{n}차시 내용", "materials": "활동지"}
+
+
+def lessons_json(lessons):
+    return json.dumps({"lesson_plans": lessons}, ensure_ascii=False)
+
+
+def test_salvage_keeps_only_complete_lessons():
+    """잘린 응답에서 끝까지 작성된 차시만 살린다"""
+    text = "```json\n" + lessons_json([lesson(1), lesson(2), lesson(3)])
+    truncated = text[:text.index('"3차시 내용"')]
+    assert salvage_lesson_plans(truncated) == [lesson(1), lesson(2)]
+
+
+def test_salvage_stops_at_lesson_missing_fields():
+    text = lessons_json([lesson(1), {"lesson_number": "2", "topic": "주제만"}, lesson(3)])
+    assert salvage_lesson_plans(text) == [lesson(1)]
+
+
+@pytest.mark.parametrize("text", ['{"lesson_plans": [{"lesson_number": "1", "top', '{"other": []}', ""])
+def test_salvage_without_complete_lesson_raises(text):
+    with pytest.raises(ValueError):
+        salvage_lesson_plans(text)
+
+
+class ScriptedRouter:
+    """요청마다 정해 둔 차시 목록을 차례로 돌려주는 가짜 라우터"""
+
+    def __init__(self, *chunks):
+        self.chunks = list(chunks)
+        self.prompts = []
+
+    def complete(self, route, prompt, **kwargs):
+        self.prompts.append(prompt)
+        if not self.chunks:
+            raise ValueError("더 보낼 응답이 없습니다.")
+        return self.chunks.pop(0), {"output_tokens": 1000}
+
+
+def test_follow_up_chunks_are_deduped_and_renumbered(monkeypatch):
+    """다시 1차시부터 번호를 매기거나 번호를 건너뛴 이어 쓰기도 버리지 않고 위치로 번호를 다시 매긴다"""
+    monkeypatch.setattr(generation, "LESSONS_PER_REQUEST", 3)
+    router = ScriptedRouter(
+        [lesson(1, "A"), lesson(2, "B"), lesson(3, "C")],
+        [lesson(3, "C"), lesson(1, "D"), lesson(7, "E")],
+        [lesson(6, "F")],
+    )
+    plans = generate_lesson_plans(router, 6, {"standards": [], "content_sets": []})
+    assert [(lp["lesson_number"], lp["topic"]) for lp in plans] == [
+        ("1", "A"), ("2", "B"), ("3", "C"), ("4", "D"), ("5", "E"), ("6", "F")]
+
+
+def test_only_repeated_chunk_stops_generation(monkeypatch):
+    monkeypatch.setattr(generation, "LESSONS_PER_REQUEST", 2)
+    router = ScriptedRouter([lesson(1, "A"), lesson(2, "B")], [lesson(1, "A"), lesson(2, "B")])
+    plans = generate_lesson_plans(router, 4, {"standards": [], "content_sets": []})
+    assert [lp["topic"] for lp in plans] == ["A", "B"]
+    assert len(router.prompts) == 2
+
+
+def test_truncated_response_continues_from_next_lesson(monkeypatch):
+    """max_tokens 에 걸려 잘린 응답은 완성된 차시만 쓰고 그다음 차시부터 다시 요청한다"""
+    monkeypatch.setattr(generation, "LESSONS_PER_REQUEST", 4)
+    full = lessons_json([lesson(n) for n in range(1, 5)])
+    responses = [
+        (full[:full.index('"3차시 내용"')], "length"),
+        (lessons_json([lesson(3), lesson(4)]), "stop"),
+    ]
+    prompts = []
+
+    def invoke(prompt, system_prompt, model, temperature, max_tokens, route=None):
+        prompts.append(prompt)
+        text, finish_reason = responses.pop(0)
+        return types.SimpleNamespace(content=text, usage_metadata={"input_tokens": 10, "output_tokens": 10},
+                                     response_metadata={"finish_reason": finish_reason})
+
+    monkeypatch.setattr(llm, "_invoke", invoke)
+    plans = generate_lesson_plans(llm.ModelRouter(), 4, {"standards": [], "content_sets": []})
+    assert [lp["lesson_number"] for lp in plans] == ["1", "2", "3", "4"]
+    assert "**3차시부터 4차시까지**" in prompts[1]
@@ -0,0 +1,104 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue, JobTimeoutError, NoWorkerError
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), stale_after=60)
+
+
+def set_heartbeat(queue, job_id, seconds_ago):
+    with sqlite3.connect(queue.path) as conn:
+        conn.execute("UPDATE jobs SET heartbeat_at = ?, started_at = ? WHERE id = ?",
+                     (time.time() - seconds_ago, time.time() - 3600, job_id))
+
+
+def test_claim_takes_oldest_queued_job(queue):
+    first = queue.submit("step", {"n": 1})
+    queue.submit("step", {"n": 2})
+    assert queue.claim("w1") == (first, "step", {"n": 1})
+    assert queue.status(first) == "running"
+
+
+def test_requeue_only_jobs_without_recent_heartbeat(queue):
+    """시작한 지 오래되어도 heartbeat 가 있으면 그대로 두고, 끊긴 작업만 다시 대기열로"""
+    alive = queue.submit("lesson_plans", {})
+    dead = queue.submit("lesson_plans", {})
+    queue.claim("w1")
+    queue.claim("w2")
+    set_heartbeat(queue, alive, 5)
+    set_heartbeat(queue, dead, 120)
+
+    assert queue.requeue_stale() == 1
+    assert queue.status(alive) == "running"
+    assert queue.status(dead) == "queued"
+    # 넘어간 작업은 원래 작업자의 heartbeat 로 되살아나지 않는다
+    assert not queue.heartbeat(dead, "w2")
+    assert queue.heartbeat(alive, "w1")
+
+
+def test_heartbeat_is_refused_for_other_worker(queue):
+    job_id = queue.submit("step", {})
+    queue.claim("w1")
+    assert not queue.heartbeat(job_id, "w2")
+
+
+def test_wait_without_worker_cancels_job(queue):
+    job_id = queue.submit("step", {})
+    with pytest.raises(NoWorkerError):
+        queue.wait(job_id, timeout=5, claim_timeout=0.05, poll=0.01)
+    assert queue.status(job_id) is None
+
+
+def test_wait_timeout_cancels_running_job_and_drops_late_result(queue):
+    job_id = queue.submit("step", {})
+    queue.claim("w1")
+    with pytest.raises(JobTimeoutError):
+        queue.wait(job_id, timeout=0.05, poll=0.01)
+    assert queue.status(job_id) == "cancelled"
+    assert not queue.heartbeat(job_id, "w1")
+
+    queue.complete(job_id, {"late": True})
+    assert queue.status(job_id) == "cancelled"
+    assert queue.result(job_id) is None
+
+
+def test_failed_job_raises_job_error(queue):
+    job_id = queue.submit("step", {})
+    queue.claim("w1")
+    queue.fail(job_id, ValueError("형식 오류"))
+    with pytest.raises(job_queue.JobError) as info:
+        queue.wait(job_id, timeout=1, poll=0.01)
+    assert info.value.error_type == "ValueError"
+
+
+def test_worker_stops_cancelled_job(queue, monkeypatch):
+    """취소된 작업은 다음 확인 지점에서 멈추고 결과를 남기지 않는다"""
+    steps = []
+
+    def run_job(kind, payload, router, cancelled=None):
+        for step in range(50):
+            job_queue._check_cancelled(cancelled)
+            steps.append(step)
+            time.sleep(0.02)
+        return {"done": True}
+
+    monkeypatch.setattr(job_queue, "run_job", run_job)
+    monkeypatch.setattr(job_queue, "_get_router", lambda data_dir: None)
+    job_id = queue.submit("lesson_plans", {})
+    worker = threading.Thread(target=job_queue.worker_loop, args=(queue.path,),
+                              kwargs={"heartbeat_interval": 0.05, "max_jobs": 1, "idle_sleep": 0.01})
+    worker.start()
+    with pytest.raises(JobTimeoutError):
+        queue.wait(job_id, timeout=0.2, poll=0.01)
+    worker.join(5)
+
+    assert not worker.is_alive()
+    assert len(steps) < 50
+    assert queue.status(job_id) == "cancelled"
@@ -0,0 +1,49 @@
+import json
+import types
+
+import pytest
+
+import generation
+import llm
+from llm_replay import TrafficRecorder, TrafficReplayer, _stub_text
+
+
+@pytest.fixture
+def traffic(monkeypatch):
+    """llm 모듈이 쓸 기록기/재생기를 바꿔 끼운다"""
+    def use(backend):
+        monkeypatch.setattr(llm, "_traffic", backend)
+        monkeypatch.setattr(llm, "_traffic_loaded", True)
+    return use
+
+
+def fake_chat_model(model, temperature, max_tokens):
+    """6단계 프롬프트에 맞는 차시 목록을 돌려주는 가짜 모델 (네트워크 없음)"""
+    def call(messages):
+        text = json.dumps(_stub_text("lesson_plans", messages[-1].content), ensure_ascii=False)
+        return types.SimpleNamespace(content=text, usage_metadata={"input_tokens": 100, "output_tokens": 120 * 20},
+                                     response_metadata={"finish_reason": "stop"})
+    return call
+
+
+def test_lesson_plans_replay_ignores_observed_tokens(tmp_path, monkeypatch, traffic):
+    """기록할 때와 차시당 토큰 관찰값(max_tokens)이 달라도 6단계 기록이 그대로 재생된다"""
+    archive = str(tmp_path / "traffic.jsonl")
+    data = {"activity_name": "바다 탐험대", "grades": ["3학년"], "standards": [], "content_sets": []}
+    router = llm.ModelRouter()
+
+    monkeypatch.setattr(llm, "get_chat_model", fake_chat_model)
+    monkeypatch.setattr(generation, "_tokens_per_lesson", 110)
+    traffic(TrafficRecorder(archive))
+    recorded = generation.generate_lesson_plans(router, 34, data)
+
+    # 다른 호출 이력을 거친 프로세스처럼 관찰값을 바꾸고, 실제 모델은 부를 수 없게 한다
+    monkeypatch.setattr(generation, "_tokens_per_lesson", 250)
+    monkeypatch.setattr(llm, "get_chat_model", None)
+    replayer = TrafficReplayer(archive)
+    traffic(replayer)
+    replayed = generation.generate_lesson_plans(router, 34, data)
+
+    assert len(recorded) == 34
+    assert replayed == recorded
+    assert replayer.misses == 0
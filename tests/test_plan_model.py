@@ -0,0 +1,78 @@
+import copy
+import json
+import pickle
+
+import pytest
+
+from plan_model import Plan
+
+
+@pytest.fixture
+def plan():
+    return Plan.from_dict({
+        "grades": ["3학년"],
+        "content_sets": [{
+            "domain": "바다",
+            "key_ideas": ["바다는 생명의 터전이다."],
+            "content_elements": {
+                "knowledge_and_understanding": ["바다 생물"],
+                "process_and_skills": ["관찰하기"],
+                "values_and_attitudes": ["생명 존중"],
+            },
+        }],
+        "standards": [{"code": "4바다-01", "description": "바다 생물을 조사한다.", "levels": []}],
+    })
+
+
+@pytest.mark.parametrize("mutate", [
+    lambda p: p["key_ideas"].append("새 아이디어"),
+    lambda p: p["key_ideas"].__setitem__(0, "바꾼 아이디어"),
+    lambda p: p["content_elements"].__setitem__("process_and_skills", []),
+    lambda p: p["content_elements"].update(extra=[]),
+    lambda p: p["content_elements"]["knowledge_and_understanding"].append("바다 생물 2"),
+])
+def test_derived_fields_reject_mutation(plan, mutate):
+    """content_sets 에서 계산한 값은 고치려 하면 조용히 무시되지 않고 TypeError 가 난다"""
+    with pytest.raises(TypeError):
+        mutate(plan)
+    assert plan["key_ideas"] == ["바다는 생명의 터전이다."]
+    assert plan["content_elements"]["knowledge_and_understanding"] == ["바다 생물"]
+
+
+def test_derived_fields_look_like_plain_values(plan):
+    """프롬프트·JSON 에 들어가는 모양은 보통 list/dict 와 같다"""
+    assert repr(plan["key_ideas"]) == repr(["바다는 생명의 터전이다."])
+    assert json.dumps(plan["content_elements"], ensure_ascii=False) == json.dumps(
+        plan.to_dict()["content_elements"], ensure_ascii=False)
+
+
+def test_copies_and_to_dict_are_mutable(plan):
+    for value in (copy.deepcopy(plan["key_ideas"]), pickle.loads(pickle.dumps(plan["key_ideas"])),
+                  plan.to_dict()["key_ideas"]):
+        value.append("새 아이디어")
+    elements = plan.to_dict()["content_elements"]
+    elements["process_and_skills"].append("토의하기")
+    assert plan["content_elements"]["process_and_skills"] == ["관찰하기"]
+
+
+def test_derived_fields_follow_content_sets(plan):
+    plan["content_sets"] = [{"domain": "숲", "key_ideas": ["숲은 쉼터다."], "content_elements": {}}]
+    assert plan["domain"] == "숲"
+    assert plan["key_ideas"] == ["숲은 쉼터다."]
+
+
+def test_items_build_each_value_once(plan, monkeypatch):
+    calls = []
+    original = Plan.get
+
+    def counting_get(self, key, default=None):
+        calls.append(key)
+        return original(self, key, default)
+
+    monkeypatch.setattr(Plan, "get", counting_get)
+    keys = [key for key, _ in plan.items()]
+    assert sorted(calls) == sorted(set(calls))
+    assert "standards" in keys and "lesson_plans" not in keys
+    calls.clear()
+    assert "domain" in plan and "lesson_plans" not in plan
+    assert calls == []
@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from bm25 import file_hash
+from docstore import DEFAULT_COMPACT_PATH, CompactDocstore
+
+
+DEFAULT_VECTOR_DIR = os.path.join("faiss_index", "vectors")
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def _normalize_rows(x):
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def quantize(vectors):
+    """벡터별 대칭 int8 양자화: v ≈ q * scale"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scale = np.abs(vectors).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    q = np.clip(np.rint(vectors / scale[:, None]), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+def write_vector_store(vectors, directory=DEFAULT_VECTOR_DIR, meta=None):
+    """정규화한 float32 원본과 int8 양자화본을 .npy 로 저장"""
+    vectors = _normalize_rows(vectors)
+    q, scale = quantize(vectors)
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, "int8.npy"), q)
+    np.save(os.path.join(directory, "scale.npy"), scale)
+    np.save(os.path.join(directory, "float32.npy"), vectors)
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(dict(meta or {}, n=int(vectors.shape[0]), dim=int(vectors.shape[1])), f, ensure_ascii=False)
+
+
+class QuantizedVectorStore:
+    """int8 벡터를 mmap 으로 열어 검색하고, 상위 후보만 float32 로 재정렬
+
+    질의가 integer_queries 개 이하면 질의도 int8 로 양자화해 int8 코드끼리 정수 내적(int32 누적)만 하므로
+    문서 행렬을 float32 로 바꾸지 않는다. 질의가 많으면 블록마다 float32 로 바꾼 뒤 BLAS 행렬곱을 쓴다
+    (변환 비용이 질의 수로 나뉘어 정수 내적보다 빠르다).
+    """
+
+    def __init__(self, directory=DEFAULT_VECTOR_DIR, block_size=8192, integer_queries=2):
+        self.directory = directory
+        self.block_size = block_size
+        self.integer_queries = integer_queries
+        self.q = np.load(os.path.join(directory, "int8.npy"), mmap_mode="r")
+        self.scale = np.load(os.path.join(directory, "scale.npy"))
+        # 원본 float32 는 재정렬할 후보 행만 읽히므로 mmap 으로 둔다
+        self.full = np.load(os.path.join(directory, "float32.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+    def __len__(self):
+        return self.q.shape[0]
+
+    def approximate_scores(self, queries):
+        """(질의 수, 문서 수) int8 근사 코사인 점수"""
+        queries = _normalize_rows(np.atleast_2d(queries))
+        n = self.q.shape[0]
+        scores = np.empty((queries.shape[0], n), dtype=np.float32)
+        if queries.shape[0] <= self.integer_queries:
+            codes, query_scale = quantize(queries)
+            for i in range(queries.shape[0]):
+                dots = np.einsum("ij,j->i", self.q, codes[i], dtype=np.int32, casting="safe")
+                scores[i] = dots * (self.scale * query_scale[i])
+            return scores
+        qt = queries.T
+        for start in range(0, n, self.block_size):
+            end = min(start + self.block_size, n)
+            block = np.asarray(self.q[start:end], dtype=np.float32)
+            scores[:, start:end] = (block @ qt).T * self.scale[start:end]
+        return scores
+
+    def search(self, queries, k=5, rerank=50):
+        """질의 여러 개를 한 번에 검색: 질의별 [(doc_id, score), ...]"""
+        queries = _normalize_rows(np.atleast_2d(queries))
+        approx = self.approximate_scores(queries)
+        n = approx.shape[1]
+        n_cand = min(max(rerank, k), n)
+        if n_cand < n:
+            cand = np.argpartition(-approx, n_cand - 1, axis=1)[:, :n_cand]
+        else:
+            cand = np.broadcast_to(np.arange(n), (queries.shape[0], n))
+
+        results = []
+        for qi in range(queries.shape[0]):
+            ids = np.sort(cand[qi])
+            exact = np.asarray(self.full[ids], dtype=np.float32) @ queries[qi]
+            order = np.argsort(-exact)[:k]
+            results.append([(int(ids[j]), float(exact[j])) for j in order])
+        return results
+
+    def scores(self, query):
+        """단일 질의의 문서별 근사 점수 (BM25 점수와 결합할 때 사용)"""
+        return self.approximate_scores(query)[0]
+
+
+def embed_texts(texts, api_key, model=DEFAULT_EMBEDDING_MODEL, batch_size=256):
+    """OpenAI 임베딩 (langchain_openai 는 처음 호출할 때 불러온다)"""
+    from langchain_openai import OpenAIEmbeddings
+
+    embeddings = OpenAIEmbeddings(openai_api_key=api_key, model=model)
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(texts[start:start + batch_size]))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def exact_search(vectors, queries, k):
+    """비교 기준이 되는 float32 전수 검색"""
+    scores = _normalize_rows(queries) @ _normalize_rows(vectors).T
+    top = np.argsort(-scores, axis=1)[:, :k]
+    return top
+
+
+def bench(store, queries, k=5, rerank=50, batch_size=32):
+    """양자화 검색의 recall@k (float32 전수 검색 대비)와 초당 질의 수"""
+    exact = exact_search(np.asarray(store.full), queries, k)
+
+    found = []
+    start = time.perf_counter()
+    for b in range(0, len(queries), batch_size):
+        found.extend(store.search(queries[b:b + batch_size], k=k, rerank=rerank))
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for qi in range(min(len(queries), 200)):
+        store.search(queries[qi:qi + 1], k=k, rerank=rerank)
+    single = (time.perf_counter() - start) / min(len(queries), 200)
+
+    recall = np.mean([
+        len(set(exact[qi].tolist()) & {d for d, _ in found[qi]}) / k
+        for qi in range(len(queries))
+    ])
+    no_rerank = store.search(queries, k=k, rerank=k)
+    recall_no_rerank = np.mean([
+        len(set(exact[qi].tolist()) & {d for d, _ in no_rerank[qi]}) / k
+        for qi in range(len(queries))
+    ])
+    size_f32 = store.full.nbytes / 1e6
+    size_i8 = (store.q.nbytes + store.scale.nbytes) / 1e6
+    print(f"문서 {len(store)}개 x {store.q.shape[1]}차원, int8 {size_i8:.1f} MB (float32 {size_f32:.1f} MB)")
+    print(f"recall@{k}: {recall:.3f} (재정렬 후보 {rerank}개), 재정렬 없이 {recall_no_rerank:.3f}")
+    print(f"배치 {batch_size}: {len(queries) / elapsed:.0f} 질의/초, 단일 질의: {1 / single:.0f} 질의/초")
+
+
+def _synthetic(n, dim, n_queries, seed=0):
+    """임베딩이 없을 때 쓰는 군집형 가짜 벡터와 그 주변의 질의"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(n // 50, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    queries = vectors[rng.integers(0, n, n_queries)] + 0.4 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    return vectors, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="int8 양자화 로컬 벡터 색인")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="docstore 를 임베딩해 벡터 색인 생성 (OPENAI_API_KEY 필요)")
+    p.add_argument("--docstore", default=DEFAULT_COMPACT_PATH)
+    p.add_argument("--output", default=DEFAULT_VECTOR_DIR)
+    p.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+
+    p = sub.add_parser("bench", help="recall@k 와 질의 처리량 측정")
+    p.add_argument("--vectors", default=DEFAULT_VECTOR_DIR)
+    p.add_argument("--synthetic", type=int, metavar="N", help="임베딩 대신 N개의 가짜 벡터로 측정")
+    p.add_argument("--dim", type=int, default=1536)
+    p.add_argument("--queries", type=int, default=1000)
+    p.add_argument("-k", type=int, default=5)
+    p.add_argument("--rerank", type=int, default=50)
+    p.add_argument("--batch", type=int, default=32)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        store = CompactDocstore(args.docstore)
+        vectors = embed_texts(list(store.iter_texts()), os.environ["OPENAI_API_KEY"], model=args.model)
+        write_vector_store(vectors, args.output, meta={
+            "model": args.model,
+            # 검색기가 지금 docstore 로 만든 색인인지 확인하는 값 (bm25.load_or_build 와 같은 sha1)
+            "source_hash": file_hash(args.docstore),
+        })
+        print(f"{len(vectors)}개 벡터 → {args.output}")
+    elif args.command == "bench":
+        if args.synthetic:
+            import tempfile
+            vectors, queries = _synthetic(args.synthetic, args.dim, args.queries)
+            directory = tempfile.mkdtemp()
+            write_vector_store(vectors, directory)
+            store = QuantizedVectorStore(directory)
+        else:
+            store = QuantizedVectorStore(args.vectors)
+            rng = np.random.default_rng(0)
+            full = np.asarray(store.full)
+            queries = full[rng.integers(0, len(full), args.queries)]
+            queries = queries + 0.02 * rng.standard_normal(queries.shape).astype(np.float32)
+        bench(store, queries, k=args.k, rerank=args.rerank, batch_size=args.batch)
+
+
+if __name__ == "__main__":
+    main()
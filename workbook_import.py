@@ -0,0 +1,193 @@
+import argparse
+import re
+import time
+from io import BytesIO
+
+from generation import LESSON_COLUMNS
+
+
+# create_excel_bytes 의 시트 이름 -> 검토 화면 항목 이름
+SHEET_SECTIONS = {
+    "기본정보": "기본정보",
+    "내용체계": "내용체계",
+    "성취기준": "성취기준",
+    "교수학습및평가": "교수학습 및 평가",
+    "차시별계획": "차시별계획",
+}
+
+# 기본정보 시트 행 이름 -> (data 키, 쉼표로 나눈 목록인지)
+BASIC_INFO_FIELDS = {
+    "학교급": ("school_type", False),
+    "대상학년": ("grades", True),
+    "총차시": ("total_hours", False),
+    "운영 학기": ("semester", True),
+    "연계 교과": ("subjects", True),
+    "활동명": ("activity_name", False),
+    "요구사항": ("requirements", False),
+    "필요성": ("necessity", False),
+    "개요": ("overview", False),
+}
+
+CONTENT_ELEMENT_LABELS = {
+    "지식·이해": "knowledge_and_understanding",
+    "과정·기능": "process_and_skills",
+    "가치·태도": "values_and_attitudes",
+}
+LEVEL_CODES = {"상": "A", "중": "B", "하": "C"}
+ASSESSMENT_COLUMNS = {
+    "코드": "code", "성취기준": "description", "평가요소": "element", "수업평가방법": "method",
+    "상기준": "criteria_high", "중기준": "criteria_mid", "하기준": "criteria_low",
+}
+
+_SET_LABEL_RE = re.compile(r"^(.+?)\s*\(세트(\d+)\)$")
+# 학년별 계획의 시트 이름: "성취기준(3학년)"
+_GRADE_SHEET_RE = re.compile(r"^(성취기준|교수학습및평가|차시별계획)\((.+)\)$")
+
+
+class WorkbookImportError(ValueError):
+    """이 앱에서 내려받은 계획서 형식이 아닌 파일"""
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _records(rows):
+    """첫 행을 머리글로 삼아 나머지 행을 dict 로 (빈 행은 건너뜀)"""
+    header = [_text(v) for v in next(rows, ())]
+    for row in rows:
+        values = [_text(v) for v in row]
+        if any(values):
+            yield dict(zip(header, values))
+
+
+def _parse_basic_info(rows):
+    data = {}
+    for row in rows:
+        label, value = (_text(v) for v in (tuple(row) + (None, None))[:2])
+        if label not in BASIC_INFO_FIELDS:
+            continue
+        key, is_list = BASIC_INFO_FIELDS[label]
+        if is_list:
+            data[key] = [v.strip() for v in value.split(",") if v.strip()]
+        elif key == "total_hours":
+            data[key] = int(value) if value.isdigit() else value
+        else:
+            data[key] = value
+    return data
+
+
+def _parse_content_sets(rows):
+    sets = {}
+    for record in _records(rows):
+        match = _SET_LABEL_RE.match(record.get("구분", ""))
+        if not match:
+            continue
+        label, index = match.group(1), int(match.group(2))
+        cset = sets.setdefault(index, {
+            "domain": "", "key_ideas": [],
+            "content_elements": {key: [] for key in CONTENT_ELEMENT_LABELS.values()},
+        })
+        value = record.get("내용", "")
+        if label == "영역명":
+            cset["domain"] = value
+        elif label == "핵심 아이디어":
+            cset["key_ideas"].append(value)
+        elif label in CONTENT_ELEMENT_LABELS:
+            cset["content_elements"][CONTENT_ELEMENT_LABELS[label]].append(value)
+    return {"content_sets": [sets[i] for i in sorted(sets)]}
+
+
+def _parse_standards(rows):
+    standards = {}
+    for record in _records(rows):
+        code = record.get("성취기준코드", "")
+        standard = standards.setdefault(code, {"code": code, "description": record.get("성취기준설명", ""), "levels": []})
+        level = record.get("수준", "")
+        standard["levels"].append({"level": LEVEL_CODES.get(level, level), "description": record.get("수준별설명", "")})
+    return {"standards": list(standards.values())}
+
+
+def _parse_teaching_assessment(rows):
+    methods, assessment_plan = [], []
+    for record in _records(rows):
+        if record.get("유형") == "교수학습방법":
+            methods.append(record.get("수업평가방법", ""))
+        elif record.get("유형") == "평가계획":
+            assessment_plan.append({key: record.get(column, "") for column, key in ASSESSMENT_COLUMNS.items()})
+    return {"teaching_methods_text": "\n".join(methods), "assessment_plan": assessment_plan}
+
+
+def _parse_lesson_plans(rows):
+    columns = dict(zip(["차시", "학습주제", "학습내용", "교수학습자료"], LESSON_COLUMNS))
+    return {"lesson_plans": [{key: record.get(column, "") for column, key in columns.items()}
+                             for record in _records(rows)]}
+
+
+SHEET_PARSERS = {
+    "기본정보": _parse_basic_info,
+    "내용체계": _parse_content_sets,
+    "성취기준": _parse_standards,
+    "교수학습및평가": _parse_teaching_assessment,
+    "차시별계획": _parse_lesson_plans,
+}
+
+
+def parse_workbook(content):
+    """create_excel_bytes 로 만든 계획서(xlsx bytes)를 계획 데이터로 되돌린다
+
+    반환값: (data, 불러온 항목 목록). 일부 시트만 담긴 파일이면 그 항목만 채운다.
+    학년별 시트("성취기준(3학년)" 등)가 있으면 data["variants"] 에 학년별로 넣고 첫 학년을 편집 중인 학년으로 둔다.
+    """
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(BytesIO(content), read_only=True, data_only=True)
+    except Exception as e:
+        raise WorkbookImportError(f"Excel 파일을 열 수 없습니다: {e}") from e
+    try:
+        data, sections, variants = {}, [], {}
+        for sheet_name, parser in SHEET_PARSERS.items():
+            if sheet_name not in workbook.sheetnames:
+                continue
+            data.update(parser(workbook[sheet_name].iter_rows(values_only=True)))
+            sections.append(SHEET_SECTIONS[sheet_name])
+        for sheet_name in workbook.sheetnames:
+            match = _GRADE_SHEET_RE.match(sheet_name)
+            if not match:
+                continue
+            rows = workbook[sheet_name].iter_rows(values_only=True)
+            variants.setdefault(match.group(2), {}).update(SHEET_PARSERS[match.group(1)](rows))
+            if SHEET_SECTIONS[match.group(1)] not in sections:
+                sections.append(SHEET_SECTIONS[match.group(1)])
+    finally:
+        workbook.close()
+    if variants:
+        grade = next(iter(variants))
+        data.update(variants[grade], grade_variants=True, variants=variants, variant_grade=grade)
+        sections.sort(key=list(SHEET_SECTIONS.values()).index)
+    if not sections:
+        raise WorkbookImportError("계획서 시트(기본정보, 내용체계, 성취기준, 교수학습및평가, 차시별계획)가 없는 파일입니다.")
+    return data, sections
+
+
+def main():
+    parser = argparse.ArgumentParser(description="내려받은 계획서 Excel 을 계획 데이터로 읽기")
+    parser.add_argument("workbook")
+    args = parser.parse_args()
+    with open(args.workbook, "rb") as f:
+        content = f.read()
+    start = time.perf_counter()
+    data, sections = parse_workbook(content)
+    ms = (time.perf_counter() - start) * 1000
+    print(f"{', '.join(sections)} 불러옴: 내용체계 {len(data.get('content_sets', []))}세트, "
+          f"성취기준 {len(data.get('standards', []))}개, 평가계획 {len(data.get('assessment_plan', []))}개, "
+          f"차시 {len(data.get('lesson_plans', []))}개 ({ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()